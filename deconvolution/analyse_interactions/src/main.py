@@ -1,7 +1,7 @@
 """
 File:         main.py
 Created:      2020/03/13
-Last Changed: 2020/04/10
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -34,6 +34,8 @@ import re
 from general.local_settings import LocalSettings
 from general.utilities import get_leaf_dir, check_file_exists, get_basename, \
     prepare_output_dir
+from general.df_utilities import save_dataframe
+from general.group_view import load_group_dataframe
 
 
 class Main:
@@ -174,11 +176,17 @@ class Main:
                     uncompr_file = os.path.join(ia_indir, filename + '.txt')
                     bin_file = os.path.join(ia_indir, exp_ia_infile + ".binary")
 
-                    # Copy and decompressed the file.
-                    self.print_string("\nCopying the input files.")
-                    self.copy_file(compr_file, copy_file)
-                    self.print_string("\nDecompressing the input files.")
-                    self.decompress(copy_file)
+                    # Copy and decompressed the file, or write it from the
+                    # master table if the group is an index manifest.
+                    if check_file_exists(compr_file):
+                        self.print_string("\nCopying the input files.")
+                        self.copy_file(compr_file, copy_file)
+                        self.print_string("\nDecompressing the input files.")
+                        self.decompress(copy_file)
+                    else:
+                        self.print_string("\nResolving the input files.")
+                        self.write_group_table(compr_file, uncompr_file,
+                                               index=True)
 
                     # Convert to binary.
                     self.print_string("\nConverting files to binary format.")
@@ -202,11 +210,16 @@ class Main:
                                           self.eqtl_filename + '.txt.gz')
                 copy_file = os.path.join(ia_indir, self.eqtl_filename + '.txt.gz')
 
-                # Copy and decompressed the file.
-                self.print_string("\nCopying the input files.")
-                self.copy_file(compr_file, copy_file)
-                self.print_string("\nDecompressing the input files.")
-                self.decompress(copy_file)
+                # Copy and decompressed the file, or write it from the
+                # master table if the group is an index manifest.
+                if check_file_exists(compr_file):
+                    self.print_string("\nCopying the input files.")
+                    self.copy_file(compr_file, copy_file)
+                    self.print_string("\nDecompressing the input files.")
+                    self.decompress(copy_file)
+                else:
+                    self.print_string("\nResolving the input files.")
+                    self.write_group_table(compr_file, eqtl_file, index=False)
             else:
                 self.print_string("Skipping eqtl preparation.")
 
@@ -235,6 +248,21 @@ class Main:
         command = ['cp', inpath, outpath]
         self.execute_command(command)
 
+    @staticmethod
+    def write_group_table(inpath, outpath, index):
+        """
+        Method for writing a table of a group, resolved from its master
+        table, as uncompressed file.
+
+        :param inpath: str, the (missing) table file in the group directory.
+        :param outpath: str, the uncompressed output path.
+        :param index: boolean, whether the table has row names (index).
+        """
+        df = load_group_dataframe(inpath=inpath,
+                                  header=0,
+                                  index_col=0 if index else None)
+        save_dataframe(df=df, outpath=outpath, header=True, index=index)
+
     def decompress(self, inpath):
         """
         Method for decompressing a file.
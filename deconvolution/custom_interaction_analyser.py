@@ -62,6 +62,7 @@ if __name__ == '__main__':
         SKIP_ROWS = CLA.get_argument("skip_rows")
         N_EQTLS = CLA.get_argument("n_eqtls")
         N_SAMPLES = CLA.get_argument("n_samples")
+        CORES = CLA.get_argument("cores")
         VERBOSE = CLA.get_argument("verbose")
 
         # Start the program.
@@ -70,5 +71,6 @@ if __name__ == '__main__':
                        skip_rows=SKIP_ROWS,
                        n_eqtls=N_EQTLS,
                        n_samples=N_SAMPLES,
+                       cores=CORES,
                        verbose=VERBOSE)
         PROGRAM.start()
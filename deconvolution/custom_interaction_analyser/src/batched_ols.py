@@ -0,0 +1,372 @@
+"""
+File:         batched_ols.py
+Created:      2026/10/18
+Last Changed: 2026/10/18
+Author:       M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+
+# Third party imports.
+import numpy as np
+import scipy.stats as stats
+import statsmodels.api as sm
+from scipy.linalg import solve_triangular
+
+# Local application imports.
+
+
+class Factorization:
+    """
+    Factorization: class containing the QR decomposition of the non-zero
+        columns of a design matrix. A factorization can be extended with
+        extra columns without decomposing the original columns again.
+    """
+
+    def __init__(self, X, Q=None, R=None, keep_mask=None):
+        """
+        Initializer of the class.
+
+        :param X: ndarray, the design matrix with rows as samples and
+                  columns as dimensions.
+        :param Q: ndarray, the precomputed orthonormal factor.
+        :param R: ndarray, the precomputed upper triangular factor.
+        :param keep_mask: ndarray, the precomputed non-zero columns of X.
+        """
+        self.X = X
+        if keep_mask is None:
+            # Columns that only contain zeros do not contribute to the
+            # (pseudo-inverse) fit, drop them from the factorization.
+            keep_mask = np.any(X != 0, axis=0)
+        self.keep_mask = keep_mask
+        if Q is None or R is None:
+            Q, R = np.linalg.qr(X[:, keep_mask])
+        self.Q = Q
+        self.R = R
+
+    def get_matrix(self):
+        return self.X
+
+    def get_width(self):
+        return self.X.shape[1]
+
+    def get_keep_mask(self):
+        return self.keep_mask
+
+    def get_q(self):
+        return self.Q
+
+    def get_r(self):
+        return self.R
+
+    def get_rank(self):
+        """
+        Method for calculating the rank of the non-zero columns. The
+        singular values of R are those of the design matrix, the tolerance
+        is identical to numpy.linalg.matrix_rank.
+
+        :return : int, the rank.
+        """
+        if self.R.shape[1] == 0:
+            return 0
+        S = np.linalg.svd(self.R, compute_uv=False)
+        tol = S.max() * max(self.X.shape[0], self.R.shape[1]) * np.finfo(S.dtype).eps
+        return int(np.sum(S > tol))
+
+    def extend(self, X_extra):
+        """
+        Method for appending columns to the factorization. The non-zero
+        extra columns are orthogonalized against Q twice (classical
+        Gram-Schmidt with re-orthogonalization) and decomposed separately.
+
+        :param X_extra: ndarray, the columns to append.
+        :return : Factorization, the factorization of [X, X_extra].
+        """
+        extra_mask = np.any(X_extra != 0, axis=0)
+        S = X_extra[:, extra_mask]
+
+        C1 = self.Q.T.dot(S)
+        S = S - self.Q.dot(C1)
+        C2 = self.Q.T.dot(S)
+        S = S - self.Q.dot(C2)
+        Q_extra, R_extra = np.linalg.qr(S)
+
+        n_base = self.R.shape[1]
+        n_extra = R_extra.shape[1]
+        R = np.zeros((n_base + n_extra, n_base + n_extra))
+        R[:n_base, :n_base] = self.R
+        R[:n_base, n_base:] = C1 + C2
+        R[n_base:, n_base:] = R_extra
+
+        return Factorization(X=np.column_stack((self.X, X_extra)),
+                             Q=np.column_stack((self.Q, Q_extra)),
+                             R=R,
+                             keep_mask=np.concatenate((self.keep_mask,
+                                                       extra_mask)))
+
+
+class BatchedOLS:
+    """
+    BatchedOLS: class that factorizes a null model once and compares it
+        against a batch of alternative models. Each alternative model is the
+        null model extended with exactly one extra column (e.g. the permuted
+        interaction terms of a covariate).
+    """
+
+    def __init__(self, X, y, snp_index=1, tol=1e-8, base=None):
+        """
+        Initializer of the class.
+
+        :param X: ndarray, the null design matrix with rows as samples and
+                  columns as dimensions.
+        :param y: ndarray, the outcome values.
+        :param snp_index: int, the column index of the SNP in X.
+        :param tol: float, the relative tolerance for considering an extra
+                    column collinear with the null model.
+        :param base: Factorization, the factorization of the first columns
+                     of X. Only the remaining columns are decomposed.
+        """
+        self.X = np.asarray(X, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.snp_index = snp_index
+        self.tol = tol
+
+        # The degrees of freedom follow the number of columns, identical to
+        # a statsmodels OLS fit.
+        self.n, self.df = self.X.shape
+
+        # Factorize the null model.
+        if base is None:
+            factorization = Factorization(self.X)
+        else:
+            factorization = base.extend(self.X[:, base.get_width():])
+        self.keep_mask = factorization.get_keep_mask()
+        self.snp_kept = bool(self.keep_mask[snp_index])
+        self.snp_reduced_index = int(np.sum(self.keep_mask[:snp_index]))
+        self.rank = int(np.sum(self.keep_mask))
+
+        self.full_rank = factorization.get_rank() == self.rank
+        self.Q = None
+        self.R_inv = None
+        self.y_resid = None
+        self.rss = np.nan
+        self.beta_snp = np.nan
+        self.xtx_inv_snp = np.nan
+        self.reference_rss = None
+        if self.full_rank:
+            self.Q = factorization.get_q()
+            self.R_inv = solve_triangular(factorization.get_r(), np.eye(self.rank))
+            qty = self.Q.T.dot(self.y)
+            self.y_resid = self.y - self.Q.dot(qty)
+            self.rss = self.y_resid.dot(self.y_resid)
+            if self.snp_kept:
+                r_inv_snp = self.R_inv[self.snp_reduced_index, :]
+                self.beta_snp = r_inv_snp.dot(qty)
+                self.xtx_inv_snp = r_inv_snp.dot(r_inv_snp)
+        else:
+            self.rss = self.fit_single(self.X, self.y)[0]
+
+    def get_n(self):
+        return self.n
+
+    def get_df(self):
+        return self.df
+
+    def get_rss(self):
+        return self.rss
+
+    def is_full_rank(self):
+        return self.full_rank
+
+    def get_reference_rss(self):
+        if self.reference_rss is None:
+            if self.full_rank:
+                self.reference_rss = self.fit_single(self.X, self.y)[0]
+            else:
+                self.reference_rss = self.rss
+        return self.reference_rss
+
+    def fit_alternatives(self, Z):
+        """
+        Method for fitting all alternative models in one matrix operation.
+
+        :param Z: ndarray, matrix with rows as samples and each column
+                  the extra dimension of one alternative model.
+        :return pvalues: ndarray, the F-test p-value of each alternative
+                         model compared to the null model.
+        :return snp_tvalues: ndarray, the t-value of the SNP in each
+                             alternative model.
+        :return inter_tvalues: ndarray, the t-value of the extra column
+                               in each alternative model.
+        """
+        Z = np.asarray(Z, dtype=np.float64)
+        if Z.ndim == 1:
+            Z = Z[:, np.newaxis]
+        n_alt = Z.shape[1]
+        df_alt = self.df + 1
+
+        rss_alt = np.full(n_alt, np.nan)
+        snp_tvalues = np.full(n_alt, np.nan)
+        inter_tvalues = np.full(n_alt, np.nan)
+
+        if self.full_rank:
+            # Residualize the extra columns on the null model.
+            qtz = self.Q.T.dot(Z)
+            Z_resid = Z - self.Q.dot(qtz)
+            zz = np.einsum('ij,ij->j', Z_resid, Z_resid)
+            degenerate = zz <= self.tol * np.maximum(np.einsum('ij,ij->j', Z, Z), np.finfo(np.float64).tiny)
+            df_resid = self.n - (self.rank + 1)
+            if df_resid <= 0:
+                degenerate[:] = True
+            valid = ~degenerate
+
+            if np.any(valid):
+                zz_valid = zz[valid]
+                zy = Z_resid[:, valid].T.dot(self.y_resid)
+                beta_inter = zy / zz_valid
+                rss_valid = np.maximum(self.rss - zy * beta_inter, 0)
+                sigma2 = rss_valid / df_resid
+
+                # Interaction term t-values.
+                inter_se = np.sqrt(sigma2 / zz_valid)
+                inter_tvalues[valid] = self.safe_divide(beta_inter, inter_se)
+
+                # SNP t-values, updated from the null model with the
+                # partitioned regression formulas.
+                if self.snp_kept:
+                    g_snp = self.R_inv[self.snp_reduced_index, :].dot(qtz[:, valid])
+                    beta_snp = self.beta_snp - g_snp * beta_inter
+                    snp_se = np.sqrt(sigma2 * (self.xtx_inv_snp + (g_snp ** 2) / zz_valid))
+                    snp_tvalues[valid] = self.safe_divide(beta_snp, snp_se)
+                else:
+                    snp_tvalues[valid] = 0
+
+                rss_alt[valid] = rss_valid
+        else:
+            degenerate = np.ones(n_alt, dtype=bool)
+
+        # Fit the alternative models that cannot be derived from the
+        # factorization one by one. These are compared against a null model
+        # fitted in the same way so rounding errors of the two solvers do
+        # not end up in the F-statistic.
+        rss_null = np.full(n_alt, self.rss)
+        if np.any(degenerate):
+            rss_null[degenerate] = self.get_reference_rss()
+        for i in np.flatnonzero(degenerate):
+            X_alt = np.column_stack((self.X, Z[:, i]))
+            rss, (snp_tvalue, inter_tvalue) = self.fit_single(X_alt, self.y,
+                                                              tvalue_indices=[self.snp_index, X_alt.shape[1] - 1])
+            rss_alt[i] = rss
+            snp_tvalues[i] = snp_tvalue
+            inter_tvalues[i] = inter_tvalue
+
+        fvalues = self.calc_f_values(rss_null, rss_alt, self.df, df_alt, self.n)
+        pvalues = self.get_p_values(fvalues, self.df, df_alt, self.n)
+
+        return pvalues, snp_tvalues, inter_tvalues
+
+    @staticmethod
+    def fit_single(X, y, tvalue_indices=None):
+        """
+        Method for fitting one multilinear model with statsmodels. Used
+        for rank deficient designs.
+
+        :param X: ndarray, the matrix with rows as samples and columns as
+                  dimensions.
+        :param y: ndarray, the outcome values.
+        :param tvalue_indices: list, the column indices of the variables to
+                               get tvalues for.
+        :return ssr: float, the residual sum of squares of this fit.
+        :return tvalues: list, beta / std error.
+        """
+        if tvalue_indices is None:
+            tvalue_indices = []
+
+        try:
+            ols_result = sm.OLS(y, X).fit()
+        except np.linalg.LinAlgError as e:
+            print("\t\tError: {}".format(e))
+            return np.nan, [np.nan for _ in tvalue_indices]
+
+        tvalues = []
+        for index in tvalue_indices:
+            tvalue = 0
+            coef = ols_result.params[index]
+            std_err = ols_result.bse[index]
+            if std_err > 0:
+                tvalue = coef / std_err
+            tvalues.append(tvalue)
+
+        return ols_result.ssr, tvalues
+
+    @staticmethod
+    def safe_divide(coef, std_err):
+        """
+        Method for dividing the coefficients by their standard errors, a
+        standard error of zero results in a t-value of zero.
+
+        :param coef: ndarray, the coefficients.
+        :param std_err: ndarray, the standard errors.
+        :return : ndarray, the t-values.
+        """
+        out = np.zeros_like(coef)
+        mask = std_err > 0
+        out[mask] = coef[mask] / std_err[mask]
+        out[np.isnan(std_err)] = np.nan
+        return out
+
+    @staticmethod
+    def calc_f_values(rss1, rss2, df1, df2, n):
+        """
+        Method for comparing the residual sum of squares of the null model
+        with those of the alternative models using the F statistic.
+
+        :param rss1: ndarray, the residual sum of squares of the null model.
+        :param rss2: ndarray, the residual sum of squares of the alternative
+                     models.
+        :param df1: int, the degrees of freedom of the null model.
+        :param df2: int, the degrees of freedom of the alternative models.
+        :param n: int, the number of samples in the model.
+        :return : ndarray, the f-values.
+        """
+        rss1 = np.asarray(rss1, dtype=np.float64)
+        rss2 = np.asarray(rss2, dtype=np.float64)
+        if df1 >= df2 or df2 >= n:
+            return np.full(rss2.shape, np.nan)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fvalues = ((rss1 - rss2) / (df2 - df1)) / (rss2 / (n - df2))
+        fvalues[rss2 >= rss1] = 0
+        return fvalues
+
+    @staticmethod
+    def get_p_values(f_values, df1, df2, n):
+        """
+        Method for getting the p-values corresponding to a F-distribution.
+
+        :param f_values: ndarray, the f-values.
+        :param df1: int, the degrees of freedom of the null model.
+        :param df2: int, the degrees of freedom of the alternative model.
+        :param n: int, the number of samples in the model.
+        :return : ndarray, the p-values corresponding to the f-values.
+        """
+        f_values = np.asarray(f_values, dtype=np.float64)
+        if df1 >= df2 or df2 >= n:
+            return np.full(f_values.shape, np.nan)
+
+        return stats.f.sf(f_values, dfn=(df2 - df1), dfd=(n - df2))
@@ -0,0 +1,162 @@
+"""
+File:         checkpoint.py
+Created:      2026/10/18
+Last Changed: 2026/10/18
+Author:       M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+import hashlib
+import pickle
+import os
+
+# Third party imports.
+import numpy as np
+
+# Local application imports.
+
+
+class Checkpoint:
+    """
+    Checkpoint: class for appending finished eQTL results to disk so an
+        interrupted job can resume at the first unfinished eQTL. The file
+        is a stream of pickle records: a header describing the job followed
+        by one record per flushed batch of eQTLs.
+    """
+
+    def __init__(self, fpath, skip_rows, n_eqtls, cov_names,
+                 permutation_orders, adaptive=None, flush_every=10):
+        """
+        Initializer of the class.
+
+        :param fpath: string, the checkpoint file path.
+        :param skip_rows: int, the number of rows skipped by the job.
+        :param n_eqtls: int, the number of eqtls of the job.
+        :param cov_names: list, the names of the covariates.
+        :param permutation_orders: ndarray, the sample orders.
+        :param adaptive: dict, the adaptive permutation settings.
+        :param flush_every: int, the number of eQTLs after which the results
+                            are appended to the file.
+        """
+        self.fpath = fpath
+        self.flush_every = max(1, flush_every)
+        self.header = {"skip_rows": skip_rows,
+                       "n_eqtls": n_eqtls,
+                       "cov_names": list(cov_names),
+                       "perm_orders_hash": self.hash_array(permutation_orders),
+                       "adaptive": adaptive}
+
+        # Initialize variables.
+        self.buffer = []
+
+    @staticmethod
+    def hash_array(array):
+        """
+        Method for creating a fingerprint of a numpy array.
+
+        :param array: ndarray, the array to hash.
+        :return : string, the md5 hexdigest of the array.
+        """
+        array = np.ascontiguousarray(array, dtype=np.int64)
+        md5 = hashlib.md5(str(array.shape).encode())
+        md5.update(array.tobytes())
+        return md5.hexdigest()
+
+    def load(self):
+        """
+        Method for loading the finished eQTLs. An incompatible checkpoint is
+        discarded and a truncated last record is cut off so new records
+        can be appended safely.
+
+        :return results: dict, the results with the row index as key.
+        """
+        results = {}
+        if not os.path.isfile(self.fpath):
+            self.write_header()
+            return results
+
+        valid_size = 0
+        with open(self.fpath, "rb") as f:
+            try:
+                header = pickle.load(f)
+            except (EOFError, pickle.UnpicklingError):
+                header = None
+
+            if header != self.header:
+                print("\tcheckpoint does not match the job, starting over")
+                f.close()
+                self.write_header()
+                return results
+            valid_size = f.tell()
+
+            while True:
+                try:
+                    for row_index, eqtl_results in pickle.load(f):
+                        results[row_index] = eqtl_results
+                    valid_size = f.tell()
+                except (EOFError, pickle.UnpicklingError):
+                    break
+        f.close()
+
+        # Remove the part of a record that was interrupted while writing.
+        if valid_size < os.path.getsize(self.fpath):
+            print("\tremoving incomplete checkpoint record")
+            with open(self.fpath, "r+b") as f:
+                f.truncate(valid_size)
+            f.close()
+
+        return results
+
+    def write_header(self):
+        with open(self.fpath, "wb") as f:
+            pickle.dump(self.header, f)
+        f.close()
+
+    def add(self, row_index, eqtl_results):
+        """
+        Method for adding the results of one eQTL, the buffer is flushed
+        every flush_every eQTLs.
+
+        :param row_index: int, the row index of the eQTL.
+        :param eqtl_results: tuple, the results of the eQTL.
+        """
+        self.buffer.append((row_index, eqtl_results))
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Method for appending the buffered results to the file.
+        """
+        if len(self.buffer) == 0:
+            return
+
+        with open(self.fpath, "ab") as f:
+            pickle.dump(self.buffer, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        f.close()
+        self.buffer = []
+
+    def remove(self):
+        """
+        Method for removing the checkpoint file once the job is finished.
+        """
+        self.buffer = []
+        if os.path.isfile(self.fpath):
+            os.remove(self.fpath)
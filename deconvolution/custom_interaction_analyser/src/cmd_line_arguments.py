@@ -96,6 +96,12 @@ class CommandLineArguments:
                             default=None,
                             help="The number of samples in the input files, "
                                  "default: None (determine automatically).")
+        parser.add_argument("-c",
+                            "--cores",
+                            type=int,
+                            default=1,
+                            help="The number of cores to divide the eQTLs "
+                                 "over, default: 1.")
         parser.add_argument("-verbose",
                             action='store_true',
                             help="Include steps and command prints, "
@@ -1,7 +1,7 @@
 """
 File:         combine_and_plot.py
 Created:      2020/03/30
-Last Changed: 2020/06/09
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -23,12 +23,9 @@ root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
 # Standard imports.
 from __future__ import print_function
 from pathlib import Path
-from bisect import bisect_left
 from colour import Color
 from itertools import groupby, count
-import pickle
 import math
-import glob
 import time
 import os
 
@@ -43,7 +40,8 @@ import matplotlib.pyplot as plt
 
 # Local application imports.
 from general.local_settings import LocalSettings
-from general.df_utilities import save_dataframe, get_basename
+from general.df_utilities import save_dataframe
+from .result_store import ResultStore
 
 
 class CombineAndPlot:
@@ -73,10 +71,15 @@ class CombineAndPlot:
         # Get the needed settings.
         self.cov_outdir = settings.get_setting("covariates_folder")
         self.tech_cov_outdir = settings.get_setting("technical_covariates_folder")
+        self.results_folder = settings.get_setting("results_folder")
         self.pvalues_outfile = settings.get_setting("actual_pvalues_pickle_filename")
         self.snp_tvalues_outfile = settings.get_setting("snp_tvalues_pickle_filename")
         self.inter_tvalues_outfile = settings.get_setting("inter_tvalues_pickle_filename")
         self.perm_pvalues_outfile = settings.get_setting("permuted_pvalues_pickle_filename")
+        self.n_perm_outfile = settings.get_setting("n_permutations_filename")
+        self.null_hist_outfile = settings.get_setting("null_histogram_filename")
+        self.null_hist_bins = settings.get_setting("null_histogram_bins_per_decade")
+        self.fdr_from_histogram = settings.get_setting("perm_fdr_from_histogram")
 
     def start(self):
         """
@@ -109,62 +112,56 @@ class CombineAndPlot:
         # perm_fdr_df = pd.read_csv(os.path.join(workdir, "perm_fdr_table.txt.gz"), sep="\t", header=0, index_col=0)
         # bh_fdr_df = pd.read_csv(os.path.join(workdir, "bh_fdr_table.txt.gz"), sep="\t", header=0, index_col=0)
 
-        # Combine the pickle files.
-        print("Loading pvalue data.", flush=True)
-        pcolumns, pvalues_data = self.combine_pickles(workdir,
-                                                      self.pvalues_outfile,
-                                                      columns=True)
-
-        # Create a pandas dataframe from the nested list.
+        # Open the result chunks.
+        store = ResultStore(os.path.join(workdir, self.results_folder),
+                            filenames={"pvalues": self.pvalues_outfile,
+                                       "snp_tvalues": self.snp_tvalues_outfile,
+                                       "inter_tvalues": self.inter_tvalues_outfile,
+                                       "perm_pvalues": self.perm_pvalues_outfile,
+                                       "n_permutations": self.n_perm_outfile,
+                                       "null_histogram": self.null_hist_outfile},
+                            bins_per_decade=self.null_hist_bins)
+        print("Found {} result chunks.".format(len(store.get_chunks())),
+              flush=True)
+        self.check_eqtl_indices(store)
+
+        # Create a pandas dataframe from the result arrays.
         print("Creating p-values dataframe.", flush=True)
-        pvalue_df = self.create_df(pvalues_data, pcolumns)
+        pvalue_df = self.create_df(store, "pvalues")
         save_dataframe(df=pvalue_df,
                        outpath=os.path.join(workdir,
                                             "pvalue_table.txt.gz"),
                        header=True, index=True)
 
-        # pvalue_df = pd.read_csv(os.path.join(workdir, "pvalue_table.txt.gz"),
-        #                         sep="\t", header=0, index_col=0)
-        # with open(os.path.join(workdir, "perm_pvalues.pkl"), "rb") as f:
-        #     perm_pvalues = pickle.load(f)
-        # f.close()
-
         # Get the pvalues from the dataframe.
         pvalues = pvalue_df.melt()["value"].values
 
-        print("Loading permutation pvalue data.", flush=True)
-        _, perm_pvalues = self.combine_pickles(workdir,
-                                               self.perm_pvalues_outfile)
-        # with open(os.path.join(workdir, "perm_pvalues.pkl"), "wb") as f:
-        #      pickle.dump(perm_pvalues, f)
-        # f.close()
+        null_histogram = None
+        if self.fdr_from_histogram:
+            # Use the bin centers of the merged null histogram instead of
+            # the raw permutation p-values.
+            print("Merging permutation pvalue histograms.", flush=True)
+            null_histogram = store.get_null_histogram()
+            perm_pvalues, perm_weights = null_histogram.get_bin_values()
+            print("\tmaximum relative p-value error: "
+                  "{:.2%}".format(null_histogram.get_max_relative_error()))
+        else:
+            print("Loading permutation pvalue data.", flush=True)
+            perm_pvalues, perm_weights = store.get_perm_pvalues()
 
         # Visualise distributions.
         print("Visualizing distributions.", flush=True)
-        self.plot_distributions(perm_pvalues, pvalues, workdir)
-
-        # return
+        self.plot_distributions(perm_pvalues, pvalues, workdir,
+                                perm_weights=perm_weights)
 
-        print("Loading SNP tvalue data.", flush=True)
-        snp_tcolumns, snp_tvalues_data = self.combine_pickles(workdir,
-                                                              self.snp_tvalues_outfile,
-                                                              columns=True)
-
-        # Create a pandas dataframe from the nested list.
         print("Creating SNP t-values dataframe.", flush=True)
-        snp_tvalue_df = self.create_df(snp_tvalues_data, snp_tcolumns)
+        snp_tvalue_df = self.create_df(store, "snp_tvalues")
         save_dataframe(df=snp_tvalue_df,
                        outpath=os.path.join(workdir, "snp_tvalue_table.txt.gz"),
                        header=True, index=True)
 
-        print("Loading inter tvalue data.", flush=True)
-        inter_tcolumns, inter_tvalues_data = self.combine_pickles(workdir,
-                                                                  self.inter_tvalues_outfile,
-                                                                  columns=True)
-
-        # Create a pandas dataframe from the nested list.
         print("Creating inter t-values dataframe.", flush=True)
-        inter_tvalue_df = self.create_df(inter_tvalues_data, inter_tcolumns)
+        inter_tvalue_df = self.create_df(store, "inter_tvalues")
         save_dataframe(df=inter_tvalue_df,
                        outpath=os.path.join(workdir, "inter_tvalue_table.txt.gz"),
                        header=True, index=True)
@@ -179,15 +176,23 @@ class CombineAndPlot:
 
         # Sort the lists.
         print("Sorting p-values.", flush=True)
-        perm_pvalues = sorted(perm_pvalues)
-        pvalues = sorted(pvalues)
+        perm_order = np.argsort(perm_pvalues, kind="mergesort")
+        perm_pvalues = perm_pvalues[perm_order]
+        perm_weights = perm_weights[perm_order]
+        pvalues = np.sort(pvalues)
+
+        # Without adaptive permutations all weights are 1 / n_permutations.
+        if null_histogram is None and np.all(perm_weights == (1 / self.n_permutations)):
+            perm_weights = None
 
         # Create the FDR dataframes.
         print("Creating permutation FDR dataframe.", flush=True)
         perm_fdr_df, perm_cutoff = self.create_perm_fdr_df(pvalue_df,
                                                            pvalues,
                                                            perm_pvalues,
-                                                           self.n_permutations)
+                                                           self.n_permutations,
+                                                           perm_weights=perm_weights,
+                                                           null_histogram=null_histogram)
         perm_n_signif = self.count_n_significant(pvalues, perm_cutoff)
         print("\tPermutation FDR: {} p-values < signif. cutoff "
               "{:.2e} [{:.2f}%]".format(perm_n_signif, perm_cutoff,
@@ -216,75 +221,55 @@ class CombineAndPlot:
         self.compare_pvalue_scores(pvalue_df, perm_fdr_df, bh_fdr_df,
                                    workdir)
 
-    @staticmethod
-    def combine_pickles(indir, filename, columns=False):
+    def check_eqtl_indices(self, store):
         """
-        Method for combining the pickled lists into one nested list.
+        Method for printing which eQTLs are present, missing or duplicated
+        in the result chunks.
 
-        :param indir: string, the input directory containing the pickle files.
-        :param filename: string, the prefix name of the input file.
-        :param columns: boolean, whether or not each pickle file has a column.
-        :return col_list: list, the columns of the content.
-        :return data: list, a nested list with the combined content.
+        :param store: object, the result store.
         """
-        # Declare variables.
-        col_list = None
-        data = []
-
-        # Combine the found files.
-        for i, fpath in enumerate(glob.glob(os.path.join(indir, filename,
-                                                         filename + "*.pkl"))):
-            with open(fpath, "rb") as f:
-                try:
-                    content = pickle.load(f)
-                    if columns and i == 0:
-                        col_list = content[0]
-                    data.extend(content[1:])
-                    # print("\tLoaded list: {} with length: {}".format(
-                    #     get_basename(fpath), len(content)))
-                except EOFError:
-                    print("\tEOFError in: {} ".format(get_basename(fpath)))
-            f.close()
-
-        return col_list, data
-
-    def create_df(self, data, columns):
+        eqtl_indices, duplicated = store.select_rows()
+        if len(eqtl_indices) == 0:
+            print("\tNo eQTLs found.")
+            return
+
+        reference = np.arange(eqtl_indices.min(), eqtl_indices.max() + 1)
+        missing = np.setdiff1d(reference, eqtl_indices)
+        print("\tPresent indices: {}".format(self.group_consecutive_numbers(eqtl_indices)))
+        print("\tMissing indices: {}".format(self.group_consecutive_numbers(missing)))
+        print("\tDuplicate indices: {}".format(self.group_consecutive_numbers(duplicated)))
+
+    @staticmethod
+    def create_df(store, key):
         """
-        Method for creating a pandas dataframe from a nested list.
+        Method for creating a pandas dataframe from the result store.
+        Duplicate eQTLs are removed and missing eQTLs are inserted as NaN.
 
-        :param data: list, a nested list with the data.
-        :param columns: list, the column names.
+        :param store: object, the result store.
+        :param key: string, the name of the result table.
         :return df: DataFrame, the created pandas dataframe.
         """
-        # Crate the data frame.
-        df = pd.DataFrame(data, columns=columns)
-        order_col = df.columns[0]
-        df.sort_values(by=order_col, inplace=True)
-        print("\tInput shape: {}".format(df.shape))
-
-        # Check what eQTLs are present, missing, duplicated.
-        reference = set(np.arange(df[order_col].min(), df[order_col].max() + 1))
-        present = set(df[order_col])
-        print("\tPresent indices: {}".format(self.group_consecutive_numbers(present)))
-        missing = list(set(df[order_col]).symmetric_difference(reference))
-        print("\tMissing indices: {}".format(self.group_consecutive_numbers(missing)))
-        duplicated = list(df.loc[df.duplicated([order_col]), order_col].values)
-        print("\tDuplicate indices: {}".format(self.group_consecutive_numbers(duplicated)))
-
-        # Remove duplicate eQTLs.
-        df.drop_duplicates(subset=order_col, keep="first", inplace=True)
+        eqtl_indices, _ = store.select_rows()
+        genotype_names, data = store.get_table(key)
+        print("\tInput shape: {}".format(data.shape))
 
         # Insert missing eQTLs.
-        if len(missing) > 0:
-            print("\tInserting missing indices")
-            missing_df = pd.Series(missing).to_frame()
-            missing_df.columns = [order_col]
-            df = pd.concat([df, missing_df], axis=0).reset_index(drop=True)
-            df.sort_values(by=order_col, inplace=True)
-
-        # Remove the eQTL order column and set the SNPName as index.
-        df.drop([order_col], axis=1, inplace=True)
-        df.set_index("-", inplace=True)
+        index = genotype_names.astype(object)
+        if len(eqtl_indices) > 0:
+            reference = np.arange(eqtl_indices.min(), eqtl_indices.max() + 1)
+            if len(reference) != len(eqtl_indices):
+                print("\tInserting missing indices")
+                positions = np.searchsorted(reference, eqtl_indices)
+                full_data = np.full((len(reference), data.shape[1]), np.nan)
+                full_data[positions, :] = data
+                full_index = np.full(len(reference), np.nan, dtype=object)
+                full_index[positions] = index
+                data = full_data
+                index = full_index
+
+        # Set the SNPName as columns.
+        df = pd.DataFrame(data, index=pd.Index(index, name="-"),
+                          columns=store.get_colnames())
         df = df.T
         print("\tOutput shape: {}".format(df.shape))
 
@@ -296,29 +281,18 @@ class CombineAndPlot:
         tmp = [list(g) for k, g in groups]
         return [str(x[0]) if len(x) == 1 else "{}-{}".format(x[0], x[-1]) for x in tmp]
 
-    def create_zscore_df(self, df):
+    @staticmethod
+    def create_zscore_df(df):
         """
         Method for converting a dataframe of p-values to z-scores.
 
         :param df: DataFrame, a dataframe containing p-values.
         :return zscore_df: DataFrame, a dataframe containing z-scores
         """
-        count = 1
-        total = df.shape[0] * df.shape[1]
-
-        zscore_df = pd.DataFrame(np.nan, index=df.index, columns=df.columns)
-        for row_index in range(df.shape[0]):
-            for col_index in range(df.shape[1]):
-                if (count == 1) or (count % int(total / 10) == 0) or (count == total):
-                    print("\tworking on {}/{} [{:.2f}%]".format(count,
-                                                                total,
-                                                                (100 / total) * count))
-                pvalue = df.iloc[row_index, col_index]
-                zscore = self.get_z_score(pvalue)
-                zscore_df.iloc[row_index, col_index] = zscore
-                count += 1
-
-        return zscore_df
+        # Same limits as get_z_score.
+        pvalues = np.clip(df.values.astype(np.float64), 1e-323, 1.0 - 1e-16)
+        return pd.DataFrame(stats.norm.isf(pvalues), index=df.index,
+                            columns=df.columns)
 
     @staticmethod
     def get_z_score(p_value):
@@ -339,7 +313,7 @@ class CombineAndPlot:
         return stats.norm.isf(p_value)
 
     @staticmethod
-    def plot_distributions(perm_pvalues, pvalues, outdir):
+    def plot_distributions(perm_pvalues, pvalues, outdir, perm_weights=None):
         """
         Method for visualizing the distribution of the null and alternative
         p-values.
@@ -347,10 +321,15 @@ class CombineAndPlot:
         :param perm_pvalues: list, the sorted null model p-values.
         :param pvalues: list, the sorted alternative model p-values.
         :param outdir: string, the output directory for the image.
+        :param perm_weights: ndarray, the weight of each null model p-value,
+                             None for equal weights.
         """
         # Create bins.
         bins = np.linspace(0, 1, 50)
-        perm_pvalues_bins = pd.cut(perm_pvalues, bins=bins).value_counts().to_frame()
+        if perm_weights is None:
+            perm_pvalues_bins = pd.cut(perm_pvalues, bins=bins).value_counts().to_frame()
+        else:
+            perm_pvalues_bins = pd.Series(perm_weights).groupby(pd.cut(perm_pvalues, bins=bins), observed=False).sum().to_frame()
         pvalues_bins = pd.cut(pvalues, bins=bins).value_counts().to_frame()
         df = perm_pvalues_bins.merge(pvalues_bins, left_index=True, right_index=True)
         df.columns = ["perm_pvalues", "pvalues"]
@@ -420,45 +399,60 @@ class CombineAndPlot:
         plt.close()
 
     @staticmethod
-    def create_perm_fdr_df(df, pvalues, perm_pvalues, n_perm):
+    def create_perm_fdr_df(df, pvalues, perm_pvalues, n_perm,
+                           perm_weights=None, null_histogram=None):
         """
         Method for creating the permutation False Discovery Rate dataframe.
 
         FDR = (permutation rank / number of permutations) / actual rank
 
+        If the number of permutations differs per eQTL - covariate pair
+        (adaptive mode) the permutation rank / number of permutations is
+        the sum of the weights (1 / number of permutations of the pair) of
+        the permutation p-values below the p-value.
+
+        If a null histogram is given the weight of the permutation p-values
+        below the upper edge of the bin of the p-value is used instead. This
+        FDR lies between the exact FDR of the p-value and the exact FDR of a
+        p-value at most a factor 10 ** (1 / bins per decade) larger.
+
         :param df: DataFrame, the alternative p-value dataframe.
         :param perm_pvalues: list, the sorted null model p-values.
         :param pvalues: list, the sorted alternative model p-values.
         :param n_perm: int, the number of permutations performed.
+        :param perm_weights: ndarray, the weight of each null model p-value,
+                             None for equal weights of 1 / n_perm.
+        :param null_histogram: NullHistogram, the merged null histogram, None
+                               to use the permutation p-values.
         :return fdr_df: DataFrame, the permutation FDR dataframe.
         """
-        count = 1
-        total = df.shape[0] * df.shape[1]
-
-        max_signif_pvalue = -np.inf
-
-        fdr_df = pd.DataFrame(np.nan, index=df.index, columns=df.columns)
-        for row_index in range(df.shape[0]):
-            for col_index in range(df.shape[1]):
-                if (count == 1) or (count % int(total / 10) == 0) or (count == total):
-                    print("\tworking on {}/{} [{:.2f}%]".format(count,
-                                                                total,
-                                                                (100 / total) * count))
-                pvalue = df.iloc[row_index, col_index]
-                rank = bisect_left(pvalues, pvalue)
-                perm_rank = bisect_left(perm_pvalues, pvalue)
-                if (rank > 0) and (perm_rank > 0):
-                    fdr_value = (perm_rank / n_perm) / rank
-                    if fdr_value > 1:
-                        fdr_value = 1
-                else:
-                    fdr_value = 0
-                fdr_df.iloc[row_index, col_index] = fdr_value
+        values = df.values.astype(np.float64)
+        nan_mask = np.isnan(values)
+
+        # The rank is the number of p-values smaller than the p-value. A
+        # missing p-value has rank 0.
+        rank = np.searchsorted(pvalues, values, side="left")
+        rank[nan_mask] = 0
+
+        if null_histogram is not None:
+            null_count = null_histogram.get_null_counts(values)
+        else:
+            perm_rank = np.searchsorted(perm_pvalues, values, side="left")
+            perm_rank[nan_mask] = 0
+            if perm_weights is None:
+                null_count = perm_rank / n_perm
+            else:
+                cum_perm_weights = np.concatenate(([0], np.cumsum(perm_weights)))
+                null_count = cum_perm_weights[perm_rank]
 
-                if fdr_value < 0.05 and pvalue > max_signif_pvalue:
-                    max_signif_pvalue = pvalue
+        fdr_values = np.zeros(values.shape, dtype=np.float64)
+        mask = (rank > 0) & (null_count > 0)
+        fdr_values[mask] = null_count[mask] / rank[mask]
+        fdr_values[fdr_values > 1] = 1
 
-                count += 1
+        max_signif_pvalue = CombineAndPlot.get_max_signif_pvalue(values,
+                                                                 fdr_values)
+        fdr_df = pd.DataFrame(fdr_values, index=df.index, columns=df.columns)
 
         return fdr_df, max_signif_pvalue
 
@@ -474,47 +468,50 @@ class CombineAndPlot:
         :param pvalues: list, the sorted alternative model p-values.
         :return fdr_df: DataFrame, the Benjamini-Hochberg FDR dataframe.
         """
-        count = 1
-        total = df.shape[0] * df.shape[1]
-
-        max_signif_pvalue = -np.inf
-
+        values = df.values.astype(np.float64)
         m = np.count_nonzero(~np.isnan(pvalues))
-        fdr_df = pd.DataFrame(np.nan, index=df.index, columns=df.columns)
-        fdr_values = []
-        for row_index in range(df.shape[0]):
-            for col_index in range(df.shape[1]):
-                if (count == 1) or (count % int(total / 10) == 0) or (count == total):
-                    print("\tworking on {}/{} [{:.2f}%]".format(count,
-                                                                total,
-                                                                (100 / total) * count))
-                pvalue = df.iloc[row_index, col_index]
-                rank = bisect_left(pvalues, pvalue) + 1
-                fdr_value = pvalue * (m / rank)
-                if fdr_value > 1:
-                    fdr_value = 1
-                fdr_values.append((rank, row_index, col_index, fdr_value))
-                fdr_df.iloc[row_index, col_index] = fdr_value
-
-                if fdr_value < 0.05 and pvalue > max_signif_pvalue:
-                    max_signif_pvalue = pvalue
-
-                count += 1
 
-        # Make sure the BH FDR is a monotome function. This goes through
-        # the FDR values backwords and make sure that the next FDR is always
-        # lower or equal to the previous.
-        fdr_values = sorted(fdr_values, key=lambda x: x[0], reverse=True)
-        prev_fdr_value = None
-        for (rank, row_index, col_index, fdr_value) in fdr_values:
-            if prev_fdr_value is not None and fdr_value > prev_fdr_value:
-                fdr_df.iloc[row_index, col_index] = prev_fdr_value
-                prev_fdr_value = prev_fdr_value
-            else:
-                prev_fdr_value = fdr_value
+        # A missing p-value has rank 1.
+        rank = np.searchsorted(pvalues, values, side="left") + 1
+        rank[np.isnan(values)] = 1
+        with np.errstate(invalid='ignore'):
+            fdr_values = values * (m / rank)
+            fdr_values[fdr_values > 1] = 1
+
+        max_signif_pvalue = CombineAndPlot.get_max_signif_pvalue(values,
+                                                                 fdr_values)
+
+        # Make sure the BH FDR is a monotome function. Going through the
+        # FDR values from the highest to the lowest rank, each FDR is set to
+        # the minimum of the FDR values so far. A missing value restarts the
+        # minimum.
+        flat_fdr_values = fdr_values.ravel()
+        order = np.argsort(-rank.ravel(), kind="stable")
+        ordered_values = pd.Series(flat_fdr_values[order])
+        segments = np.cumsum(ordered_values.isnull().values)
+        flat_fdr_values[order] = ordered_values.groupby(segments).cummin().values
+        fdr_df = pd.DataFrame(flat_fdr_values.reshape(fdr_values.shape),
+                              index=df.index, columns=df.columns)
 
         return fdr_df, max_signif_pvalue
 
+    @staticmethod
+    def get_max_signif_pvalue(pvalues, fdr_values, a=0.05):
+        """
+        Method for getting the highest p-value with a FDR below the
+        significance cut-off.
+
+        :param pvalues: ndarray, the p-values.
+        :param fdr_values: ndarray, the FDR values.
+        :param a: float, the significance cut-off.
+        :return : float, the highest significant p-value, -inf if none.
+        """
+        with np.errstate(invalid='ignore'):
+            mask = (fdr_values < a) & ~np.isnan(pvalues)
+        if not np.any(mask):
+            return -np.inf
+        return np.max(pvalues[mask])
+
     @staticmethod
     def count_n_significant(sorted_values, threshold):
         """
@@ -576,6 +573,11 @@ class CombineAndPlot:
                     if index2 < index1:
                         plot_df = plot_df.loc[plot_df.max(axis=1) <= a, :]
 
+                    # Nothing to compare, e.g. no significant values.
+                    if len(plot_df.index) == 0:
+                        ax.set_axis_off()
+                        continue
+
                     # Calculate the lower and upper bound of the axis.
                     xy_min = plot_df.values.min()
                     xy_max = plot_df.values.max()
@@ -586,7 +588,8 @@ class CombineAndPlot:
                     diff = round((plot_df[label2] - plot_df[label1]) ** 2, precision)
                     max_col_value = math.ceil(diff.max() * (10 ** precision))
                     colormap = self.create_color_map(length=max_col_value, precision=precision)
-                    colors = diff.map(colormap, na_action=Color(rgb=(0.698, 0.133, 0.133)))
+                    na_color = Color(rgb=(0.698, 0.133, 0.133)).rgb
+                    colors = diff.map(lambda x: colormap.get(x, na_color))
 
                     # Plot.
                     # print("[{}, {}]\tx: {}\ty: {}".format(index2+1, index1, label1, label2))
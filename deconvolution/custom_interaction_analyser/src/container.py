@@ -1,7 +1,7 @@
 """
 File:         container.py
 Created:      2020/05/06
-Last Changed: 2020/06/02
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -23,69 +23,71 @@ root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
 # Standard imports.
 
 # Third party imports.
-
+import numpy as np
 
 # Local application imports.
 
 
 class Container:
     def __init__(self, colnames):
-        # Initialize the result list.
-        self.pvalues_buffer = [[-1, "-"] + colnames]
-        self.snp_tvalues_buffer = [[-1, "-"] + colnames]
-        self.inter_tvalues_buffer = [[-1, "-"] + colnames]
-        self.perm_pvalues_buffer = []
-
-        # Initialize a new row.
-        self.pvalues = None
-        self.snp_tvalues = None
-        self.inter_tvalues = None
-        self.perm_pvalues = None
-
-    def add_row(self, eqtl_index, genotype_name):
-        self.pvalues = [eqtl_index, genotype_name]
-        self.snp_tvalues = [eqtl_index, genotype_name]
-        self.inter_tvalues = [eqtl_index, genotype_name]
-
+        self.colnames = colnames
+
+        # Initialize the result lists.
+        self.eqtl_indices = []
+        self.genotype_names = []
+        self.pvalues = []
+        self.snp_tvalues = []
+        self.inter_tvalues = []
         self.perm_pvalues = []
-
-    def store_row(self):
-        self.pvalues_buffer.append(self.pvalues)
-        self.snp_tvalues_buffer.append(self.snp_tvalues)
-        self.inter_tvalues_buffer.append(self.inter_tvalues)
-        self.perm_pvalues_buffer.extend(self.perm_pvalues)
-
-        self.pvalues = None
-        self.snp_tvalues = None
-        self.inter_tvalues = None
-        self.perm_pvalues = None
-
-    def add_pvalue(self, order_id, value):
-        if order_id == 0:
-            self.pvalues.append(value)
-        else:
-            self.perm_pvalues.append(value)
-
-    def add_snp_tvalue(self, order_id, value):
-        if order_id == 0:
-            self.snp_tvalues.append(value)
-        else:
-            pass
-
-    def add_inter_tvalue(self, order_id, value):
-        if order_id == 0:
-            self.inter_tvalues.append(value)
-        else:
-            pass
+        self.n_permutations = []
+
+    def add_row(self, eqtl_index, genotype_name, pvalues, snp_tvalues,
+                inter_tvalues, n_permutations):
+        """
+        Add the results of one eQTL. The matrices have the covariates of
+        this container as rows and the sample orders as columns, the first
+        order is the normal order. Permutations that were not performed
+        are NaN.
+        """
+        self.eqtl_indices.append(eqtl_index)
+        self.genotype_names.append(genotype_name)
+        self.pvalues.append(pvalues[:, 0])
+        self.snp_tvalues.append(snp_tvalues[:, 0])
+        self.inter_tvalues.append(inter_tvalues[:, 0])
+        self.perm_pvalues.append(pvalues[:, 1:])
+        self.n_permutations.append(n_permutations)
+
+    def get_colnames(self):
+        return self.colnames
+
+    def get_n_rows(self):
+        return len(self.eqtl_indices)
+
+    def get_eqtl_indices(self):
+        return np.array(self.eqtl_indices, dtype=np.int64)
+
+    def get_genotype_names(self):
+        return np.array(self.genotype_names, dtype=str)
 
     def get_pvalues(self):
-        return self.pvalues_buffer
+        return self.stack(self.pvalues, (0, len(self.colnames)))
 
     def get_snp_tvalues(self):
-        return self.snp_tvalues_buffer
+        return self.stack(self.snp_tvalues, (0, len(self.colnames)))
 
     def get_inter_tvalues(self):
-        return self.inter_tvalues_buffer
+        return self.stack(self.inter_tvalues, (0, len(self.colnames)))
 
     def get_perm_pvalues(self):
-        return self.perm_pvalues_buffer
\ No newline at end of file
+        return self.stack(self.perm_pvalues, (0, len(self.colnames), 0))
+
+    def get_n_permutations(self):
+        if len(self.n_permutations) == 0:
+            return np.empty((0, len(self.colnames)), dtype=np.int32)
+        return np.stack(self.n_permutations).astype(np.int32)
+
+    @staticmethod
+    def stack(rows, empty_shape):
+        if len(rows) == 0:
+            return np.empty(empty_shape, dtype=np.float64)
+        return np.stack(rows).astype(np.float64)
@@ -0,0 +1,170 @@
+"""
+File:         design_cache.py
+Created:      2026/10/18
+Last Changed: 2026/10/18
+Author:       M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+from collections import OrderedDict
+
+# Third party imports.
+import numpy as np
+
+# Local application imports.
+from .batched_ols import Factorization
+
+
+class NullDesign:
+    """
+    NullDesign: class containing the sample subset of the covariate
+        matrices for one missing genotype pattern and the factorization of
+        the part of the null model that does not depend on the SNP.
+    """
+
+    def __init__(self, mask, tech_cov_m, cov_m, perm_cov_m, is_tech_cov):
+        """
+        Initializer of the class.
+
+        :param mask: ndarray, boolean mask of the samples with a genotype.
+        :param tech_cov_m: ndarray, the technical covariates matrix.
+        :param cov_m: ndarray, the covariates matrix.
+        :param perm_cov_m: ndarray, the covariates matrix for every sample
+                           order (covariates x orders x samples).
+        :param is_tech_cov: ndarray, whether or not each covariate is a
+                            technical covariate.
+        """
+        self.eqtl_indices = np.flatnonzero(mask)
+        self.all_present = len(self.eqtl_indices) == len(mask)
+        self.cov_m = cov_m
+        self.perm_cov_m = perm_cov_m
+        self.is_tech_cov = is_tech_cov
+
+        # Subset the present samples.
+        self.technical_covs = tech_cov_m[:, self.eqtl_indices]
+
+        # The intercept and the technical covariates.
+        self.tech_matrix = np.column_stack((np.ones(len(self.eqtl_indices)),
+                                            self.technical_covs.T))
+        self.tech_factorization = Factorization(self.tech_matrix)
+
+        # The factorizations with a covariate of interest, created when
+        # needed.
+        self.cov_factorizations = {}
+
+    def get_eqtl_indices(self):
+        return self.eqtl_indices
+
+    def get_technical_covs(self):
+        return self.technical_covs
+
+    def get_n_orders(self):
+        return self.perm_cov_m.shape[1]
+
+    def get_factorization(self, cov_index):
+        """
+        Method for getting the factorization of the intercept, technical
+        covariates and, if it isn't a technical covariate already, the
+        covariate of interest.
+
+        :param cov_index: int, the index of the covariate.
+        :return : Factorization, the factorization.
+        """
+        if self.is_tech_cov[cov_index]:
+            return self.tech_factorization
+
+        if cov_index not in self.cov_factorizations:
+            cov = self.cov_m[cov_index, self.eqtl_indices]
+            self.cov_factorizations[cov_index] = \
+                self.tech_factorization.extend(cov[:, np.newaxis])
+
+        return self.cov_factorizations[cov_index]
+
+    def get_permuted_cov(self, cov_index, start=0, end=None):
+        """
+        Method for getting the covariate of interest for a range of sample
+        orders and only the present samples.
+
+        :param cov_index: int, the index of the covariate.
+        :param start: int, the first sample order.
+        :param end: int, the end (exclusive) of the sample orders.
+        :return : ndarray, the sample orders as rows and samples as columns.
+        """
+        perm_cov = self.perm_cov_m[cov_index, start:end, :]
+        if self.all_present:
+            return perm_cov
+        return perm_cov[:, self.eqtl_indices]
+
+
+class DesignCache:
+    """
+    DesignCache: least recently used cache of NullDesign objects with the
+        missing genotype pattern as key.
+    """
+
+    def __init__(self, tech_cov_m, cov_m, perm_cov_m, is_tech_cov,
+                 max_size=8):
+        """
+        Initializer of the class.
+
+        :param tech_cov_m: ndarray, the technical covariates matrix.
+        :param cov_m: ndarray, the covariates matrix.
+        :param perm_cov_m: ndarray, the covariates matrix for every sample
+                           order (covariates x orders x samples).
+        :param is_tech_cov: ndarray, whether or not each covariate is a
+                            technical covariate.
+        :param max_size: int, the maximum number of cached patterns.
+        """
+        self.tech_cov_m = tech_cov_m
+        self.cov_m = cov_m
+        self.perm_cov_m = perm_cov_m
+        self.is_tech_cov = is_tech_cov
+        self.max_size = max(1, max_size)
+
+        # Initialize variables.
+        self.designs = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, mask):
+        """
+        Method for getting the null design of a missing genotype pattern.
+
+        :param mask: ndarray, boolean mask of the samples with a genotype.
+        :return : NullDesign, the null design of this pattern.
+        """
+        key = np.packbits(mask).tobytes()
+        if key in self.designs:
+            self.hits += 1
+            self.designs.move_to_end(key)
+            return self.designs[key]
+
+        self.misses += 1
+        design = NullDesign(mask, self.tech_cov_m, self.cov_m,
+                            self.perm_cov_m, self.is_tech_cov)
+        self.designs[key] = design
+        if len(self.designs) > self.max_size:
+            self.designs.popitem(last=False)
+
+        return design
+
+    def get_hits(self):
+        return self.hits
+
+    def get_misses(self):
+        return self.misses
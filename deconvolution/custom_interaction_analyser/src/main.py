@@ -1,7 +1,7 @@
 """
 File:         main.py
 Created:      2020/04/23
-Last Changed: 2020/06/09
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -24,21 +24,20 @@ root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
 from __future__ import print_function
 from pathlib import Path
 from datetime import datetime
+from multiprocessing import Pool
 import pickle
-import random
 import time
-import gzip
 import os
 
 # Third party imports.
 import numpy as np
-import pandas as pd
-import scipy.stats as stats
-import statsmodels.api as sm
-from functools import reduce
 
 # Local application imports.
 from .storage import Storage
+from .checkpoint import Checkpoint
+from .result_store import ResultStore
+from .stage_timer import StageTimer
+from .worker import create_shared_array, init_worker, process_eqtl
 from general.local_settings import LocalSettings
 from general.utilities import check_file_exists, prepare_output_dir
 from general.df_utilities import load_dataframe
@@ -50,7 +49,7 @@ class Main:
     """
 
     def __init__(self, name, settings_file, skip_rows, n_eqtls, n_samples,
-                 verbose):
+                 cores, verbose):
         """
         Initializer of the class.
 
@@ -80,23 +79,49 @@ class Main:
         self.geno_inpath = os.path.join(input_dir, name, filenames["genotype"])
         self.expr_inpath = os.path.join(input_dir, name, filenames["expression"])
         self.cov_inpath = os.path.join(input_dir, name, filenames["covariates"])
+        dtypes = settings.get_setting("load_dtypes")
+        if dtypes is None:
+            dtypes = {}
+        self.geno_dtype = dtypes.get("genotype")
+        self.expr_dtype = dtypes.get("expression")
+        self.cov_dtype = dtypes.get("covariates")
         self.drop_covs = settings.get_setting("drop_covariates")
         self.tech_covs = settings.get_setting("technical_covariates")
         self.cov_outdir = settings.get_setting("covariates_folder")
         self.tech_cov_outdir = settings.get_setting("technical_covariates_folder")
-        self.perm_orders_filename = settings.get_setting("permutations_order_pickle_filename")
+        self.perm_seed_filename = settings.get_setting("permutation_seed_pickle_filename")
+        self.permutation_seed = settings.get_setting("permutation_seed")
+        self.results_folder = settings.get_setting("results_folder")
         self.pvalues_filename = settings.get_setting("actual_pvalues_pickle_filename")
         self.snp_tvalues_filename = settings.get_setting("snp_tvalues_pickle_filename")
         self.inter_tvalues_filename = settings.get_setting("inter_tvalues_pickle_filename")
         self.perm_pvalues_filename = settings.get_setting("permuted_pvalues_pickle_filename")
+        self.n_perm_filename = settings.get_setting("n_permutations_filename")
+        self.null_hist_filename = settings.get_setting("null_histogram_filename")
+        self.null_hist_bins = settings.get_setting("null_histogram_bins_per_decade")
+        self.checkpoint_filename = settings.get_setting("checkpoint_pickle_filename")
+        self.checkpoint_every = settings.get_setting("checkpoint_every_n_eqtls")
+        self.design_cache_size = settings.get_setting("design_cache_size")
+        self.record_timings = settings.get_setting("record_stage_timings")
+        self.timings_folder = settings.get_setting("timings_folder")
         self.n_permutations = settings.get_setting("n_permutations")
+        self.adaptive = None
+        if settings.get_setting("adaptive_permutations"):
+            self.adaptive = {"min_exceedances": settings.get_setting("adaptive_min_exceedances"),
+                             "batch_size": settings.get_setting("adaptive_batch_size")}
         self.max_end_time = int(time.time()) + settings.get_setting("max_runtime_in_hours") * 60 * 60
         self.panic_time = self.max_end_time - (settings.get_setting("panic_time_in_min") * 60)
         self.skip_rows = skip_rows
         self.n_eqtls = n_eqtls
         self.n_samples = n_samples
+        self.cores = cores
         self.verbose = verbose
 
+        # Initialize variables.
+        self.timer = None
+        if self.record_timings:
+            self.timer = StageTimer(self.max_end_time)
+
     def start(self):
         """
         Method to start the manager.
@@ -108,66 +133,48 @@ class Main:
         # Start the timer.
         start_time = int(time.time())
 
-        # Get the permutation orders.
-        permutation_orders = None
-        perm_orders_outfile = os.path.join(self.outdir,
-                                           self.perm_orders_filename + ".pkl")
-        if check_file_exists(perm_orders_outfile):
-            print("Loading permutation order")
-            permutation_orders = self.load_pickle(perm_orders_outfile)
-
-            # Validate the permutation orders for the given input.
-            if len(permutation_orders) != (self.n_permutations + 1):
-                print("\tinvalid")
-                permutation_orders = None
-
-            if permutation_orders is not None:
-                for order in permutation_orders:
-                    if len(order) != self.n_samples:
-                        print("\tinvalid")
-                        permutation_orders = None
-                        break
-
-            print("\tvalid")
-
-        if permutation_orders is None:
-            print("Creating permutation order")
-            permutation_orders = self.create_perm_orders()
-            self.dump_pickle(permutation_orders, self.outdir,
-                             self.perm_orders_filename)
+        # Get the permutation seed. All jobs use the same seed so the
+        # permutation orders are identical across the chunks.
+        permutation_seed = self.get_permutation_seed()
 
         # Start the work.
         print("Start the analyses", flush=True)
-        storage = self.work(permutation_orders)
+        storage, checkpoint, finished, n_eqtls = self.work(permutation_seed)
+        chunk_name = "{}_{}_{}".format(self.skip_rows, self.n_eqtls,
+                                       int(time.time()))
+        if not finished:
+            print("Not all eQTLs are analysed, resubmit the job to resume "
+                  "from the checkpoint", flush=True)
+            # The timings of an unfinished job are needed to size the jobs.
+            if self.timer is not None:
+                self.write_timings(chunk_name + "_partial", partial=True)
+            return
         tc_container = storage.get_tech_cov_container()
         c_container = storage.get_cov_container()
 
         print("Saving output files", flush=True)
-        filename_suffix = "{}_{}".format(self.skip_rows, self.n_eqtls)
+        stage_start = time.time()
         for container, outdir in zip([tc_container, c_container], [self.tech_cov_outdir, self.cov_outdir]):
-            full_outdir = os.path.join(self.outdir, outdir)
+            full_outdir = os.path.join(self.outdir, outdir, self.results_folder)
             prepare_output_dir(full_outdir)
 
-            self.dump_pickle(container.get_pvalues(),
-                             full_outdir,
-                             self.pvalues_filename,
-                             filename_suffix=filename_suffix,
-                             subdir=True, unique=True)
-            self.dump_pickle(container.get_snp_tvalues(),
-                             full_outdir,
-                             self.snp_tvalues_filename,
-                             filename_suffix=filename_suffix,
-                             subdir=True, unique=True)
-            self.dump_pickle(container.get_inter_tvalues(),
-                             full_outdir,
-                             self.inter_tvalues_filename,
-                             filename_suffix=filename_suffix,
-                             subdir=True, unique=True)
-            self.dump_pickle(container.get_perm_pvalues(),
-                             full_outdir,
-                             self.perm_pvalues_filename,
-                             filename_suffix=filename_suffix,
-                             subdir=True, unique=True)
+            store = ResultStore(full_outdir,
+                                filenames={"pvalues": self.pvalues_filename,
+                                           "snp_tvalues": self.snp_tvalues_filename,
+                                           "inter_tvalues": self.inter_tvalues_filename,
+                                           "perm_pvalues": self.perm_pvalues_filename,
+                                           "n_permutations": self.n_perm_filename,
+                                           "null_histogram": self.null_hist_filename},
+                                bins_per_decade=self.null_hist_bins)
+            store.write(container, chunk_name)
+
+        # The output files are complete, remove the checkpoint.
+        checkpoint.remove()
+
+        # Save the stage timings.
+        if self.timer is not None:
+            self.timer.add("storage", time.time() - stage_start)
+            self.write_timings(chunk_name)
 
         # Print the process time.
         run_time = int(time.time()) - start_time
@@ -177,31 +184,54 @@ class Main:
               "{} second(s)".format(int(run_time_hour),
                                     int(run_time_min),
                                     int(run_time_sec)))
-        print("Received {:.2f} analyses per minute".format((self.n_eqtls * (self.n_permutations + 1)) /
-                                                           (run_time / 60)))
+        if run_time > 0:
+            print("Received {:.2f} analyses per minute".format((n_eqtls * (self.n_permutations + 1)) /
+                                                               (run_time / 60)))
 
         # Shutdown the manager.
         print("Shutting down manager [{}]".format(
             datetime.now().strftime("%d-%m-%Y, %H:%M:%S")), flush=True)
 
-    def work(self, permutation_orders):
+    def write_timings(self, name, partial=False):
         """
-        Method that does the interaction analysis.
+        Method for printing and saving the stage timings.
 
-        :param storage: object, a storage object containing all results.
+        :param name: string, the name of the output files.
+        :param partial: boolean, whether or not the job stopped before all
+                        eQTLs were analysed.
+        """
+        self.timer.print_summary()
+        timings_outdir = os.path.join(self.outdir, self.timings_folder)
+        prepare_output_dir(timings_outdir)
+        self.timer.write(timings_outdir, name, partial=partial)
+
+    def work(self, permutation_seed):
+        """
+        Method that does the interaction analysis. Finished eQTLs are
+        appended to a checkpoint file and are not recalculated when the job
+        is restarted.
+
+        :param permutation_seed: int, the seed of the permutation orders.
+        :return storage: object, a storage object containing all results.
+        :return checkpoint: object, the checkpoint of this job.
+        :return finished: boolean, whether or not all eQTLs are analysed.
+        :return n_eqtls: int, the number of eQTLs of this job.
         """
         # Load the data
         print("Loading data", flush=True)
-        cov_df = load_dataframe(self.cov_inpath, header=0, index_col=0)
+        stage_start = time.time()
+        cov_df = load_dataframe(self.cov_inpath, header=0, index_col=0,
+                                dtype=self.cov_dtype)
 
+        end_row = None
+        if self.n_eqtls is not None:
+            end_row = self.skip_rows + self.n_eqtls
         geno_df = load_dataframe(self.geno_inpath, header=0, index_col=0,
-                                 skiprows=[i for i in
-                                           range(1,  self.skip_rows + 1)],
-                                 nrows=self.n_eqtls)
+                                 rows=slice(self.skip_rows, end_row),
+                                 dtype=self.geno_dtype)
         expr_df = load_dataframe(self.expr_inpath, header=0, index_col=0,
-                                 skiprows=[i for i in
-                                           range(1,  self.skip_rows + 1)],
-                                 nrows=self.n_eqtls)
+                                 rows=slice(self.skip_rows, end_row),
+                                 dtype=self.expr_dtype)
 
         # Drop the covariates we don't want.
         if len(self.drop_covs) > 0:
@@ -213,10 +243,6 @@ class Main:
         tech_cov_df = cov_df.loc[self.tech_covs, :].copy()
         print("\tShape: {}".format(tech_cov_df.shape))
 
-        # Replace -1 with NaN in the genotype dataframe. This way we can
-        # drop missing values.
-        geno_df.replace(-1, np.nan, inplace=True)
-
         # Initialize the storage object.
         print("Creating storage object")
         tech_cov_names = []
@@ -229,161 +255,115 @@ class Main:
         storage = Storage(tech_covs=tech_cov_names, covs=cov_names)
         storage.print_info()
 
-        # Start working.
+        # Create the permutation orders.
+        print("Creating permutation orders")
+        permutation_orders = self.create_perm_orders(permutation_seed,
+                                                     cov_df.shape[1])
+        print("\tShape: {}".format(permutation_orders.shape))
+
+        # Convert the data to numpy for the regression engine. The genotype
+        # and expression matrices keep their loaded dtype and are converted
+        # to float64 per eQTL. Every covariate is permuted once for all
+        # sample orders, this is reused for all eQTLs.
+        cov_m = cov_df.values.astype(np.float64)
+        arrays = {"geno": self.get_genotype_matrix(geno_df),
+                  "expr": self.get_value_matrix(expr_df),
+                  "tech_cov": tech_cov_df.values.astype(np.float64),
+                  "cov": cov_m,
+                  "perm_cov": cov_m[:, permutation_orders]}
+        cov_names = list(cov_df.index)
+        is_tech_cov = np.array([x in self.tech_covs for x in cov_names])
+        n_eqtls = geno_df.shape[0]
+        if self.timer is not None:
+            self.timer.add("data_loading", time.time() - stage_start)
+
+        # Load the results of a previous run of this job.
+        print("Loading checkpoint")
+        checkpoint_dir = os.path.join(self.outdir, self.checkpoint_filename)
+        prepare_output_dir(checkpoint_dir)
+        checkpoint = Checkpoint(fpath=os.path.join(checkpoint_dir,
+                                                   "{}_{}_{}.pkl".format(self.checkpoint_filename,
+                                                                         self.skip_rows,
+                                                                         self.n_eqtls)),
+                                skip_rows=self.skip_rows,
+                                n_eqtls=self.n_eqtls,
+                                cov_names=cov_names,
+                                permutation_orders=permutation_orders,
+                                adaptive=self.adaptive,
+                                flush_every=self.checkpoint_every)
+        finished_results = checkpoint.load()
+        todo = [i for i in range(n_eqtls) if i not in finished_results]
+        print("\t{} eQTLs finished, {} to do".format(n_eqtls - len(todo),
+                                                   len(todo)))
+
+        # Start working. With multiple cores the matrices are put in shared
+        # memory and the eQTLs are divided over a pool of workers. The
+        # results are returned in eQTL order.
         print("Starting interaction analyser", flush=True)
-        for row_index, eqtl_index in enumerate([i for i in
-                                                range(self.skip_rows,
-                                                      self.skip_rows +
-                                                      self.n_eqtls)]):
+        pool = None
+        if self.cores > 1:
+            print("\tUsing {} cores".format(self.cores), flush=True)
+            shared_arrays = {name: create_shared_array(array)
+                             for name, array in arrays.items()}
+            pool = Pool(processes=self.cores,
+                        initializer=init_worker,
+                        initargs=(shared_arrays, cov_names, is_tech_cov,
+                                  self.panic_time, self.design_cache_size,
+                                  self.adaptive, self.timer is not None,
+                                  self.verbose))
+            results = pool.imap(process_eqtl, todo)
+        else:
+            init_worker(arrays, cov_names, is_tech_cov, self.panic_time,
+                        self.design_cache_size, self.adaptive,
+                        self.timer is not None, self.verbose)
+            results = map(process_eqtl, todo)
+        if self.timer is not None:
+            self.timer.start_analysis()
+
+        finished = True
+        for row_index in range(n_eqtls):
+            eqtl_index = self.skip_rows + row_index
             print("\tProcessing eQTL {}/{} "
                   "[{:.0f}%]".format(row_index + 1,
-                                     self.n_eqtls,
-                                     (100 / self.n_eqtls) * (row_index + 1)),
+                                     n_eqtls,
+                                     (100 / n_eqtls) * (row_index + 1)),
                   flush=True)
 
-            # Get the complete genotype row for the permutation later.
-            genotype_all = geno_df.iloc[row_index, :].copy()
-
-            # Get the missing genotype indices.
-            indices = np.arange(geno_df.shape[1])
-            eqtl_indices = indices[~geno_df.iloc[row_index, :].isnull().values]
-
-            # Subset the row and present samples for this eQTL.
-            genotype = geno_df.iloc[row_index, eqtl_indices].copy()
-            expression = expr_df.iloc[row_index, eqtl_indices].copy()
-            technical_covs = tech_cov_df.iloc[:, eqtl_indices].copy()
-            covariates = cov_df.iloc[:, eqtl_indices].copy()
-
-            # Create the null model. Null model are all the technical
-            # covariates multiplied with the genotype + the SNP.
-            tech_inter_matrix = technical_covs.mul(genotype, axis=1)
-            tech_inter_matrix.index = ["{}_X_SNP".format(x) for x in
-                                       technical_covs.index]
-            intercept = pd.DataFrame(1, index=genotype.index,
-                                     columns=["intercept"])
-            base_matrix = reduce(lambda left, right: pd.merge(left,
-                                                              right,
-                                                              left_index=True,
-                                                              right_index=True),
-                                 [intercept,
-                                  genotype.to_frame(),
-                                  technical_covs.T,
-                                  tech_inter_matrix.T])
-
-            # Initialize variables.
-            storage.add_row(eqtl_index, genotype.name)
-
-            # Loop over the covariates.
-            for cov_index in range(len(cov_df.index)):
-                if storage.has_error():
+            stage_start = time.time()
+            if row_index in finished_results:
+                eqtl_results = finished_results[row_index]
+            else:
+                _, eqtl_results, timings = next(results)
+
+                # Check whether we are almost running out of time.
+                if eqtl_results is None:
+                    print("\tPanic!!!", flush=True)
+                    finished = False
                     break
 
-                # Get the covariate we are processing.
-                covariate = covariates.iloc[cov_index, :]
-                cov_name = covariate.name
-
-                if self.verbose:
-                    print("\t\tWorking on '{}'".format(cov_name), flush=True)
-
-                # Add the covariate to the null matrix if it isn't already.
-                null_matrix = base_matrix.copy()
-                if cov_name not in null_matrix.columns:
-                    covariate_df = covariate.copy()
-                    null_matrix = null_matrix.merge(covariate_df.to_frame(),
-                                                    left_index=True,
-                                                    right_index=True)
-
-                # Create the null model.
-                n_null = null_matrix.shape[0]
-                df_null, rss_null, _ = self.create_model(null_matrix,
-                                                         expression)
-
-                # if self.verbose:
-                #     print("\t\tn_null: {}\tdf_null: {}\trss_null: {}\t".format(n_null, df_null, rss_null))
-
-                # Loop over each permutation sample order. The first order
-                # is the normal order and the remainder are random shuffles.
-                for order_id, sample_order in enumerate(permutation_orders):
-                    if storage.has_error():
-                        break
-
-                    if self.verbose:
-                        print("\t\t\tWorking on 'order_{}'".format(order_id),
-                              flush=True)
-
-                    # Reorder the covariate based on the sample order.
-                    # Make sure the labels are in the same order, just
-                    # shuffle the values.
-                    covariate_all = cov_df.iloc[cov_index, :].copy()
-                    covariate_all_index = covariate_all.index
-                    covariate_all = covariate_all.reindex(
-                        covariate_all.index[sample_order])
-                    covariate_all.index = covariate_all_index
-
-                    # Calculate the interaction effect of the covariate of
-                    # interest. Then drop the NA's from the interaction
-                    # term.
-                    inter_of_interest = covariate_all * genotype_all
-                    inter_name = "{}_X_SNP".format(cov_name)
-                    if inter_name in null_matrix.columns:
-                        inter_name = inter_name + "_2"
-                    inter_of_interest.name = inter_name
-                    inter_of_interest = inter_of_interest.iloc[eqtl_indices]
-
-                    # Check if the drop is identical (see above).
-                    if not inter_of_interest.index.equals(null_matrix.index):
-                        print("\t\t\tError in permutation reordering "
-                              "(ID: {})".format(order_id), flush=True)
-                        storage.set_error()
-                        continue
-
-                    # Create the alternative matrix and add the interaction
-                    # term.
-                    alt_matrix = null_matrix.copy()
-                    alt_matrix = alt_matrix.merge(inter_of_interest.to_frame(),
-                                                  left_index=True,
-                                                  right_index=True)
-
-                    # Create the alternative model.
-                    n_alt = alt_matrix.shape[0]
-                    df_alt, rss_alt, alt_tvalues = self.create_model(alt_matrix,
-                                                                     expression,
-                                                                     tvalue_cols=[genotype.name, inter_name])
-
-                    # if self.verbose:
-                    #     print("\t\t\tn_alt: {}\tdf_alt: {}\trss_alt: {}\talt_tvalues: {}".format(n_alt, df_alt, rss_alt, alt_tvalues))
-
-                    # Safe the t-values.
-                    storage.add_value(cov_name, order_id, "snp_tvalue", alt_tvalues[genotype.name])
-                    storage.add_value(cov_name, order_id, "inter_tvalue", alt_tvalues[inter_name])
-
-                    # Make sure the n's are identical.
-                    if n_null != n_alt:
-                        print("\t\t\tError due to unequal n_null and n_alt",
-                              flush=True)
-                        storage.set_error()
-                        continue
-
-                    # Compare the null and alternative model.
-                    fvalue = self.calc_f_value(rss_null, rss_alt,
-                                               df_null, df_alt, n_null)
-                    pvalue = self.get_p_value(fvalue, df_null, df_alt, n_null)
-
-                    # if self.verbose:
-                    #     print("\t\t\tfvalue: {}\tpvalue: {}".format(fvalue, pvalue))
-
-                    # Safe the p-values.
-                    storage.add_value(cov_name, order_id, "pvalue", pvalue)
-
-                    # Check whether we are almost running out of time.
-                    if time.time() > self.panic_time:
-                        print("\tPanic!!!", flush=True)
-                        return storage
+                stage_start = time.time()
+                checkpoint.add(row_index, eqtl_results)
+                if self.timer is not None:
+                    self.timer.add_eqtl(eqtl_index, timings)
 
             # Safe the results of the eQTL.
-            storage.store_row()
+            storage.add_row(eqtl_index, geno_df.index[row_index], cov_names,
+                            eqtl_results)
+            if self.timer is not None:
+                self.timer.add("storage", time.time() - stage_start,
+                               eqtl_index=eqtl_index)
+                self.timer.print_eta(len(todo))
+
+            if storage.has_error():
+                finished = False
+                break
+
+        checkpoint.flush()
+        if pool is not None:
+            pool.terminate()
+            pool.join()
 
-        return storage
+        return storage, checkpoint, finished, n_eqtls
 
     @staticmethod
     def load_pickle(fpath):
@@ -399,190 +379,96 @@ class Main:
 
         return content
 
-    @staticmethod
-    def dump_pickle(content, directory, filename, filename_suffix="",
-                    subdir=False, unique=False):
-        """
-        Method for dumping data to a pickle file.
-
-        :param content: , the pickle content.
-        :param directory: string, the pickle output directory.
-        :param filename: string, the pickle output file.
-        :param filename_suffix: string, a suffix for the output filename.
-        :param subdir: boolean, whether or not to put the file in equally
-                       named subdirectory.
-        :param unique: boolean, whether or not to make the filename unique.
+    def get_permutation_seed(self):
         """
-        full_directory = directory
-        if subdir:
-            full_directory = os.path.join(directory, filename)
-
-            if not os.path.exists(full_directory):
-                os.makedirs(full_directory)
+        Method for getting the seed of the permutation orders. The seed is
+        taken from the settings or the seed file in the output directory. If
+        neither exists a random seed is created. The seed file is created
+        atomically so simultaneously started jobs use the same seed.
 
-        full_filename = filename
-        if filename_suffix != "":
-            full_filename = "{}_{}".format(filename, filename_suffix)
-            if unique:
-                full_filename = "{}_{}_{}".format(filename,
-                                                  filename_suffix,
-                                                  int(time.time()))
-
-        fpath = os.path.join(full_directory, full_filename + ".pkl")
-
-        with open(fpath, "wb") as f:
-            pickle.dump(content, f)
+        :return seed: int, the permutation seed.
+        """
+        seed_outfile = os.path.join(self.outdir,
+                                    self.perm_seed_filename + ".pkl")
+        if self.permutation_seed is None and check_file_exists(seed_outfile):
+            print("Loading permutation seed")
+            seed = self.load_pickle(seed_outfile)
+            print("\tseed: {}".format(seed))
+            return seed
+
+        seed = self.permutation_seed
+        if seed is None:
+            print("Creating permutation seed")
+            seed = int(np.random.SeedSequence().entropy)
+        print("\tseed: {}".format(seed))
+
+        # Save the seed, if another job was first its seed is used.
+        tmp_outfile = "{}.{}.tmp".format(seed_outfile, os.getpid())
+        with open(tmp_outfile, "wb") as f:
+            pickle.dump(seed, f)
         f.close()
-
-        print_str = os.path.join(os.path.basename(os.path.dirname(fpath)),
-                                 os.path.basename(fpath))
-        print("\tcreated {}".format(print_str))
-
-    def create_perm_orders(self):
+        try:
+            os.link(tmp_outfile, seed_outfile)
+            print("\tcreated {}".format(os.path.basename(seed_outfile)))
+        except FileExistsError:
+            stored_seed = self.load_pickle(seed_outfile)
+            if self.permutation_seed is None:
+                seed = stored_seed
+                print("\tusing the seed of another job: {}".format(seed))
+            elif stored_seed != seed:
+                print("\tWarning, the seed differs from the seed of the "
+                      "previous jobs: {}".format(stored_seed))
+        finally:
+            os.remove(tmp_outfile)
+
+        return seed
+
+    def create_perm_orders(self, seed, n_samples):
         """
-        Method for creating x random shuffles of the column indices.
+        Method for creating the sample orders. The first order is the normal
+        order, the others are random shuffles of the sample indices.
 
-        return sample_orders: list, a nested list with sample orders.
+        :param seed: int, the seed of the random number generator.
+        :param n_samples: int, the number of samples.
+        :return sample_orders: ndarray, the sample orders as rows.
         """
-        sample_orders = [self.get_column_indices()]
-        for _ in range(self.n_permutations):
-            sample_orders.append(self.create_random_shuffle())
+        rng = np.random.default_rng(seed)
+        sample_orders = np.empty((self.n_permutations + 1, n_samples),
+                                 dtype=np.int32)
+        sample_orders[0, :] = np.arange(n_samples, dtype=np.int32)
+        for i in range(1, self.n_permutations + 1):
+            sample_orders[i, :] = rng.permutation(n_samples)
         return sample_orders
 
-    def get_column_indices(self):
-        """
-        Method for getting a ordered list of sample indices.
-
-        :return : list, ordered list with sample indices.
-        """
-        return [x for x in range(self.n_samples)]
-
-    def create_random_shuffle(self):
-        """
-        Method for creating a random shuffle of the column indices.
-
-        :return column_indices: list, a shuffles list with sample indices.
-        """
-        column_indices = self.get_column_indices()
-        random.shuffle(column_indices)
-        return column_indices
-
-    @staticmethod
-    def write_buffer(filename, buffer):
-        """
-        Method for writing a list of strings to a gzipped file,
-
-        :param filename: string, the output file path.
-        :param buffer: list, the lines of strings to write.
-        """
-        # Write output files.
-        if os.path.isfile(filename):
-            mode = 'ab'
-        else:
-            mode = 'wb'
-
-        with gzip.open(filename, mode) as f:
-            for line in buffer:
-                f.write(line.encode())
-        f.close()
-
     @staticmethod
-    def create_model(X, y, tvalue_cols=None):
-        """
-        Method for creating a multilinear model.
-
-        :param X: DataFrame, the matrix with rows as samples and columns as
-                             dimensions.
-        :param y: Series, the outcome values.
-        :param tvalue_cols: list, the name(s) of the variable(s) to get
-                            tvalue(s) for.
-        :return df: int, the degrees of freedom of this model.
-        :return ssr: float, the residual sum of squares of this fit.
-        :return tvalue: dict, beta  / std error.
+    def get_value_matrix(df):
         """
-        # # Filter on features with no standard deviation.
-        # stds = X.std(axis=0) > 0
-        # stds['intercept'] = True
-        # X = X.loc[:, stds]
-
-        df = X.shape[1]
+        Method for getting the values of a dataframe as numpy array. Values
+        loaded as float32 are kept as float32, others become float64.
 
-        # Perform the Ordinary least squares fit.
-        ols = sm.OLS(y.values, X)
-        try:
-            ols_result = ols.fit()
-        except np.linalg.LinAlgError as e:
-            print("\t\tError: {}".format(e))
-            return df, np.nan, {col: np.nan for col in tvalue_cols}
-
-        ssr = ols_result.ssr
-
-        tvalues = {}
-        if tvalue_cols is not None:
-            for col in tvalue_cols:
-                tvalue = 0
-                if col in X.columns:
-                    coef = ols_result.params[col]
-                    std_err = ols_result.bse[col]
-                    if std_err > 0:
-                        tvalue = coef / std_err
-                else:
-                    tvalue = np.nan
-                tvalues[col] = tvalue
-
-        return df, ssr, tvalues
-
-    @staticmethod
-    def calc_f_value(rss1, rss2, df1, df2, n):
+        :param df: DataFrame, the dataframe.
+        :return : ndarray, the values.
         """
-        Method for comparing the risdual sum squared of two models using
-        the F statistic.
-
-        :param rss1: float, the residual sum of squares of the null model.
-        :param rss2: float, the residual sum of squares of the alternative model.
-        :param df1: int, the degrees of freedom of the null model.
-        :param df2: int, the degrees of freedom of the alternative model.
-        :param n: int, the number of samples in the model.
-        :return : float, the p-value of the comparison.
-        """
-        if (rss1 == np.nan) or (rss2 == np.nan):
-            return np.nan
-        if df1 >= df2:
-            return np.nan
-        if df2 >= n:
-            return np.nan
-        if rss2 >= rss1:
-            return 0
-
-        return ((rss1 - rss2) / (df2 - df1)) / (rss2 / (n - df2))
+        values = df.to_numpy()
+        if values.dtype != np.float32:
+            values = values.astype(np.float64)
+        return values
 
-    @staticmethod
-    def get_p_value(f_value, df1, df2, n):
+    def get_genotype_matrix(self, geno_df):
         """
-        Method for getting the p-value corresponding to a F-distribution.
+        Method for getting the genotype values as numpy array with NaN for
+        missing values. With the 'genotype' dtype this was done on load,
+        otherwise -1 is replaced in the array.
 
-        :param f_value: float, the f-value.
-        :param df1: int, the degrees of freedom of the null model.
-        :param df2: int, the degrees of freedom of the alternative model.
-        :param n: int, the number of samples in the model.
-        :return : float, the p-value corresponding to the f-value.
+        :param geno_df: DataFrame, the genotype dataframe.
+        :return : ndarray, the genotype values.
         """
-        # Lower and upper limit of stats.f.sf
-        # stats.f.sf(1827.95, dfn=1, dfd=3661) = 5e-324
-        # stats.f.sf(9.9e-12, dfn=1, dfd=3661) = 0.9999974567714613
-
-        # Lower and upper limit of cdf
-        # stats.f.cdf(69, dfn=1, dfd=3661) = 0.9999999999999999
-        # stats.f.cdf(1e-320, dfn=1, dfd=3661) = 1.0730071046473278e-160
-
-        if f_value == np.nan:
-            return np.nan
-        if df1 >= df2:
-            return np.nan
-        if df2 >= n:
-            return np.nan
-
-        return stats.f.sf(f_value, dfn=(df2 - df1), dfd=(n - df2))
+        geno_m = self.get_value_matrix(geno_df)
+        if self.geno_dtype != "genotype":
+            if not geno_m.flags.writeable:
+                geno_m = geno_m.copy()
+            geno_m[geno_m == -1] = np.nan
+        return geno_m
 
     def print_arguments(self):
         """
@@ -596,14 +482,19 @@ class Main:
         print("  > Genotype datafile: {}".format(self.geno_inpath))
         print("  > Expression datafile: {}".format(self.expr_inpath))
         print("  > Covariates datafile: {}".format(self.cov_inpath))
+        print("  > Load dtypes: genotype: {}, expression: {}, covariates: "
+              "{}".format(self.geno_dtype, self.expr_dtype, self.cov_dtype))
         print("  > Drop covariates: {}".format(self.drop_covs))
         print("  > Technical covariates: {}".format(self.tech_covs))
         print("  > Output directory: {}".format(self.outdir))
         print("  > Permutations: {}".format(self.n_permutations))
+        print("  > Permutation seed: {}".format(self.permutation_seed))
+        print("  > Adaptive permutations: {}".format(self.adaptive))
         print("  > Panic datetime: {}".format(panic_time_string))
         print("  > Max end datetime: {}".format(end_time_string))
         print("  > Skip rows: {}".format(self.skip_rows))
         print("  > EQTLs: {}".format(self.n_eqtls))
         print("  > Samples: {}".format(self.n_samples))
+        print("  > Cores: {}".format(self.cores))
         print("  > Verbose: {}".format(self.verbose))
         print("", flush=True)
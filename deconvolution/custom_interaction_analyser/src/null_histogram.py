@@ -0,0 +1,149 @@
+"""
+File:         null_histogram.py
+Created:      2026/10/18
+Last Changed:
+Author:       M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+
+# Third party imports.
+import numpy as np
+
+# Local application imports.
+
+
+class NullHistogram:
+    """
+    NullHistogram: class containing a weighted histogram of permutation
+        p-values with bins of equal width on a log10 scale between 1e-324
+        and 1. Histograms are merged by adding the counts, the memory is
+        independent of the number of p-values.
+
+        Error bound: the null count of a p-value p is the weight of all
+        permutation p-values below the upper edge of the bin of p. This is
+        the exact null count of a p-value p' with p <= p' < p * 10 ** (1 /
+        bins_per_decade) (2.3% for 100 bins per decade). The permutation FDR
+        is therefore never lower than the exact FDR of p and never higher
+        than the exact FDR of p'.
+    """
+    n_decades = 324
+
+    def __init__(self, bins_per_decade=100, counts=None):
+        """
+        Initializer of the class.
+
+        :param bins_per_decade: int, the number of bins per factor 10.
+        :param counts: ndarray, the counts of an existing histogram.
+        """
+        if counts is not None:
+            if len(counts) % self.n_decades != 0:
+                print("Invalid null histogram length.")
+                exit()
+            bins_per_decade = len(counts) // self.n_decades
+
+        self.bins_per_decade = bins_per_decade
+        self.n_bins = self.n_decades * bins_per_decade
+        if counts is None:
+            counts = np.zeros(self.n_bins, dtype=np.float64)
+        self.counts = np.array(counts, dtype=np.float64)
+
+    def get_bins_per_decade(self):
+        return self.bins_per_decade
+
+    def get_counts(self):
+        return self.counts
+
+    def get_total(self):
+        return self.counts.sum()
+
+    def get_max_relative_error(self):
+        """
+        Method for getting the maximum relative difference between a
+        p-value and the upper edge of its bin.
+
+        :return : float, the relative error.
+        """
+        return 10 ** (1 / self.bins_per_decade) - 1
+
+    def get_bin_indices(self, pvalues):
+        """
+        Method for getting the bin of every p-value. P-values below 1e-324
+        (including 0) are in the first bin.
+
+        :param pvalues: ndarray, the p-values, may not contain NaN.
+        :return : ndarray, the bin indices.
+        """
+        with np.errstate(divide='ignore'):
+            logs = np.log10(np.asarray(pvalues, dtype=np.float64))
+        indices = np.floor((logs + self.n_decades) * self.bins_per_decade)
+        return np.clip(np.nan_to_num(indices, neginf=0),
+                       0, self.n_bins - 1).astype(np.int64)
+
+    def add(self, pvalues, weights):
+        """
+        Method for adding p-values to the histogram, NaN is skipped.
+
+        :param pvalues: ndarray, the p-values.
+        :param weights: ndarray, the weight of each p-value.
+        """
+        pvalues = np.asarray(pvalues, dtype=np.float64).ravel()
+        weights = np.asarray(weights, dtype=np.float64).ravel()
+        mask = ~np.isnan(pvalues)
+        self.counts += np.bincount(self.get_bin_indices(pvalues[mask]),
+                                   weights=weights[mask],
+                                   minlength=self.n_bins)
+
+    def merge(self, other):
+        """
+        Method for adding the counts of another histogram.
+
+        :param other: NullHistogram, the histogram to add.
+        """
+        if other.get_bins_per_decade() != self.bins_per_decade:
+            print("Unable to merge null histograms with a different "
+                  "number of bins.")
+            exit()
+        self.counts += other.get_counts()
+
+    def get_null_counts(self, pvalues):
+        """
+        Method for getting the weight of the permutation p-values below the
+        upper edge of the bin of every p-value. NaN gets 0.
+
+        :param pvalues: ndarray, the p-values.
+        :return : ndarray, the null counts.
+        """
+        pvalues = np.asarray(pvalues, dtype=np.float64)
+        nan_mask = np.isnan(pvalues)
+        cum_counts = np.cumsum(self.counts)
+        null_counts = cum_counts[self.get_bin_indices(np.where(nan_mask, 1, pvalues))]
+        null_counts[nan_mask] = 0
+        return null_counts
+
+    def get_bin_values(self):
+        """
+        Method for getting the geometric center and count of the non-empty
+        bins, e.g. for plotting the distribution.
+
+        :return centers: ndarray, the center of the non-empty bins.
+        :return counts: ndarray, the counts of the non-empty bins.
+        """
+        indices = np.flatnonzero(self.counts)
+        centers = 10 ** (((indices + 0.5) / self.bins_per_decade) - self.n_decades)
+        return centers, self.counts[indices]
@@ -0,0 +1,296 @@
+"""
+File:         result_store.py
+Created:      2026/10/18
+Last Changed: 2026/10/18
+Author:       M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+import os
+
+# Third party imports.
+import numpy as np
+
+# Local application imports.
+from .null_histogram import NullHistogram
+
+
+class ResultStore:
+    """
+    ResultStore: class for writing and reading the interaction analyser
+        results as typed numpy arrays. Every job writes one chunk directory
+        containing an eQTL index axis, a covariate axis and one .npy file per
+        result type. The chunks are read memory mapped so they can be sliced
+        and concatenated without loading them into Python objects. Next to
+        the raw permutation p-values every chunk contains a NullHistogram of
+        them so the null distribution of all chunks can be merged in
+        constant memory.
+    """
+    eqtl_index_filename = "eqtl_index"
+    genotype_names_filename = "genotype_names"
+    colnames_filename = "covariates"
+
+    def __init__(self, directory, filenames, bins_per_decade=100):
+        """
+        Initializer of the class.
+
+        :param directory: string, the directory containing the chunks.
+        :param filenames: dict, the filename of the 'pvalues', 'snp_tvalues',
+                          'inter_tvalues', 'perm_pvalues', 'n_permutations'
+                          and 'null_histogram' arrays.
+        :param bins_per_decade: int, the resolution of the null histogram.
+        """
+        self.directory = directory
+        self.filenames = filenames
+        self.bins_per_decade = bins_per_decade
+
+        # Initialize variables.
+        self.chunks = None
+        self.selection = None
+
+    def write(self, container, chunk_name):
+        """
+        Method for writing the content of a container as a new chunk. The
+        chunk is written to a temporary directory which is renamed once
+        all files are complete.
+
+        :param container: object, the container to save.
+        :param chunk_name: string, the name of the chunk.
+        """
+        chunk_dir = os.path.join(self.directory, chunk_name)
+        tmp_dir = chunk_dir + ".tmp"
+        if not os.path.exists(tmp_dir):
+            os.makedirs(tmp_dir)
+
+        # The permutation p-values are stacked on request, do it once.
+        perm_pvalues = container.get_perm_pvalues()
+        n_permutations = container.get_n_permutations()
+        arrays = {self.eqtl_index_filename: container.get_eqtl_indices(),
+                  self.genotype_names_filename: container.get_genotype_names(),
+                  self.colnames_filename: np.array(container.get_colnames(), dtype=str),
+                  self.filenames["pvalues"]: container.get_pvalues(),
+                  self.filenames["snp_tvalues"]: container.get_snp_tvalues(),
+                  self.filenames["inter_tvalues"]: container.get_inter_tvalues(),
+                  self.filenames["perm_pvalues"]: perm_pvalues,
+                  self.filenames["n_permutations"]: n_permutations,
+                  self.filenames["null_histogram"]: self.create_null_histogram(perm_pvalues,
+                                                                               n_permutations).get_counts()}
+        for filename, array in arrays.items():
+            np.save(os.path.join(tmp_dir, filename + ".npy"), array)
+        os.rename(tmp_dir, chunk_dir)
+
+        print("\tcreated {}".format(os.path.join(os.path.basename(self.directory),
+                                                 chunk_name)))
+
+    def create_null_histogram(self, perm_pvalues, n_permutations):
+        """
+        Method for creating the null histogram of permutation p-values.
+        Every p-value gets the weight 1 / number of permutations performed
+        for its eQTL - covariate pair.
+
+        :param perm_pvalues: ndarray, the permutation p-values (eQTLs x
+                             covariates x permutations).
+        :param n_permutations: ndarray, the number of permutations performed
+                               (eQTLs x covariates).
+        :return : NullHistogram, the histogram.
+        """
+        histogram = NullHistogram(bins_per_decade=self.bins_per_decade)
+        if perm_pvalues.size > 0:
+            weights = np.broadcast_to(1 / np.maximum(n_permutations, 1)[:, :, np.newaxis],
+                                      perm_pvalues.shape)
+            histogram.add(perm_pvalues, weights)
+        return histogram
+
+    def get_chunks(self):
+        """
+        Method for getting the complete chunk directories.
+
+        :return : list, the sorted chunk directories.
+        """
+        if self.chunks is None:
+            self.chunks = []
+            if os.path.isdir(self.directory):
+                for name in sorted(os.listdir(self.directory)):
+                    path = os.path.join(self.directory, name)
+                    if os.path.isdir(path) and not name.endswith(".tmp"):
+                        self.chunks.append(path)
+
+        return self.chunks
+
+    def load_array(self, chunk_dir, filename):
+        """
+        Method for memory mapping one array of a chunk.
+
+        :param chunk_dir: string, the chunk directory.
+        :param filename: string, the name of the array.
+        :return : ndarray, the memory mapped array.
+        """
+        return np.load(os.path.join(chunk_dir, filename + ".npy"),
+                       mmap_mode='r')
+
+    def get_colnames(self):
+        chunks = self.get_chunks()
+        if len(chunks) == 0:
+            return []
+        return list(np.load(os.path.join(chunks[0],
+                                         self.colnames_filename + ".npy")))
+
+    def select_rows(self):
+        """
+        Method for selecting which row of which chunk to use for every eQTL
+        index. If an eQTL is present in more than one chunk, the first one
+        is used.
+
+        :return eqtl_indices: ndarray, the sorted unique eQTL indices.
+        :return duplicated: ndarray, the eQTL indices found more than once.
+        """
+        chunk_ids = []
+        row_ids = []
+        all_indices = []
+        for chunk_id, chunk_dir in enumerate(self.get_chunks()):
+            indices = np.asarray(self.load_array(chunk_dir,
+                                                 self.eqtl_index_filename))
+            all_indices.append(indices)
+            chunk_ids.append(np.full(len(indices), chunk_id, dtype=np.int64))
+            row_ids.append(np.arange(len(indices), dtype=np.int64))
+
+        if len(all_indices) == 0:
+            self.selection = (np.empty(0, dtype=np.int64),
+                              np.empty(0, dtype=np.int64),
+                              np.empty(0, dtype=np.int64))
+            return self.selection[0], np.empty(0, dtype=np.int64)
+
+        all_indices = np.concatenate(all_indices)
+        chunk_ids = np.concatenate(chunk_ids)
+        row_ids = np.concatenate(row_ids)
+
+        # np.unique returns the first occurrence of each index.
+        eqtl_indices, first, counts = np.unique(all_indices,
+                                                return_index=True,
+                                                return_counts=True)
+        self.selection = (eqtl_indices, chunk_ids[first], row_ids[first])
+
+        return eqtl_indices, eqtl_indices[counts > 1]
+
+    def get_table(self, key):
+        """
+        Method for getting a result table with one row per selected eQTL.
+
+        :param key: string, 'pvalues', 'snp_tvalues' or 'inter_tvalues'.
+        :return genotype_names: ndarray, the SNP name of every row.
+        :return data: ndarray, the values with eQTLs as rows and covariates
+                      as columns.
+        """
+        return self.get_names(), self.gather(self.filenames[key])
+
+    def get_names(self):
+        return self.gather(self.genotype_names_filename)
+
+    def get_perm_pvalues(self):
+        """
+        Method for getting all performed permutation p-values of the
+        selected eQTLs as one flat array. Every p-value gets the weight
+        1 / number of permutations performed for its eQTL - covariate pair.
+
+        :return perm_pvalues: ndarray, the permutation p-values.
+        :return weights: ndarray, the weight of each permutation p-value.
+        """
+        perm_pvalues = self.gather(self.filenames["perm_pvalues"])
+        n_permutations = self.gather(self.filenames["n_permutations"])
+        if perm_pvalues.size == 0:
+            return np.empty(0), np.empty(0)
+
+        weights = np.broadcast_to(1 / np.maximum(n_permutations, 1)[:, :, np.newaxis],
+                                  perm_pvalues.shape)
+        mask = ~np.isnan(perm_pvalues)
+
+        return perm_pvalues[mask], weights[mask]
+
+    def get_null_histogram(self):
+        """
+        Method for merging the null histograms of the selected eQTLs over all
+        chunks. The stored histogram of a chunk is used if all its rows are
+        selected, otherwise the histogram of the selected rows is created
+        from the raw permutation p-values. Only one chunk is in memory at a
+        time.
+
+        :return : NullHistogram, the merged histogram.
+        """
+        if self.selection is None:
+            self.select_rows()
+        _, chunk_ids, row_ids = self.selection
+
+        merged = None
+        for chunk_id, chunk_dir in enumerate(self.get_chunks()):
+            mask = chunk_ids == chunk_id
+            if not np.any(mask):
+                continue
+
+            n_rows = len(self.load_array(chunk_dir, self.eqtl_index_filename))
+            hist_path = os.path.join(chunk_dir,
+                                     self.filenames["null_histogram"] + ".npy")
+            if np.sum(mask) == n_rows and os.path.isfile(hist_path):
+                histogram = NullHistogram(counts=np.load(hist_path))
+            else:
+                rows = row_ids[mask]
+                perm_pvalues = self.load_array(chunk_dir, self.filenames["perm_pvalues"])
+                n_permutations = self.load_array(chunk_dir, self.filenames["n_permutations"])
+                histogram = self.create_null_histogram(np.asarray(perm_pvalues[rows]),
+                                                       np.asarray(n_permutations[rows]))
+
+            if merged is None:
+                merged = histogram
+            else:
+                merged.merge(histogram)
+
+        if merged is None:
+            merged = NullHistogram(bins_per_decade=self.bins_per_decade)
+
+        return merged
+
+    def gather(self, filename):
+        """
+        Method for concatenating the selected rows of an array over all
+        chunks. Only the selected rows are read from the memory mapped
+        files.
+
+        :param filename: string, the name of the array.
+        :return : ndarray, the selected rows in eQTL index order.
+        """
+        if self.selection is None:
+            self.select_rows()
+        _, chunk_ids, row_ids = self.selection
+
+        parts = []
+        positions = []
+        for chunk_id, chunk_dir in enumerate(self.get_chunks()):
+            mask = chunk_ids == chunk_id
+            if not np.any(mask):
+                continue
+            array = self.load_array(chunk_dir, filename)
+            parts.append(np.asarray(array[row_ids[mask]]))
+            positions.append(np.flatnonzero(mask))
+
+        if len(parts) == 0:
+            return np.empty(0)
+
+        # Put the rows back in eQTL index order.
+        data = np.concatenate(parts)
+        order = np.empty(len(data), dtype=np.int64)
+        order[np.concatenate(positions)] = np.arange(len(data))
+        return data[order]
@@ -0,0 +1,206 @@
+"""
+File:         stage_timer.py
+Created:      2026/10/18
+Last Changed:
+Author:       M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+from datetime import datetime
+import json
+import time
+import os
+
+# Third party imports.
+
+# Local application imports.
+
+
+class StageTimer:
+    """
+    StageTimer: class for recording the wall time of the stages of the
+        interaction analyser per eQTL and per covariate. The stages are
+        'data_loading', 'design_building', 'null_fit', 'permutation_fits'
+        and 'storage'.
+    """
+    stages = ["data_loading", "design_building", "null_fit",
+              "permutation_fits", "storage"]
+
+    def __init__(self, max_end_time):
+        """
+        Initializer of the class.
+
+        :param max_end_time: int, the time at which the job is killed.
+        """
+        self.max_end_time = max_end_time
+
+        # Initialize variables.
+        self.start_time = time.time()
+        self.records = []
+        self.analysis_start = None
+        self.n_analysed = 0
+
+    def add(self, stage, seconds, eqtl_index=None, covariate=None):
+        """
+        Method for recording the duration of a stage.
+
+        :param stage: string, the name of the stage.
+        :param seconds: float, the wall time of the stage.
+        :param eqtl_index: int, the eQTL index, None for the whole job.
+        :param covariate: string, the covariate, None for all covariates.
+        """
+        self.records.append((stage, eqtl_index, covariate, seconds))
+
+    def add_eqtl(self, eqtl_index, records):
+        """
+        Method for recording the stages of one analysed eQTL.
+
+        :param eqtl_index: int, the eQTL index.
+        :param records: list, tuples of stage, covariate and wall time.
+        """
+        for stage, covariate, seconds in records:
+            self.add(stage, seconds, eqtl_index=eqtl_index,
+                     covariate=covariate)
+        self.n_analysed += 1
+
+    def start_analysis(self):
+        self.analysis_start = time.time()
+
+    def get_eta(self, n_todo):
+        """
+        Method for estimating the end time of the analysis from the average
+        time per eQTL analysed by this job.
+
+        :param n_todo: int, the number of eQTLs this job has to analyse.
+        :return : float, the estimated end time, None if unknown.
+        """
+        if self.analysis_start is None or self.n_analysed == 0:
+            return None
+        time_per_eqtl = (time.time() - self.analysis_start) / self.n_analysed
+        return time.time() + time_per_eqtl * max(0, n_todo - self.n_analysed)
+
+    def print_eta(self, n_todo):
+        """
+        Method for printing the estimated end time and whether this is
+        before the maximum end time of the job.
+
+        :param n_todo: int, the number of eQTLs this job has to analyse.
+        """
+        eta = self.get_eta(n_todo)
+        if eta is None:
+            return
+        margin_min = (self.max_end_time - eta) / 60
+        print("\t\tETA: {} [{:.1f} minute(s) {} max end time]".format(
+            datetime.fromtimestamp(eta).strftime("%d-%m-%Y, %H:%M:%S"),
+            abs(margin_min),
+            "before" if margin_min >= 0 else "after"), flush=True)
+
+    def get_stage_totals(self):
+        """
+        Method for summing the wall time per stage.
+
+        :return : dict, the total seconds per stage.
+        """
+        totals = {stage: 0.0 for stage in self.stages}
+        for stage, _, _, seconds in self.records:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return totals
+
+    def get_covariate_totals(self):
+        """
+        Method for summing the wall time per covariate and stage.
+
+        :return : dict, the total seconds per stage per covariate.
+        """
+        totals = {}
+        for stage, _, covariate, seconds in self.records:
+            if covariate is None:
+                continue
+            cov_totals = totals.setdefault(covariate, {})
+            cov_totals[stage] = cov_totals.get(stage, 0.0) + seconds
+        return totals
+
+    def get_summary(self, partial=False):
+        """
+        Method for summarizing the recorded wall times.
+
+        :param partial: boolean, whether or not the job stopped before all
+                        eQTLs were analysed.
+        :return : dict, the summary.
+        """
+        run_time = time.time() - self.start_time
+        analysis_time = 0.0
+        if self.analysis_start is not None:
+            analysis_time = time.time() - self.analysis_start
+        eqtls_per_hour = None
+        if analysis_time > 0:
+            eqtls_per_hour = self.n_analysed / (analysis_time / 3600)
+
+        return {"partial": partial,
+                "run_time": run_time,
+                "analysis_time": analysis_time,
+                "n_eqtls_analysed": self.n_analysed,
+                "eqtls_per_hour": eqtls_per_hour,
+                "stage_totals": self.get_stage_totals(),
+                "covariate_totals": self.get_covariate_totals()}
+
+    def print_summary(self):
+        """
+        Method for printing the total wall time per stage.
+        """
+        totals = self.get_stage_totals()
+        total = sum(totals.values())
+        print("Stage timings:")
+        for stage, seconds in totals.items():
+            print("  > {}: {:.2f} second(s) [{:.0f}%]".format(
+                stage, seconds, (100 / total) * seconds if total > 0 else 0))
+        summary = self.get_summary()
+        if summary["eqtls_per_hour"] is not None:
+            print("  > eQTLs per hour: {:.1f}".format(summary["eqtls_per_hour"]))
+        print("", flush=True)
+
+    def write(self, directory, name, partial=False):
+        """
+        Method for writing the records as a tab separated file and the
+        summary as a json file.
+
+        :param directory: string, the output directory.
+        :param name: string, the name of the output files.
+        :param partial: boolean, whether or not the job stopped before all
+                        eQTLs were analysed.
+        """
+        tsv_outfile = os.path.join(directory, name + ".txt")
+        with open(tsv_outfile, "w") as f:
+            f.write("stage\teqtl_index\tcovariate\tseconds\n")
+            for stage, eqtl_index, covariate, seconds in self.records:
+                f.write("{}\t{}\t{}\t{:.6f}\n".format(
+                    stage,
+                    "" if eqtl_index is None else eqtl_index,
+                    "" if covariate is None else covariate,
+                    seconds))
+        f.close()
+
+        json_outfile = os.path.join(directory, name + ".json")
+        with open(json_outfile, "w") as f:
+            json.dump(self.get_summary(partial=partial), f, indent=2)
+        f.close()
+
+        for outfile in [tsv_outfile, json_outfile]:
+            print("\tcreated {}".format(
+                os.path.join(os.path.basename(directory),
+                             os.path.basename(outfile))))
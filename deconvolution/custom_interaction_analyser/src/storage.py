@@ -1,7 +1,7 @@
 """
 File:         storage.py
 Created:      2020/05/06
-Last Changed: 2020/06/02
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -23,7 +23,7 @@ root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
 # Standard imports.
 
 # Third party imports.
-
+import numpy as np
 
 # Local application imports.
 from .container import Container
@@ -41,37 +41,39 @@ class Storage:
         # Initialize variables.
         self.error = False
 
-    def add_row(self, eqtl_index, genotype_name):
-        self.tech_cov_container.add_row(eqtl_index, genotype_name)
-        self.cov_container.add_row(eqtl_index, genotype_name)
-
-    def store_row(self):
-        if not self.error:
-            self.tech_cov_container.store_row()
-            self.cov_container.store_row()
-        else:
+    def add_row(self, eqtl_index, genotype_name, cov_names, eqtl_results):
+        """
+        Add the results of one eQTL. The results are the p-values, SNP
+        t-values and interaction t-values with the covariates as rows and
+        the sample orders as columns and the number of permutations
+        performed per covariate.
+        """
+        if self.error:
             print("Row not saved due to error.")
-
-    def add_value(self, cov_name, order_id, category, value):
-        if cov_name in self.tech_covs:
-            container = self.tech_cov_container
-        elif cov_name in self.covs:
-            container = self.cov_container
-        else:
-            print("Unrecognised covariate name.")
-            self.error = True
             return
 
-        if category == "snp_tvalue":
-            container.add_snp_tvalue(order_id, value)
-        elif category == "inter_tvalue":
-            container.add_inter_tvalue(order_id, value)
-        elif category == "pvalue":
-            container.add_pvalue(order_id, value)
-        else:
-            print("Unrecognised value category.")
-            self.error = True
-            return
+        # Split the covariates over the two containers.
+        tech_cov_indices = []
+        cov_indices = []
+        for cov_index, cov_name in enumerate(cov_names):
+            if cov_name in self.tech_covs:
+                tech_cov_indices.append(cov_index)
+            elif cov_name in self.covs:
+                cov_indices.append(cov_index)
+            else:
+                print("Unrecognised covariate name.")
+                self.error = True
+                return
+
+        pvalues, snp_tvalues, inter_tvalues, n_permutations = eqtl_results
+        for container, indices in zip([self.tech_cov_container, self.cov_container],
+                                      [tech_cov_indices, cov_indices]):
+            indices = np.array(indices, dtype=np.int64)
+            container.add_row(eqtl_index, genotype_name,
+                              pvalues[indices, :],
+                              snp_tvalues[indices, :],
+                              inter_tvalues[indices, :],
+                              n_permutations[indices])
 
     def has_error(self):
         return self.error
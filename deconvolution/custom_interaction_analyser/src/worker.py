@@ -0,0 +1,207 @@
+"""
+File:         worker.py
+Created:      2026/10/18
+Last Changed: 2026/10/18
+Author:       M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+from multiprocessing.sharedctypes import RawArray
+import time
+
+# Third party imports.
+import numpy as np
+
+# Local application imports.
+from .batched_ols import BatchedOLS
+from .design_cache import DesignCache
+
+# The data of the current (worker) process, set by init_worker.
+worker_data = {}
+
+
+def create_shared_array(array):
+    """
+    Method for copying a numpy array into shared memory. The returned tuple
+    can be passed to a worker pool initializer without pickling the data.
+
+    :param array: ndarray, the array to share.
+    :return : tuple, the shared buffer, shape and dtype of the array.
+    """
+    array = np.ascontiguousarray(array)
+    raw = RawArray(np.ctypeslib.as_ctypes_type(array.dtype), array.size)
+    np.frombuffer(raw, dtype=array.dtype).reshape(array.shape)[...] = array
+    return raw, array.shape, array.dtype.str
+
+
+def init_worker(arrays, cov_names, is_tech_cov, panic_time, cache_size,
+                adaptive, record_timings, verbose):
+    """
+    Method for initializing the data of a worker process.
+
+    :param arrays: dict, the genotype, expression, technical covariate,
+                   covariate and permuted covariate matrices. Either as
+                   numpy array or as shared array tuple.
+    :param cov_names: list, the names of the covariates.
+    :param is_tech_cov: ndarray, whether or not each covariate is a technical
+                        covariate.
+    :param panic_time: int, the time after which the work is aborted.
+    :param cache_size: int, the number of missing genotype patterns to keep
+                       the null design of.
+    :param adaptive: dict, the 'min_exceedances' and 'batch_size' of the
+                     adaptive permutation mode. None to use all permutations.
+    :param record_timings: boolean, whether or not to record the wall time
+                           of the stages.
+    :param verbose: boolean, whether or not to print all update info.
+    """
+    worker_data.clear()
+    for name, value in arrays.items():
+        if isinstance(value, tuple):
+            raw, shape, dtype = value
+            value = np.frombuffer(raw, dtype=dtype).reshape(shape)
+        worker_data[name] = value
+    worker_data["cov_names"] = cov_names
+    worker_data["is_tech_cov"] = is_tech_cov
+    worker_data["panic_time"] = panic_time
+    worker_data["adaptive"] = adaptive
+    worker_data["record_timings"] = record_timings
+    worker_data["verbose"] = verbose
+    worker_data["design_cache"] = DesignCache(tech_cov_m=worker_data["tech_cov"],
+                                              cov_m=worker_data["cov"],
+                                              perm_cov_m=worker_data["perm_cov"],
+                                              is_tech_cov=is_tech_cov,
+                                              max_size=cache_size)
+
+
+def process_eqtl(row_index):
+    """
+    Method for analysing one eQTL with the data of the current process.
+
+    :param row_index: int, the row index of the eQTL in the input matrices.
+    :return : tuple, the row index, the analysis results and the stage
+              timings (None if not recorded).
+    """
+    timings = None
+    if worker_data["record_timings"]:
+        timings = []
+    results = analyse_eqtl(genotype_all=worker_data["geno"][row_index, :].astype(np.float64),
+                           expression_all=worker_data["expr"][row_index, :].astype(np.float64),
+                           design_cache=worker_data["design_cache"],
+                           cov_names=worker_data["cov_names"],
+                           adaptive=worker_data["adaptive"],
+                           panic_time=worker_data["panic_time"],
+                           verbose=worker_data["verbose"],
+                           timings=timings)
+    return row_index, results, timings
+
+
+def analyse_eqtl(genotype_all, expression_all, design_cache, cov_names,
+                 adaptive, panic_time, verbose, timings=None):
+    """
+    Method that does the interaction analysis of one eQTL.
+
+    :param genotype_all: ndarray, the genotype of all samples, missing values
+                         are NaN.
+    :param expression_all: ndarray, the expression of all samples.
+    :param design_cache: DesignCache, the null designs per missing genotype
+                         pattern.
+    :param cov_names: list, the names of the covariates.
+    :param adaptive: dict, the 'min_exceedances' and 'batch_size' of the
+                     adaptive permutation mode. None to use all permutations.
+    :param panic_time: int, the time after which the work is aborted.
+    :param verbose: boolean, whether or not to print all update info.
+    :param timings: list, if given the stage, covariate and wall time of the
+                    design building, null fit and permutation fits are
+                    appended to it.
+    :return : tuple, the p-values, SNP t-values and interaction t-values with
+              covariates as rows and sample orders as columns (NaN for the
+              permutations that were not performed) and the number of
+              permutations performed per covariate. None if the panic time
+              was reached.
+    """
+    # Get the null design of the missing genotype pattern. This contains
+    # the present samples of the covariates.
+    stage_start = time.time()
+    design = design_cache.get(~np.isnan(genotype_all))
+    eqtl_indices = design.get_eqtl_indices()
+
+    # Subset the row and present samples for this eQTL.
+    genotype = genotype_all[eqtl_indices]
+    expression = expression_all[eqtl_indices]
+
+    # The SNP specific part of the null model: the SNP + all the technical
+    # covariates multiplied with the genotype.
+    snp_matrix = np.column_stack((genotype,
+                                  (design.get_technical_covs() * genotype).T))
+
+    n_orders = design.get_n_orders()
+    pvalues = np.full((len(cov_names), n_orders), np.nan, dtype=np.float64)
+    snp_tvalues = np.full((len(cov_names), n_orders), np.nan, dtype=np.float64)
+    inter_tvalues = np.full((len(cov_names), n_orders), np.nan, dtype=np.float64)
+    n_permutations = np.empty(len(cov_names), dtype=np.int32)
+    if timings is not None:
+        timings.append(("design_building", None, time.time() - stage_start))
+
+    # Loop over the covariates.
+    for cov_index, cov_name in enumerate(cov_names):
+        if verbose:
+            print("\t\tWorking on '{}'".format(cov_name), flush=True)
+
+        # Create the null model. The cached factorization of the intercept,
+        # technical covariates and covariate of interest (if it isn't
+        # already) is extended with the SNP columns.
+        stage_start = time.time()
+        base = design.get_factorization(cov_index)
+        design_end = time.time()
+        null_matrix = np.column_stack((base.get_matrix(), snp_matrix))
+        model = BatchedOLS(null_matrix, expression,
+                           snp_index=base.get_width(), base=base)
+        null_end = time.time()
+
+        # Create the alternative models. The interaction effect of the
+        # covariate of interest is calculated for all sample orders at
+        # once. In the adaptive mode the permutations are done in batches
+        # until enough permuted p-values are as small as the real p-value.
+        start = 0
+        end = n_orders
+        if adaptive is not None:
+            end = min(1 + adaptive["batch_size"], n_orders)
+        while True:
+            inter_of_interest = design.get_permuted_cov(cov_index, start, end) * genotype
+            pvalues[cov_index, start:end], snp_tvalues[cov_index, start:end], inter_tvalues[cov_index, start:end] = \
+                model.fit_alternatives(inter_of_interest.T)
+            if end >= n_orders:
+                break
+
+            n_exceedances = np.sum(pvalues[cov_index, 1:end] <= pvalues[cov_index, 0])
+            if n_exceedances >= adaptive["min_exceedances"]:
+                break
+
+            start = end
+            end = min(end + adaptive["batch_size"], n_orders)
+        n_permutations[cov_index] = end - 1
+        if timings is not None:
+            timings.extend([("design_building", cov_name, design_end - stage_start),
+                            ("null_fit", cov_name, null_end - design_end),
+                            ("permutation_fits", cov_name, time.time() - null_end)])
+
+        # Check whether we are almost running out of time.
+        if time.time() > panic_time:
+            return None
+
+    return pvalues, snp_tvalues, inter_tvalues, n_permutations
@@ -0,0 +1,153 @@
+"""
+File:         artifact_registry.py
+Created:      2026/10/18
+Last Changed:
+Author(s):    M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import threading
+import os
+
+# Third party imports.
+
+# Local application imports.
+from .utilities import get_basename
+from .df_utilities import load_dataframe, save_dataframe
+
+
+class ArtifactRegistry:
+    """
+    ArtifactRegistry: class for handing dataframes from one step to the
+        next in memory. A saved dataframe is kept in memory under its output
+        path and written to disk on a background thread. If the kept
+        dataframes exceed the memory budget, the least recently used ones
+        are released; these are loaded from disk again when requested
+        (memory mapped if a binary copy exists, see DataFrameCache).
+    """
+
+    def __init__(self, memory_budget=4 * 1024 ** 3, threads=2):
+        """
+        Initializer of the class.
+
+        :param memory_budget: int, the maximal number of bytes of the
+                              dataframes kept in memory.
+        :param threads: int, the number of background writers.
+        """
+        self.memory_budget = memory_budget
+        self.lock = threading.Lock()
+        self.artifacts = OrderedDict()
+        self.n_bytes = 0
+        self.pending = {}
+        self.pool = ThreadPoolExecutor(max_workers=max(1, threads))
+
+    def save(self, df, outpath, header, index, sep="\t", index_label=None,
+             na_rep=""):
+        """
+        Method for keeping a dataframe in memory and writing it to disk in
+        the background. The dataframe may not be changed afterwards.
+
+        :param df: DataFrame, the pandas dataframe.
+        :param outpath: str, the filepath for the dataframe.
+        :param header: boolean, write out the column names.
+        :param index: boolean, write row names (index).
+        :param sep: str, field delimiter for the output file.
+        :param index_label: str, column label for the index column.
+        :param na_rep: str, missing data representation.
+        """
+        # A previous write of the same file has to finish first.
+        self.wait(outpath)
+
+        with self.lock:
+            self.release(outpath)
+            n_bytes = int(df.memory_usage(index=True).sum())
+            self.artifacts[outpath] = (df, n_bytes)
+            self.n_bytes += n_bytes
+            while self.n_bytes > self.memory_budget and len(self.artifacts) > 0:
+                self.release(next(iter(self.artifacts)))
+
+            self.pending[outpath] = self.pool.submit(
+                save_dataframe, df=df, outpath=outpath, header=header,
+                index=index, sep=sep, index_label=index_label, na_rep=na_rep)
+
+    def load(self, inpath, header, index_col, **kwargs):
+        """
+        Method for getting a dataframe: from memory if it is kept, else
+        from disk once it is written.
+
+        :param inpath: str, the file to be read.
+        :param header: int, row number(s) to use as the column names.
+        :param index_col: int, column(s) to use as the row labels.
+        :param kwargs: dict, other arguments of load_dataframe.
+        :return : DataFrame, a copy of the dataframe.
+        """
+        with self.lock:
+            artifact = self.artifacts.get(inpath)
+            if artifact is not None:
+                self.artifacts.move_to_end(inpath)
+
+        if artifact is not None:
+            print("\tLoaded dataframe: {} with shape: {} (in memory)".format(
+                get_basename(inpath), artifact[0].shape))
+            return artifact[0].copy()
+
+        self.wait(inpath)
+        return load_dataframe(inpath, header=header, index_col=index_col,
+                              **kwargs)
+
+    def release(self, path):
+        artifact = self.artifacts.pop(path, None)
+        if artifact is not None:
+            self.n_bytes -= artifact[1]
+
+    def wait(self, path=None):
+        """
+        Method for waiting until the background writes finished.
+
+        :param path: str, only wait for this file or for the files in this
+                     directory, default is all files.
+        """
+        with self.lock:
+            if path is None:
+                outpaths = list(self.pending.keys())
+            else:
+                directory = os.path.join(path, "")
+                outpaths = [x for x in self.pending.keys()
+                            if x == path or x.startswith(directory)]
+            futures = [self.pending[x] for x in outpaths]
+
+        for future in futures:
+            future.result()
+
+        with self.lock:
+            for outpath, future in zip(outpaths, futures):
+                if self.pending.get(outpath) is future:
+                    del self.pending[outpath]
+
+    def close(self):
+        """
+        Method for finishing the background writes and releasing the kept
+        dataframes.
+        """
+        self.wait()
+        self.pool.shutdown()
+        with self.lock:
+            self.artifacts.clear()
+            self.n_bytes = 0
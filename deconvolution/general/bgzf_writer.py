@@ -0,0 +1,235 @@
+"""
+File:         bgzf_writer.py
+Created:      2026/10/18
+Last Changed: 2026/10/18
+Author(s):    M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import struct
+import zlib
+import os
+
+# Third party imports.
+
+# Local application imports.
+from .row_index import RowIndex
+
+
+class BgzfWriter:
+    """
+    BgzfWriter: class for writing a text file as block gzip (BGZF): a
+        series of independent gzip members of at most 64 KB uncompressed
+        data each. The blocks are compressed on a thread pool and written
+        in order. The file is a valid (multi-member) gzip file, readable by
+        gzip and pandas. The data is written to a temporary file that
+        replaces the output on close, after which a row index of the file is
+        saved (see RowIndex) so rows can be read without decompressing the
+        file. If the writing fails the temporary file is removed, so no
+        truncated table is left behind.
+    """
+    block_size = 65280
+    max_block_size = 65536
+    eof_block = bytes.fromhex("1f8b08040000000000ff0600424302001b00"
+                              "03000000000000000000")
+
+    def __init__(self, outpath, sep="\t", threads=None, level=6,
+                 row_index=True):
+        """
+        Initializer of the class.
+
+        :param outpath: str, the output file.
+        :param sep: str, the delimiter of the table, used for the row index.
+        :param threads: int, the number of compression threads, default is
+                        the number of cpus with a maximum of 4.
+        :param level: int, the zlib compression level.
+        :param row_index: boolean, whether to save a row index on close.
+        """
+        if threads is None:
+            threads = min(4, os.cpu_count() or 1)
+        self.outpath = outpath
+        self.tmp_outpath = outpath + ".tmp"
+        self.sep = sep.encode()
+        self.level = level
+        self.row_index = row_index
+        self.max_pending = threads * 4
+
+        # Set the writer variables.
+        self.handle = open(self.tmp_outpath, "wb")
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+        self.pending = deque()
+        self.buffer = []
+        self.buffer_size = 0
+        self.coffset = 0
+        self.uoffset = 0
+        self.block_coffsets = []
+        self.block_uoffsets = []
+
+        # Set the row index variables.
+        self.line_start = 0
+        self.line_part = b""
+        self.line_offsets = [0]
+        self.line_labels = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, data):
+        """
+        Method for writing a string or bytes.
+
+        :param data: str / bytes, the data.
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        if len(data) == 0:
+            return
+
+        if self.row_index:
+            self.index_lines(data)
+
+        self.buffer.append(data)
+        self.buffer_size += len(data)
+        if self.buffer_size >= self.block_size:
+            data = b"".join(self.buffer)
+            n_full = (len(data) // self.block_size) * self.block_size
+            for start in range(0, n_full, self.block_size):
+                self.submit(data[start:start + self.block_size])
+            self.buffer = [data[n_full:]]
+            self.buffer_size = len(data) - n_full
+
+    def write_lines(self, lines):
+        """
+        Method for writing a list of strings.
+
+        :param lines: list, the lines of strings to write.
+        """
+        self.write("".join(lines))
+
+    def index_lines(self, data):
+        """
+        Method for recording the end offset and the first field of every
+        line in the data.
+
+        :param data: bytes, the data.
+        """
+        lines = (self.line_part + data).split(b"\n")
+        self.line_part = lines.pop()
+        for line in lines:
+            self.line_start += len(line) + 1
+            self.line_offsets.append(self.line_start)
+            self.line_labels.append(line.split(self.sep, 1)[0].rstrip(b"\r"))
+
+    def submit(self, data):
+        """
+        Method for compressing a block on the thread pool and writing the
+        finished blocks in order.
+
+        :param data: bytes, the uncompressed block.
+        """
+        self.pending.append(self.pool.submit(self.compress, data, self.level))
+        while len(self.pending) > self.max_pending:
+            self.write_blocks(self.pending.popleft().result())
+
+    @classmethod
+    def compress(cls, data, level):
+        """
+        Method for compressing data into BGZF blocks. Data that does not
+        compress into one block is split in two.
+
+        :param data: bytes, the uncompressed data.
+        :param level: int, the zlib compression level.
+        :return : list, tuples of the block and its uncompressed size.
+        """
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        cdata = compressor.compress(data) + compressor.flush()
+        if len(cdata) + 26 > cls.max_block_size:
+            half = len(data) // 2
+            return cls.compress(data[:half], level) + \
+                   cls.compress(data[half:], level)
+
+        header = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+        block = header + struct.pack("<H", len(cdata) + 25) + cdata + \
+                struct.pack("<II", zlib.crc32(data) & 0xffffffff, len(data))
+        return [(block, len(data))]
+
+    def write_blocks(self, blocks):
+        for block, size in blocks:
+            self.handle.write(block)
+            self.block_coffsets.append(self.coffset)
+            self.block_uoffsets.append(self.uoffset)
+            self.coffset += len(block)
+            self.uoffset += size
+
+    def close(self):
+        """
+        Method for writing the remaining data and the end-of-file block and
+        saving the row index.
+        """
+        if self.handle is None:
+            return
+
+        data = b"".join(self.buffer)
+        if len(data) > 0:
+            self.submit(data)
+        while len(self.pending) > 0:
+            self.write_blocks(self.pending.popleft().result())
+        self.pool.shutdown()
+
+        self.block_coffsets.append(self.coffset)
+        self.block_uoffsets.append(self.uoffset)
+        self.handle.write(self.eof_block)
+        self.handle.close()
+        self.handle = None
+        os.replace(self.tmp_outpath, self.outpath)
+
+        if self.row_index:
+            if len(self.line_part) > 0:
+                self.line_offsets.append(self.line_start + len(self.line_part))
+                self.line_labels.append(self.line_part.split(self.sep, 1)[0])
+            index = RowIndex(self.outpath, sep=self.sep.decode(), load=False)
+            index.set_index(offsets=self.line_offsets,
+                            labels=self.line_labels[1:],
+                            block_coffsets=self.block_coffsets,
+                            block_uoffsets=self.block_uoffsets)
+            index.save()
+
+    def abort(self):
+        """
+        Method for discarding the written data without finalizing the
+        output file.
+        """
+        if self.handle is None:
+            return
+
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.pool.shutdown()
+        self.handle.close()
+        self.handle = None
+        if os.path.isfile(self.tmp_outpath):
+            os.remove(self.tmp_outpath)
@@ -0,0 +1,248 @@
+"""
+File:         dataframe_cache.py
+Created:      2026/10/18
+Last Changed:
+Author(s):    M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+import pickle
+import shutil
+import json
+import os
+
+# Third party imports.
+import numpy as np
+import pandas as pd
+
+# Local application imports.
+
+
+class DataFrameCache:
+    """
+    DataFrameCache: class for storing a loaded text dataframe as a binary
+        copy in a hidden directory next to the text file. A dataframe with
+        one numeric dtype is saved as one 2D array, other dataframes per
+        column. Numeric arrays are memory mapped (copy-on-write) when loaded.
+        The cache is invalid once the size or modification time of the text
+        file or the load arguments change. If the caches in a directory
+        exceed max_dir_bytes the least recently used ones are removed.
+    """
+    version = 1
+    suffix = ".dfcache"
+    meta_filename = "meta.json"
+    labels_filename = "labels.pkl"
+    values_filename = "values.npy"
+    objects_filename = "objects.pkl"
+
+    def __init__(self, inpath, load_args, min_file_bytes=1024 ** 2,
+                 max_dir_bytes=50 * 1024 ** 3):
+        """
+        Initializer of the class.
+
+        :param inpath: str, the text file.
+        :param load_args: dict, the arguments used to read the text file.
+        :param min_file_bytes: int, the minimal size of the text file to
+                               cache it.
+        :param max_dir_bytes: int, the maximal size of all caches in the
+                              directory of the text file.
+        """
+        self.inpath = inpath
+        self.load_args = load_args
+        self.min_file_bytes = min_file_bytes
+        self.max_dir_bytes = max_dir_bytes
+
+        self.directory = os.path.dirname(os.path.abspath(inpath))
+        self.cache_dir = os.path.join(self.directory,
+                                      "." + os.path.basename(inpath) + self.suffix)
+        self.meta_path = os.path.join(self.cache_dir, self.meta_filename)
+
+    def is_enabled(self):
+        return os.path.isfile(self.inpath) and \
+               os.path.getsize(self.inpath) >= self.min_file_bytes
+
+    def get_key(self):
+        """
+        Method for creating the description of the text file and the way it
+        is loaded. A cache is only valid if its key is identical.
+
+        :return : dict, the key.
+        """
+        stat = os.stat(self.inpath)
+        return {"version": self.version,
+                "pandas": pd.__version__,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "load_args": self.load_args}
+
+    def load(self):
+        """
+        Method for loading the cached dataframe.
+
+        :return : DataFrame, the dataframe, None if there is no valid cache.
+                  An outdated cache is removed.
+        """
+        if not os.path.isfile(self.meta_path):
+            return None
+
+        try:
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            f.close()
+            if meta.get("key") != json.loads(json.dumps(self.get_key())):
+                shutil.rmtree(self.cache_dir, ignore_errors=True)
+                return None
+
+            with open(os.path.join(self.cache_dir, self.labels_filename), "rb") as f:
+                index, columns = pickle.load(f)
+            f.close()
+
+            if meta["layout"] == "matrix":
+                values = np.load(os.path.join(self.cache_dir, self.values_filename),
+                                 mmap_mode="c")
+                df = pd.DataFrame(values, index=index, columns=columns,
+                                  copy=False)
+            else:
+                objects = {}
+                if len(meta["object_columns"]) > 0:
+                    with open(os.path.join(self.cache_dir, self.objects_filename), "rb") as f:
+                        objects = pickle.load(f)
+                    f.close()
+
+                data = {}
+                for i in range(len(columns)):
+                    if i in objects:
+                        data[i] = objects[i]
+                    else:
+                        data[i] = np.load(os.path.join(self.cache_dir,
+                                                       "column{}.npy".format(i)),
+                                          mmap_mode="c")
+                df = pd.DataFrame(data, index=index)
+                df.columns = columns
+        except (OSError, ValueError, KeyError, EOFError,
+                pickle.UnpicklingError):
+            return None
+
+        # Mark the cache as recently used, if the directory allows it.
+        try:
+            os.utime(self.meta_path)
+        except OSError:
+            pass
+
+        return df
+
+    def save(self, df):
+        """
+        Method for writing the dataframe as cache. The files are written to
+        a temporary directory which is renamed once complete, if another
+        process was first its cache is kept.
+
+        :param df: DataFrame, the dataframe read from the text file.
+        """
+        tmp_dir = "{}.{}.tmp".format(self.cache_dir, os.getpid())
+        try:
+            if os.path.isdir(tmp_dir):
+                shutil.rmtree(tmp_dir)
+            os.makedirs(tmp_dir)
+
+            with open(os.path.join(tmp_dir, self.labels_filename), "wb") as f:
+                pickle.dump((df.index, df.columns), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            f.close()
+
+            dtypes = list(df.dtypes)
+            is_numeric = [isinstance(dtype, np.dtype) and dtype.kind in "biuf"
+                          for dtype in dtypes]
+            meta = {"key": self.get_key(),
+                    "shape": list(df.shape),
+                    "object_columns": []}
+            if len(dtypes) > 0 and all(is_numeric) and len(set(dtypes)) == 1:
+                meta["layout"] = "matrix"
+                np.save(os.path.join(tmp_dir, self.values_filename),
+                        df.to_numpy())
+            else:
+                meta["layout"] = "columns"
+                objects = {}
+                for i, numeric in enumerate(is_numeric):
+                    column = df.iloc[:, i]
+                    if numeric:
+                        np.save(os.path.join(tmp_dir, "column{}.npy".format(i)),
+                                column.to_numpy())
+                    else:
+                        objects[i] = column.to_numpy()
+                        if not isinstance(column.dtype, np.dtype):
+                            objects[i] = column.array
+                        meta["object_columns"].append(i)
+                if len(objects) > 0:
+                    with open(os.path.join(tmp_dir, self.objects_filename), "wb") as f:
+                        pickle.dump(objects, f,
+                                    protocol=pickle.HIGHEST_PROTOCOL)
+                    f.close()
+
+            # The meta file is written last, it marks the cache as complete.
+            with open(os.path.join(tmp_dir, self.meta_filename), "w") as f:
+                json.dump(meta, f)
+            f.close()
+
+            if os.path.isdir(self.cache_dir):
+                shutil.rmtree(self.cache_dir, ignore_errors=True)
+            os.rename(tmp_dir, self.cache_dir)
+        except OSError as e:
+            print("\tUnable to cache dataframe: {}".format(e))
+        finally:
+            if os.path.isdir(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        """
+        Method for removing the least recently used caches in the directory
+        of the text file until their total size fits max_dir_bytes. The
+        cache of this text file is never removed.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+
+        # Another process may remove or write a cache meanwhile.
+        caches = []
+        total_size = 0
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if not name.endswith(self.suffix) or not os.path.isdir(path):
+                continue
+            meta_path = os.path.join(path, self.meta_filename)
+            try:
+                size = sum(os.path.getsize(os.path.join(path, x))
+                           for x in os.listdir(path))
+                mtime = os.path.getmtime(meta_path)
+            except OSError:
+                continue
+            total_size += size
+            caches.append((mtime, path, size))
+
+        for _, path, size in sorted(caches):
+            if total_size <= self.max_dir_bytes:
+                break
+            if path == self.cache_dir:
+                continue
+            print("\tRemoving cache: {}".format(os.path.basename(path)))
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
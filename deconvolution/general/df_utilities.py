@@ -1,7 +1,7 @@
 """
 File:         df_utilities.py
 Created:      2020/03/19
-Last Changed: 2020/04/23
+Last Changed: 2026/10/18
 Author(s):    M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -21,19 +21,36 @@ root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
 """
 
 # Standard imports.
+import io
 
 # Third party imports.
+import numpy as np
 import pandas as pd
 
 # Local application imports.
 from .utilities import get_basename
+from .dataframe_cache import DataFrameCache
+from .row_index import RowIndex
+from .bgzf_writer import BgzfWriter
+
+DTYPES = {"float64": np.float64,
+          "float32": np.float32,
+          "genotype": np.float32}
+MISSING_GENOTYPE = -1
 
 
 def load_dataframe(inpath, header, index_col, sep="\t", low_memory=True,
-                   nrows=None, skiprows=None):
+                   nrows=None, skiprows=None, rows=None, row_labels=None,
+                   dtype=None, cache=True):
     """
     Method for reading a comma-separated values (csv) file into a pandas
-    DataFrame.
+    DataFrame. A full load writes a binary copy of the dataframe next to the
+    file which is memory mapped by later loads of the same unchanged file.
+    Loads of part of the rows use this copy if it exists. Otherwise, rows
+    or row_labels are read using a row offset index of the file (built on
+    first use) so only the bytes of those rows are parsed. With dtype the
+    values are parsed directly into a compact type: 'float32', or
+    'genotype' (float32 with the missing genotype value -1 as NaN).
 
     :param inpath: str, the file to be read.
     :param header: int, row number(s) to use as the column names, and the
@@ -46,30 +63,250 @@ def load_dataframe(inpath, header, index_col, sep="\t", low_memory=True,
                        possibly mixed type inference.
     :param nrows: int, number of rows of file to read.
     :param skiprows: list, the index of rows to skip.
+    :param rows: range / slice / list, the positions of the data rows to
+                 read (as with DataFrame.iloc).
+    :param row_labels: list, the labels of the rows to read (as with
+                       DataFrame.loc), requires index_col to be 0.
+    :param dtype: str, the type of the values: None (inferred), 'float64',
+                  'float32' or 'genotype'.
+    :param cache: boolean, whether to use the binary copy.
     :return df: DataFrame, the pandas dataframe.
     """
-    df = pd.read_csv(inpath, sep=sep, header=header, index_col=index_col,
-                     low_memory=low_memory, nrows=nrows, skiprows=skiprows)
-    print("\tLoaded dataframe: {} with shape: {}".format(get_basename(inpath),
-                                                         df.shape))
+    select = rows is not None or row_labels is not None
+    if select and (nrows is not None or skiprows is not None or
+                   (rows is not None and row_labels is not None)):
+        print("Only one of nrows / skiprows, rows or row_labels can be "
+              "given.")
+        exit()
+    if dtype is not None and dtype not in DTYPES:
+        print("Unknown dtype '{}', choose from: {}.".format(
+            dtype, ", ".join(DTYPES.keys())))
+        exit()
+
+    df = None
+    cacher = None
+    from_cache = False
+    if cache:
+        cacher = DataFrameCache(inpath, {"header": header,
+                                         "index_col": index_col,
+                                         "sep": sep,
+                                         "low_memory": low_memory,
+                                         "dtype": dtype})
+
+    full_load = nrows is None and skiprows is None and not select
+    if cacher is not None and (full_load or select or
+                               can_select_rows(header, skiprows)):
+        df = cacher.load()
+        if df is not None:
+            from_cache = True
+            if isinstance(rows, (range, slice)):
+                # A slice of the memory mapped copy is a view.
+                df = df.iloc[as_slice(rows), :]
+            elif rows is not None:
+                df = df.iloc[get_row_positions(df.shape[0], rows), :]
+            elif row_labels is not None:
+                df = df.loc[row_labels, :]
+            elif not full_load:
+                df = select_rows(df, nrows, skiprows,
+                                 renumber=index_col is None)
+
+    if df is None:
+        dtype_args = get_dtype_arguments(inpath, header, index_col, sep,
+                                         dtype)
+        if select:
+            df = load_indexed_rows(inpath, header, index_col, sep, low_memory,
+                                   rows, row_labels, dtype_args)
+        else:
+            df = pd.read_csv(inpath, sep=sep, header=header,
+                             index_col=index_col, low_memory=low_memory,
+                             nrows=nrows, skiprows=skiprows, **dtype_args)
+        if dtype is not None and len(dtype_args) == 0:
+            df = convert_dtype(df, dtype)
+        if cacher is not None and full_load and cacher.is_enabled():
+            cacher.save(df)
+
+    print("\tLoaded dataframe: {} with shape: {}{}".format(
+        get_basename(inpath), df.shape, " (cached)" if from_cache else ""))
+    return df
+
+
+def load_indexed_rows(inpath, header, index_col, sep, low_memory, rows,
+                      row_labels, dtype_args):
+    """
+    Method for reading rows by position or label using the row offset index
+    of the file. Files with the header not on the first line (or label
+    lookup on another column than the first) are read completely.
+
+    :param inpath: str, the file to be read.
+    :param header: int, row number(s) to use as the column names.
+    :param index_col: int, column(s) to use as the row labels.
+    :param sep: str, delimiter to use.
+    :param low_memory: boolean, internally process the file in chunks.
+    :param rows: range / slice / list, the positions of the data rows.
+    :param row_labels: list, the labels of the rows.
+    :param dtype_args: dict, the dtype arguments for read_csv.
+    :return df: DataFrame, the rows in the requested order.
+    """
+    if header != 0 or (row_labels is not None and index_col != 0):
+        df = pd.read_csv(inpath, sep=sep, header=header, index_col=index_col,
+                         low_memory=low_memory, **dtype_args)
+        if rows is not None:
+            return df.iloc[get_row_positions(df.shape[0], rows), :]
+        return df.loc[row_labels, :]
+
+    row_index = RowIndex(inpath, sep=sep)
+    if rows is not None:
+        positions = get_row_positions(row_index.get_n_rows(), rows)
+    else:
+        positions = row_index.get_positions(row_labels)
+    unique_positions, inverse = np.unique(positions, return_inverse=True)
+
+    df = pd.read_csv(io.BytesIO(row_index.read_rows(unique_positions)),
+                     sep=sep, header=0, index_col=index_col,
+                     low_memory=low_memory, **dtype_args)
+    if index_col is None or index_col is False:
+        df.index = unique_positions
+    if len(unique_positions) != len(positions) or \
+            (np.diff(positions) < 0).any():
+        df = df.iloc[inverse, :]
+    return df
+
+
+def get_dtype_arguments(inpath, header, index_col, sep, dtype):
+    """
+    Method for creating the read_csv arguments that parse the values (all
+    columns except the index column) directly into the requested type. The
+    column names are read from the header line.
+
+    :param inpath: str, the file to be read.
+    :param header: int, row number(s) to use as the column names.
+    :param index_col: int, column(s) to use as the row labels.
+    :param sep: str, delimiter to use.
+    :param dtype: str, the type of the values.
+    :return : dict, the arguments, empty if the file has no header on the
+              first line and the values have to be converted afterwards.
+    """
+    if dtype is None or header != 0:
+        return {}
+
+    columns = list(pd.read_csv(inpath, sep=sep, header=0, nrows=0).columns)
+    if isinstance(index_col, int) and not isinstance(index_col, bool):
+        columns.pop(index_col)
+    elif isinstance(index_col, str):
+        columns.remove(index_col)
+
+    arguments = {"dtype": {column: DTYPES[dtype] for column in columns}}
+    if dtype == "genotype":
+        arguments["na_values"] = {column: [MISSING_GENOTYPE]
+                                  for column in columns}
+    return arguments
+
+
+def convert_dtype(df, dtype):
+    """
+    Method for converting the values of a loaded dataframe to the
+    requested type.
+
+    :param df: DataFrame, the pandas dataframe.
+    :param dtype: str, the type of the values.
+    :return : DataFrame, the converted dataframe.
+    """
+    df = df.astype(DTYPES[dtype])
+    if dtype == "genotype":
+        df = df.mask(df == MISSING_GENOTYPE)
     return df
 
 
-def save_dataframe(df, outpath, header, index, sep="\t"):
+def as_slice(rows):
+    if isinstance(rows, range):
+        return slice(rows.start, rows.stop, rows.step)
+    return rows
+
+
+def get_row_positions(n_rows, rows):
+    """
+    Method for converting a row selection to positions. Ranges and slices
+    are clipped to the number of rows, like DataFrame.iloc does.
+
+    :param n_rows: int, the number of data rows.
+    :param rows: range / slice / list, the row selection.
+    :return : ndarray, the row positions.
+    """
+    rows = as_slice(rows)
+    if isinstance(rows, slice):
+        return np.arange(n_rows)[rows]
+
+    positions = np.asarray(rows, dtype=np.int64)
+    positions = np.where(positions < 0, positions + n_rows, positions)
+    if ((positions < 0) | (positions >= n_rows)).any():
+        raise IndexError("positional indexers are out-of-bounds")
+    return positions
+
+
+def can_select_rows(header, skiprows):
+    """
+    Method for checking if a partial load can be selected from the full
+    dataframe. This requires the header on the first line and skiprows to
+    be a list of data lines.
+
+    :param header: int, row number(s) to use as the column names.
+    :param skiprows: list, the index of rows to skip.
+    :return : boolean.
+    """
+    if header != 0:
+        return False
+    if skiprows is None:
+        return True
+    return not np.isscalar(skiprows) and not callable(skiprows) and \
+           0 not in skiprows
+
+
+def select_rows(df, nrows, skiprows, renumber=False):
+    """
+    Method for selecting the rows read_csv would have returned for nrows
+    and skiprows from the full dataframe. Line i of the file is row i - 1.
+
+    :param df: DataFrame, the full dataframe.
+    :param nrows: int, number of rows of file to read.
+    :param skiprows: list, the index of rows to skip.
+    :param renumber: boolean, whether to replace the index with a range
+                     index like read_csv does without index_col.
+    :return : DataFrame, the selected rows.
+    """
+    mask = np.ones(df.shape[0], dtype=bool)
+    if skiprows is not None:
+        skip = np.asarray(list(skiprows), dtype=np.int64) - 1
+        mask[skip[(skip >= 0) & (skip < df.shape[0])]] = False
+    rows = np.flatnonzero(mask)
+    if nrows is not None:
+        rows = rows[:nrows]
+    df = df.iloc[rows, :]
+    if renumber:
+        df = df.reset_index(drop=True)
+    return df
+
+
+def save_dataframe(df, outpath, header, index, sep="\t", index_label=None,
+                   na_rep=""):
     """
     Method for writing an dataframe to a comma-separated values (csv) file.
+    Gzipped files are written as block gzip (BGZF) with a row index.
 
     :param df: DataFrame, the pandas dataframe.
     :param outpath: str, the filepath for the dataframe.
     :param header: boolean, write out the column names.
     :param index: boolean, write row names (index).
     :param sep: str, field delimiter for the output file.
+    :param index_label: str, column label for the index column.
+    :param na_rep: str, missing data representation.
     """
-    compression = 'infer'
     if outpath.endswith('.gz'):
-        compression = 'gzip'
-
-    df.to_csv(outpath, sep=sep, index=index, header=header,
-              compression=compression)
+        with BgzfWriter(outpath, sep=sep) as f:
+            df.to_csv(f, sep=sep, index=index, header=header,
+                      index_label=index_label, na_rep=na_rep)
+    else:
+        df.to_csv(outpath, sep=sep, index=index, header=header,
+                  index_label=index_label, na_rep=na_rep,
+                  compression='infer')
     print("\tSaved dataframe: {} with shape: {}".format(get_basename(outpath),
                                                         df.shape))
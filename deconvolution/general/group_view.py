@@ -0,0 +1,192 @@
+"""
+File:         group_view.py
+Created:      2026/10/18
+Last Changed:
+Author(s):    M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+import json
+import os
+
+# Third party imports.
+import numpy as np
+
+# Local application imports.
+from .utilities import get_basename
+from .df_utilities import load_dataframe
+
+
+class GroupView:
+    """
+    GroupView: class for a group that is stored as an index manifest over
+        the master tables instead of as a copy of every table. The manifest
+        lists per table filename the master file and whether the rows (the
+        SNP indices) and / or columns (the sample indices) are subset. A
+        table is resolved by loading only the rows of the group from the
+        master: memory mapped if the master has a binary copy (see
+        DataFrameCache), else through its row index. Contiguous indices are
+        selected as slices, which are views without a copy.
+    """
+    manifest_filename = "group_manifest.json"
+    indices_filename = "group_indices.npz"
+
+    def __init__(self, group_dir):
+        """
+        Initializer of the class.
+
+        :param group_dir: str, the directory of the group.
+        """
+        self.group_dir = group_dir
+
+        with open(os.path.join(group_dir, self.manifest_filename)) as f:
+            self.tables = json.load(f)["tables"]
+        f.close()
+
+        with np.load(os.path.join(group_dir, self.indices_filename)) as data:
+            self.snp_indices = data["snp_indices"]
+            self.sample_indices = data["sample_indices"]
+
+    @classmethod
+    def exists(cls, group_dir):
+        return os.path.isfile(os.path.join(group_dir, cls.manifest_filename))
+
+    @classmethod
+    def save(cls, group_dir, tables, snp_indices, sample_indices):
+        """
+        Method for writing the manifest of a group.
+
+        :param group_dir: str, the directory of the group.
+        :param tables: dict, per table filename a tuple with the master file
+                       and the axes to subset ('rows', 'columns' or both).
+        :param snp_indices: ndarray, the row positions in the master.
+        :param sample_indices: ndarray, the column positions in the master.
+        """
+        np.savez(os.path.join(group_dir, cls.indices_filename),
+                 snp_indices=np.asarray(snp_indices, dtype=np.int64),
+                 sample_indices=np.asarray(sample_indices, dtype=np.int64))
+
+        manifest = {"tables": {}}
+        for filename, (master_path, axes) in tables.items():
+            manifest["tables"][filename] = {
+                "master": os.path.relpath(os.path.abspath(master_path),
+                                          os.path.abspath(group_dir)),
+                "rows": "rows" in axes,
+                "columns": "columns" in axes}
+
+        # The manifest is written last, it marks the group as complete.
+        with open(os.path.join(group_dir, cls.manifest_filename), "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        f.close()
+
+    def has_table(self, filename):
+        return filename in self.tables
+
+    def get_snp_indices(self):
+        return self.snp_indices
+
+    def get_sample_indices(self):
+        return self.sample_indices
+
+    def get_master_path(self, filename):
+        return os.path.normpath(os.path.join(self.group_dir,
+                                             self.tables[filename]["master"]))
+
+    def load(self, filename, header, index_col, rows=None, **kwargs):
+        """
+        Method for resolving a table of the group from its master.
+
+        :param filename: str, the filename of the table.
+        :param header: int, row number(s) to use as the column names.
+        :param index_col: int, column(s) to use as the row labels.
+        :param rows: range / slice / list, the positions of the rows to
+                     read within the group.
+        :param kwargs: dict, other arguments of load_dataframe.
+        :return : DataFrame, the table of the group.
+        """
+        table = self.tables[filename]
+        master_path = self.get_master_path(filename)
+        print("\tResolving group table: {} from {}".format(
+            filename, get_basename(master_path)))
+
+        master_rows = rows
+        if table["rows"]:
+            master_rows = self.snp_indices
+            if rows is not None:
+                master_rows = master_rows[rows]
+            master_rows = self.as_selection(master_rows)
+        elif master_rows is not None:
+            master_rows = self.as_selection(master_rows)
+
+        df = load_dataframe(inpath=master_path, header=header,
+                            index_col=index_col, rows=master_rows, **kwargs)
+        if table["rows"] and (index_col is None or index_col is False):
+            # Number the rows as in the group, not as in the master.
+            positions = np.arange(len(self.snp_indices))
+            if rows is not None:
+                positions = positions[rows]
+            df.index = positions
+        if table["columns"]:
+            columns = self.as_selection(self.sample_indices)
+            if not (isinstance(columns, slice) and
+                    columns == slice(0, df.shape[1], 1)):
+                df = df.iloc[:, columns]
+
+        return df
+
+    @staticmethod
+    def as_selection(positions):
+        """
+        Method for converting positions to a slice if they are contiguous,
+        a slice of a memory mapped master is a view instead of a copy.
+
+        :param positions: ndarray / range / slice, the positions.
+        :return : slice / ndarray, the selection.
+        """
+        if isinstance(positions, slice):
+            return positions
+        if isinstance(positions, range):
+            return slice(positions.start, positions.stop, positions.step)
+        positions = np.asarray(positions, dtype=np.int64)
+        if len(positions) > 0 and \
+                positions[-1] - positions[0] == len(positions) - 1 and \
+                (np.diff(positions) == 1).all():
+            return slice(int(positions[0]), int(positions[-1]) + 1, 1)
+        return positions
+
+
+def load_group_dataframe(inpath, header, index_col, **kwargs):
+    """
+    Method for loading a table of a group directory: the file if it
+    exists, else the table resolved from the master if the directory holds
+    a group manifest listing it.
+
+    :param inpath: str, the file to be read.
+    :param header: int, row number(s) to use as the column names.
+    :param index_col: int, column(s) to use as the row labels.
+    :param kwargs: dict, other arguments of load_dataframe.
+    :return : DataFrame, the pandas dataframe.
+    """
+    group_dir = os.path.dirname(inpath)
+    if not os.path.isfile(inpath) and GroupView.exists(group_dir):
+        view = GroupView(group_dir)
+        if view.has_table(get_basename(inpath)):
+            return view.load(get_basename(inpath), header=header,
+                             index_col=index_col, **kwargs)
+    return load_dataframe(inpath=inpath, header=header, index_col=index_col,
+                          **kwargs)
@@ -0,0 +1,127 @@
+"""
+File:         grouping.py
+Created:      2026/10/18
+Last Changed:
+Author(s):    M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+
+# Third party imports.
+import numpy as np
+
+# Local application imports.
+from .objects.group import Group
+
+
+def get_present_mask(values):
+    """
+    Method for getting the non-missing values of a matrix. Missing values
+    are -1, or NaN if loaded with the 'genotype' dtype.
+
+    :param values: ndarray, the matrix.
+    :return : ndarray, boolean, True where the value is present.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    return (values != -1) & ~np.isnan(values)
+
+
+def get_pattern_ids(geno_df, expr_df=None, batch_size=100000):
+    """
+    Method for assigning every eQTL (row) the id of its missingness pattern.
+    The non-missing mask of a row is packed into a bitset and the bitsets
+    are hashed; ids are given in order of first occurrence.
+
+    :param geno_df: DataFrame, the genotype data.
+    :param expr_df: DataFrame, the expression data, same shape as the
+                    genotype data. If given, a sample is only present if
+                    both the genotype and expression are.
+    :param batch_size: int, the number of rows masked at once.
+    :return pattern_ids: ndarray, int64, the pattern id of every row.
+    :return patterns: list, the packed bitset (bytes) of every pattern.
+    """
+    n_rows, n_samples = geno_df.shape
+    if expr_df is not None and expr_df.shape != geno_df.shape:
+        print("Genotype and expression matrix have a different shape.")
+        exit()
+
+    pattern_ids = np.empty(n_rows, dtype=np.int64)
+    pattern_lookup = {}
+    patterns = []
+    n_bytes = max(1, (n_samples + 7) // 8)
+    for start in range(0, n_rows, batch_size):
+        end = min(start + batch_size, n_rows)
+        mask = get_present_mask(geno_df.iloc[start:end, :].to_numpy())
+        if expr_df is not None:
+            mask &= get_present_mask(expr_df.iloc[start:end, :].to_numpy())
+
+        # Pack the rows and hash the unique bitsets of this batch only.
+        packed = np.packbits(mask, axis=1)
+        if packed.shape[1] == 0:
+            packed = np.zeros((end - start, n_bytes), dtype=np.uint8)
+        keys = np.ascontiguousarray(packed).view(
+            np.dtype((np.void, n_bytes))).ravel()
+        _, first, inverse = np.unique(keys, return_index=True,
+                                      return_inverse=True)
+        batch_ids = np.empty(len(first), dtype=np.int64)
+        for i in np.argsort(first, kind="stable"):
+            key = keys[first[i]].tobytes()
+            pattern_id = pattern_lookup.get(key)
+            if pattern_id is None:
+                pattern_id = len(patterns)
+                pattern_lookup[key] = pattern_id
+                patterns.append(key)
+            batch_ids[i] = pattern_id
+        pattern_ids[start:end] = batch_ids[inverse.ravel()]
+
+    return pattern_ids, patterns
+
+
+def create_groups(geno_df, expr_df=None, batch_size=100000):
+    """
+    Method for grouping the eQTLs (rows) on the samples without missing
+    values, e.g. to regress them on the same samples at once.
+
+    :param geno_df: DataFrame, the genotype data.
+    :param expr_df: DataFrame, the expression data, same shape as the
+                    genotype data.
+    :param batch_size: int, the number of rows masked at once.
+    :return : list, the groups in order of first occurrence.
+    """
+    n_samples = geno_df.shape[1]
+    pattern_ids, patterns = get_pattern_ids(geno_df, expr_df=expr_df,
+                                            batch_size=batch_size)
+
+    # Sort the rows by group once and split them.
+    order = np.argsort(pattern_ids, kind="stable").astype(np.int64)
+    bounds = np.cumsum(np.bincount(pattern_ids, minlength=len(patterns)))
+    snp_names = geno_df.index.to_numpy()
+    columns = geno_df.columns
+
+    groups = []
+    for group_id, (pattern, snp_indices) in enumerate(
+            zip(patterns, np.split(order, bounds[:-1]))):
+        mask = np.unpackbits(np.frombuffer(pattern, dtype=np.uint8))
+        sample_indices = np.flatnonzero(mask[:n_samples]).astype(np.int64)
+        groups.append(Group(group_id,
+                            columns[sample_indices].to_list(),
+                            snp_indices=snp_indices,
+                            sample_indices=sample_indices,
+                            eqtls=snp_names[snp_indices].tolist()))
+
+    return groups
@@ -0,0 +1,326 @@
+"""
+File:         nnls.py
+Created:      2026/10/18
+Last Changed:
+Author(s):    M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+from multiprocessing import Pool
+
+# Third party imports.
+import numpy as np
+from scipy.optimize import nnls
+
+# Local application imports.
+
+# The maximal condition number of A'A on a passive set, above it the columns
+# of the signature are considered collinear.
+max_condition = 1 / (1e4 * np.finfo(np.float64).eps)
+
+
+class BatchNNLS:
+    """
+    BatchNNLS: class for solving min ||Ax - b|| subject to x >= 0 for many
+        samples (columns of B) with the same signature matrix A, as
+        scipy.optimize.nnls does per sample. The Gram matrix A'A is computed
+        once and the samples are solved in batches with block principal
+        pivoting (Kim & Park, 2011): samples with the same passive set
+        (non-zero weights) are solved with one linear system. A batch starts
+        from the most common passive set of the previous batch, similar
+        samples then converge in one or two iterations. The chunks of
+        samples can be divided over a pool of processes.
+    """
+
+    def __init__(self, A, batch_size=1000, cores=1, max_iter=None):
+        """
+        Initializer of the class.
+
+        :param A: ndarray, the signature matrix (features x variables).
+        :param batch_size: int, the number of samples solved at once.
+        :param cores: int, the number of processes.
+        :param max_iter: int, the maximum number of pivoting iterations of a
+                         batch, samples that did not converge are solved
+                         with scipy.optimize.nnls. Default: 10 * variables.
+        """
+        self.A = np.ascontiguousarray(A, dtype=np.float64)
+        self.G = self.A.T @ self.A
+        self.batch_size = max(1, batch_size)
+        self.cores = max(1, cores)
+        self.max_iter = max_iter
+        if max_iter is None:
+            self.max_iter = 10 * max(1, self.A.shape[1])
+
+    def solve(self, B):
+        """
+        Method for solving all samples.
+
+        :param B: ndarray, the samples (features x samples).
+        :return X: ndarray, the weights (variables x samples).
+        :return rnorm: ndarray, the residual norm of every sample.
+        """
+        B = np.asarray(B, dtype=np.float64)
+        if B.ndim == 1:
+            B = B[:, np.newaxis]
+        if B.shape[0] != self.A.shape[0]:
+            print("Signature and samples have a different number of "
+                  "features.")
+            exit()
+
+        n_samples = B.shape[1]
+        n_chunks = min(self.cores, -(-n_samples // self.batch_size))
+        if n_chunks <= 1:
+            return solve_chunk((self.A, self.G, B, self.batch_size,
+                                self.max_iter))
+
+        # Every process solves a contiguous chunk of the samples, the warm
+        # start is carried over the batches within a chunk.
+        bounds = np.linspace(0, n_samples, n_chunks + 1).astype(int)
+        chunks = [(self.A, self.G, B[:, start:end], self.batch_size,
+                   self.max_iter)
+                  for start, end in zip(bounds[:-1], bounds[1:])]
+        pool = Pool(processes=n_chunks)
+        try:
+            results = pool.map(solve_chunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+
+        X = np.hstack([result[0] for result in results])
+        rnorm = np.concatenate([result[1] for result in results])
+        return X, rnorm
+
+
+def solve_chunk(args):
+    """
+    Method for solving a chunk of samples batch by batch, every batch
+    starts from the most common passive set of the previous one.
+
+    :param args: tuple, the signature matrix, its Gram matrix, the samples,
+                 the batch size and the maximum number of iterations.
+    :return X: ndarray, the weights (variables x samples).
+    :return rnorm: ndarray, the residual norm of every sample.
+    """
+    A, G, B, batch_size, max_iter = args
+    n_vars = A.shape[1]
+    n_samples = B.shape[1]
+
+    X = np.zeros((n_vars, n_samples), dtype=np.float64)
+    rnorm = np.zeros(n_samples, dtype=np.float64)
+    start_set = np.ones(n_vars, dtype=bool)
+    for start in range(0, n_samples, batch_size):
+        end = min(start + batch_size, n_samples)
+        batch_x, batch_rnorm, passive = solve_batch(A, G, B[:, start:end],
+                                                    start_set, max_iter)
+        X[:, start:end] = batch_x
+        rnorm[start:end] = batch_rnorm
+
+        groups = group_passive_sets(passive)
+        start_set = np.zeros(n_vars, dtype=bool)
+        start_set[max(groups, key=lambda x: len(x[1]))[0]] = True
+
+    return X, rnorm
+
+
+def solve_batch(A, G, B, start_set, max_iter):
+    """
+    Method for solving a batch of samples with block principal pivoting on
+    the normal equations. Samples that do not converge, revisit a passive
+    set, need a (nearly) singular system, e.g. with collinear signature
+    columns, or of which the final weights do not pass the optimality
+    check are solved with scipy.optimize.nnls. The residual norms are
+    ||Ax - b||.
+
+    :param A: ndarray, the signature matrix (features x variables).
+    :param G: ndarray, the Gram matrix A'A.
+    :param B: ndarray, the samples (features x samples).
+    :param start_set: ndarray, boolean, the passive set to start from.
+    :param max_iter: int, the maximum number of iterations.
+    :return X: ndarray, the weights (variables x samples).
+    :return rnorm: ndarray, the residual norm of every sample.
+    :return passive: ndarray, boolean, the final passive sets.
+    """
+    eps = np.finfo(np.float64).eps
+    n_vars = A.shape[1]
+    n_samples = B.shape[1]
+    C = A.T @ B
+
+    # Tolerance of the gradient (as scipy) per sample.
+    tol_y = 10 * eps * max(A.shape) * np.abs(A).sum(axis=0).max() * \
+        np.abs(B).max(axis=0)
+
+    passive = np.repeat(start_set[:, np.newaxis], n_samples, axis=1)
+    X = np.zeros((n_vars, n_samples), dtype=np.float64)
+    Y = np.zeros((n_vars, n_samples), dtype=np.float64)
+    best = np.full(n_samples, n_vars + 1, dtype=np.int64)
+    backup = np.full(n_samples, 3, dtype=np.int64)
+    fallback = np.zeros(n_samples, dtype=bool)
+    history = [np.packbits(passive, axis=0)]
+    todo = np.arange(n_samples)
+    for _ in range(max_iter):
+        fallback[solve_passive_sets(G, C, passive, X, Y, todo)] = True
+        todo = todo[~fallback[todo]]
+
+        infeasible = get_infeasible(X[:, todo], Y[:, todo], passive[:, todo],
+                                    tol_y[todo])
+        n_infeasible = infeasible.sum(axis=0)
+        unsolved = n_infeasible > 0
+        todo = todo[unsolved]
+        if len(todo) == 0:
+            break
+        infeasible = infeasible[:, unsolved]
+        n_infeasible = n_infeasible[unsolved]
+
+        # Exchange all infeasible variables while their number decreases,
+        # allow three more tries, else exchange only the last one.
+        better = n_infeasible < best[todo]
+        best[todo[better]] = n_infeasible[better]
+        backup[todo[better]] = 3
+        retry = ~better & (backup[todo] > 0)
+        backup[todo[retry]] -= 1
+        full = better | retry
+        passive[:, todo[full]] ^= infeasible[:, full]
+        single = np.flatnonzero(~full)
+        last = n_vars - 1 - np.argmax(infeasible[::-1, single], axis=0)
+        passive[last, todo[single]] ^= True
+
+        # A sample that returns to an earlier passive set is cycling.
+        packed = np.packbits(passive, axis=0)
+        for previous in history:
+            repeated = (previous[:, todo] == packed[:, todo]).all(axis=0)
+            fallback[todo[repeated]] = True
+        history.append(packed)
+        todo = todo[~fallback[todo]]
+        if len(todo) == 0:
+            break
+    fallback[todo] = True
+
+    # Refine the weights once with the residuals of A itself, this gives
+    # the accuracy of solving the least squares problem on A directly.
+    X[~passive] = 0
+    D = A.T @ (B - A @ X)
+    for indices, columns in group_passive_sets(passive):
+        columns = columns[~fallback[columns]]
+        if len(indices) == 0 or len(columns) == 0:
+            continue
+        X[np.ix_(indices, columns)] += solve_system(
+            G[np.ix_(indices, indices)], D[np.ix_(indices, columns)])
+
+    # Check the optimality of the refined weights.
+    Y = G @ X - C
+    Y[passive] = 0
+    fallback |= get_infeasible(X, Y, passive, tol_y).any(axis=0)
+    X = np.maximum(X, 0)
+
+    # The remaining samples are solved one by one.
+    for sample in np.flatnonzero(fallback):
+        X[:, sample], _ = nnls(A, B[:, sample])
+        passive[:, sample] = X[:, sample] > 0
+
+    rnorm = np.linalg.norm(A @ X - B, axis=0)
+
+    return X, rnorm, passive
+
+
+def get_infeasible(X, Y, passive, tol_y):
+    """
+    Method for getting the variables that violate the optimality
+    conditions: a negative weight inside or a negative gradient outside
+    the passive set.
+
+    :param X: ndarray, the weights.
+    :param Y: ndarray, the gradients G x - c.
+    :param passive: ndarray, boolean, the passive sets.
+    :param tol_y: ndarray, the gradient tolerance per sample.
+    :return : ndarray, boolean, the infeasible variables.
+    """
+    tol_x = 10 * np.finfo(np.float64).eps * X.shape[0] * \
+        np.abs(X).max(axis=0, initial=0)
+    return (passive & (X < -tol_x)) | (~passive & (Y < -tol_y))
+
+
+def solve_passive_sets(G, C, passive, X, Y, samples):
+    """
+    Method for solving the normal equations of the given samples on their
+    passive set, samples with the same passive set are solved at once. X is
+    zero outside and Y, the gradient G x - c, is zero inside the passive
+    set.
+
+    :param G: ndarray, the Gram matrix A'A.
+    :param C: ndarray, A'B.
+    :param passive: ndarray, boolean, the passive sets.
+    :param X: ndarray, the weights, updated in place.
+    :param Y: ndarray, the gradients, updated in place.
+    :param samples: ndarray, the samples to solve.
+    :return : ndarray, the samples of which the system is (nearly)
+              singular, these are not solved.
+    """
+    singular = []
+    for indices, columns in group_passive_sets(passive[:, samples]):
+        columns = samples[columns]
+        X[:, columns] = 0
+        if len(indices) > 0:
+            G_pp = G[np.ix_(indices, indices)]
+            if np.linalg.cond(G_pp) > max_condition:
+                singular.append(columns)
+                continue
+            X[np.ix_(indices, columns)] = solve_system(
+                G_pp, C[np.ix_(indices, columns)])
+        Y[:, columns] = G @ X[:, columns] - C[:, columns]
+        Y[np.ix_(indices, columns)] = 0
+
+    if len(singular) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(singular)
+
+
+def group_passive_sets(passive):
+    """
+    Method for grouping the samples on their passive set. The passive sets
+    are packed into bitsets to compare them.
+
+    :param passive: ndarray, boolean, the passive sets (variables x
+                    samples).
+    :return : list, per passive set a tuple with the variables and the
+              samples.
+    """
+    packed = np.ascontiguousarray(np.packbits(passive, axis=0).T)
+    keys = packed.view(np.dtype((np.void, packed.shape[1]))).ravel()
+    _, first, inverse = np.unique(keys, return_index=True,
+                                  return_inverse=True)
+    inverse = inverse.ravel()
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.cumsum(np.bincount(inverse, minlength=len(first)))
+
+    return [(np.flatnonzero(passive[:, first[i]]), columns)
+            for i, columns in enumerate(np.split(order, bounds[:-1]))]
+
+
+def solve_system(a, b):
+    """
+    Method for solving a linear system, with least squares if a is
+    singular.
+
+    :param a: ndarray, the square matrix.
+    :param b: ndarray, the right hand sides.
+    :return : ndarray, the solution.
+    """
+    try:
+        return np.linalg.solve(a, b)
+    except np.linalg.LinAlgError:
+        return np.linalg.lstsq(a, b, rcond=None)[0]
@@ -1,7 +1,7 @@
 """
 File:         dataset.py
 Created:      2020/03/16
-Last Changed: 2020/06/19
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -43,6 +43,12 @@ class Dataset:
         self.expr_filename = filenames["expression"]
         self.cov_filename = filenames["covariates"]
         self.markers_filename = filenames["markers"]
+        dtypes = settings.get_setting("load_dtypes")
+        if dtypes is None:
+            dtypes = {}
+        self.geno_dtype = dtypes.get("genotype")
+        self.expr_dtype = dtypes.get("expression")
+        self.cov_dtype = dtypes.get("covariates")
 
         self.inter_input_dir = os.path.join(settings.get_setting("interaction_input_dir"), name)
         inter_subdirs = settings.get_setting("interaction_input_subfolders")
@@ -66,9 +72,11 @@ class Dataset:
         if nrows is not None and nrows <= 0:
             print("Unexpected argument for -n / --n_eqtls: '{}'".format(nrows))
             exit()
+        self.rows = None
         if self.interest is not None:
-            nrows = max(self.interest) + 1
-        self.nrows = nrows
+            self.rows = self.interest
+        elif nrows is not None:
+            self.rows = range(nrows)
 
         # Declare empty variables.
         self.eqtl_df = None
@@ -89,7 +97,7 @@ class Dataset:
 
     def load_all(self):
         print("Loading all dataframes for validation.")
-        self.nrows = None
+        self.rows = None
         self.get_celltypes()
         self.get_eqtl_df()
         self.get_geno_df()
@@ -132,13 +140,11 @@ class Dataset:
 
     def get_eqtl_df(self):
         if self.eqtl_df is None:
-            eqtl_df = load_dataframe(inpath=os.path.join(self.input_dir,
-                                                         self.eqtl_filename),
-                                     header=0,
-                                     index_col=False,
-                                     nrows=self.nrows)
-            if self.interest is not None:
-                eqtl_df = eqtl_df.iloc[self.interest, :]
+            eqtl_df = load_group_dataframe(inpath=os.path.join(self.input_dir,
+                                                               self.eqtl_filename),
+                                           header=0,
+                                           index_col=False,
+                                           rows=self.rows)
             self.eqtl_df = eqtl_df
 
             self.validate()
@@ -146,13 +152,12 @@ class Dataset:
 
     def get_geno_df(self):
         if self.geno_df is None:
-            geno_df = load_dataframe(inpath=os.path.join(self.input_dir,
-                                                         self.geno_filename),
-                                     header=0,
-                                     index_col=0,
-                                     nrows=self.nrows)
-            if self.interest is not None:
-                geno_df = geno_df.iloc[self.interest, :]
+            geno_df = load_group_dataframe(inpath=os.path.join(self.input_dir,
+                                                               self.geno_filename),
+                                           header=0,
+                                           index_col=0,
+                                           rows=self.rows,
+                                           dtype=self.geno_dtype)
             self.geno_df = geno_df
 
             self.validate()
@@ -160,13 +165,11 @@ class Dataset:
 
     def get_alleles_df(self):
         if self.alleles_df is None:
-            alleles_df = load_dataframe(inpath=os.path.join(self.input_dir,
-                                                            self.alleles_filename),
-                                        header=0,
-                                        index_col=0,
-                                        nrows=self.nrows)
-            if self.interest is not None:
-                alleles_df = alleles_df.iloc[self.interest, :]
+            alleles_df = load_group_dataframe(inpath=os.path.join(self.input_dir,
+                                                                  self.alleles_filename),
+                                              header=0,
+                                              index_col=0,
+                                              rows=self.rows)
             self.alleles_df = alleles_df
 
             self.validate()
@@ -174,14 +177,12 @@ class Dataset:
 
     def get_expr_df(self):
         if self.expr_df is None:
-            expr_df = load_dataframe(inpath=os.path.join(self.input_dir,
-                                                         self.expr_filename),
-                                     header=0,
-                                     index_col=0,
-                                     nrows=self.nrows)
-
-            if self.interest is not None:
-                expr_df = expr_df.iloc[self.interest, :]
+            expr_df = load_group_dataframe(inpath=os.path.join(self.input_dir,
+                                                               self.expr_filename),
+                                           header=0,
+                                           index_col=0,
+                                           rows=self.rows,
+                                           dtype=self.expr_dtype)
             self.expr_df = expr_df
 
             self.validate()
@@ -189,10 +190,11 @@ class Dataset:
 
     def get_cov_df(self):
         if self.cov_df is None:
-            self.cov_df = load_dataframe(inpath=os.path.join(self.input_dir,
-                                                             self.cov_filename),
-                                         header=0,
-                                         index_col=0)
+            self.cov_df = load_group_dataframe(inpath=os.path.join(self.input_dir,
+                                                                   self.cov_filename),
+                                               header=0,
+                                               index_col=0,
+                                               dtype=self.cov_dtype)
             self.validate()
         return self.cov_df
 
@@ -320,9 +322,9 @@ class Dataset:
 
     def get_eqtl_and_interactions_df(self):
         # Get the complete input dataframes.
-        df1 = load_dataframe(inpath=os.path.join(self.input_dir,
-                                                 self.eqtl_filename),
-                             header=0, index_col=False)
+        df1 = load_group_dataframe(inpath=os.path.join(self.input_dir,
+                                                       self.eqtl_filename),
+                                   header=0, index_col=False)
         df2 = load_dataframe(inpath=os.path.join(self.inter_input_dir,
                                                  self.inter_cov_subdir,
                                                  self.zscore_filename),
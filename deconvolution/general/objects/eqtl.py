@@ -1,7 +1,7 @@
 """
 File:         eqtl.py
 Created:      2020/03/19
-Last Changed:
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -53,13 +53,10 @@ class Eqtl:
 
     @staticmethod
     def filter_data(df):
-        tmp_df = df.copy()
-        tmp_df.replace(-1, np.nan, inplace=True)
-        indices = np.arange(tmp_df.shape[0])
-        sample_indices = indices[~tmp_df.isnull().any(axis=1).values]
-        tmp_df.dropna(inplace=True)
-        samples = tmp_df.index.to_list()
-        del tmp_df
+        # Missing values are -1, or NaN if loaded with the 'genotype' dtype.
+        mask = ((df != -1) & df.notnull()).all(axis=1).values
+        sample_indices = np.flatnonzero(mask)
+        samples = df.index[mask].to_list()
         return samples, sample_indices
 
     def get_name(self):
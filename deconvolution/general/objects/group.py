@@ -1,7 +1,7 @@
 """
 File:         group.py
 Created:      2020/03/19
-Last Changed:
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -29,13 +29,26 @@ import numpy as np
 
 
 class Group:
-    def __init__(self, id, samples):
+    def __init__(self, id, samples, snp_indices=None, sample_indices=None,
+                 eqtls=None):
         self.id = "group_{}".format(id)
         self.samples = samples
 
-        self.snp_indices = np.array([], dtype=np.int16)
+        # The indices are int64 arrays; eQTLs added one at a time are
+        # collected in a list and concatenated once when requested.
+        if snp_indices is None:
+            snp_indices = []
+        self.snp_indices = np.asarray(snp_indices, dtype=np.int64)
+        self.new_snp_indices = []
         self.sample_indices = None
-        self.eqtls = []
+        if sample_indices is not None:
+            self.sample_indices = np.asarray(sample_indices, dtype=np.int64)
+        self.eqtls = [] if eqtls is None else list(eqtls)
+
+    def __setstate__(self, state):
+        # Groups pickled before the int64 indices.
+        state.setdefault("new_snp_indices", [])
+        self.__dict__.update(state)
 
     def add_eqtl(self, eqtl):
         self.eqtls.append(eqtl)
@@ -43,11 +56,11 @@ class Group:
         self.set_sample_indices(eqtl.get_sample_indices())
 
     def add_snp_index(self, index):
-        self.snp_indices = np.append(self.snp_indices, index)
+        self.new_snp_indices.append(index)
 
     def set_sample_indices(self, indices):
         if self.sample_indices is None:
-            self.sample_indices = indices
+            self.sample_indices = np.asarray(indices, dtype=np.int64)
 
     def get_id(self):
         return self.id
@@ -56,6 +69,11 @@ class Group:
         return self.samples
 
     def get_snp_indices(self):
+        if self.new_snp_indices:
+            self.snp_indices = np.concatenate(
+                [self.snp_indices,
+                 np.array(self.new_snp_indices, dtype=np.int64)])
+            self.new_snp_indices = []
         return self.snp_indices
 
     def get_sample_indices(self):
@@ -65,7 +83,7 @@ class Group:
         return self.eqtls
 
     def get_n_eqtls(self):
-        return len(self.eqtls)
+        return len(self.snp_indices) + len(self.new_snp_indices)
 
     def get_n_samples(self):
         return len(self.sample_indices)
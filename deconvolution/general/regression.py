@@ -0,0 +1,164 @@
+"""
+File:         regression.py
+Created:      2026/10/18
+Last Changed:
+Author(s):    M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+
+# Third party imports.
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+# Local application imports.
+
+REGRESSION_COLUMNS = ["snp", "probe", "alleles", "minor_allele",
+                      "allele_assessed", "flipped", "slope", "intercept",
+                      "corr_coeff", "p_value", "std_err", "overal_z_score",
+                      "z_score_estimate"]
+
+
+def linregress_rows(x, y, mask=None):
+    """
+    Method for performing a simple linear regression (as
+    scipy.stats.linregress) of every row of y on the same row of x at once.
+    Samples outside the mask are left out of the regression of that row.
+
+    :param x: ndarray, the independent variable, one regression per row.
+    :param y: ndarray, the dependent variable, same shape as x.
+    :param mask: ndarray, boolean, the samples to use per row, default is
+                 all samples.
+    :return : dict, the slope, intercept, r_value, p_value and std_err per
+              row, NaN if the row has less than two samples or a constant x.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if mask is None:
+        mask = np.ones(x.shape, dtype=bool)
+    x = np.where(mask, x, 0.0)
+    y = np.where(mask, y, 0.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n = mask.sum(axis=1).astype(np.float64)
+        xmean = x.sum(axis=1) / n
+        ymean = y.sum(axis=1) / n
+
+        # Average sums of (the product of) the differences from the mean.
+        dx = np.where(mask, x - xmean[:, np.newaxis], 0.0)
+        dy = np.where(mask, y - ymean[:, np.newaxis], 0.0)
+        ssxm = np.einsum("ij,ij->i", dx, dx) / n
+        ssym = np.einsum("ij,ij->i", dy, dy) / n
+        ssxym = np.einsum("ij,ij->i", dx, dy) / n
+        del dx, dy
+
+        r = np.clip(ssxym / np.sqrt(ssxm * ssym), -1.0, 1.0)
+        slope = ssxym / ssxm
+        intercept = ymean - slope * xmean
+
+        df = n - 2
+        tiny = 1.0e-20
+        t = r * np.sqrt(df / ((1.0 - r + tiny) * (1.0 + r + tiny)))
+        p_value = 2 * stats.t.sf(np.abs(t), np.maximum(df, 1))
+        std_err = np.sqrt((1 - r ** 2) * ssym / ssxm / df)
+
+    # Handle the case when only two points are passed in.
+    two = n == 2
+    p_value[two] = np.where(ssym[two] == 0, 1.0, 0.0)
+    std_err[two] = 0.0
+
+    # Rows without a regression.
+    invalid = (n < 2) | (ssxm == 0)
+    for values in [slope, intercept, r, p_value, std_err]:
+        values[invalid] = np.nan
+
+    return {"slope": slope, "intercept": intercept, "r_value": r,
+            "p_value": p_value, "std_err": std_err}
+
+
+def create_regression_table(eqtl_df, geno_df, alleles_df, expr_df, mask,
+                            batch_size=10000):
+    """
+    Method for regressing the expression on the genotype of every eQTL. The
+    genotype is flipped (2 - genotype) if the assessed allele is not the
+    second allele. The rows of the genotype, alleles and expression
+    dataframes have to be in the order of the eQTL dataframe; the table
+    stops at the first row of which the SNP does not match.
+
+    :param eqtl_df: DataFrame, the eQTLs with the columns SNPName,
+                    ProbeName, OverallZScore and AlleleAssessed.
+    :param geno_df: DataFrame, the genotype data.
+    :param alleles_df: DataFrame, the Alleles and MinorAllele of the SNPs.
+    :param expr_df: DataFrame, the expression data.
+    :param mask: function, function(geno_values, expr_values) that returns
+                 the boolean matrix of the samples to use.
+    :param batch_size: int, the number of eQTLs regressed at once.
+    :return : DataFrame, the regression table.
+    """
+    snp_names = eqtl_df["SNPName"].to_numpy()
+    n_rows = len(snp_names)
+    for name, df in [("genotype", geno_df), ("expression", expr_df)]:
+        matches = df.index[:n_rows].to_numpy() == snp_names[:df.shape[0]]
+        n_matching = int(np.argmin(np.append(matches, False)))
+        if n_matching < n_rows:
+            print("SNPName does not match in {} subset.".format(name))
+            n_rows = n_matching
+
+    eqtl_df = eqtl_df.iloc[:n_rows, :]
+    alleles = alleles_df.iloc[:n_rows, 0].to_numpy()
+    minor_alleles = alleles_df.iloc[:n_rows, 1].to_numpy()
+    allele_assessed = eqtl_df["AlleleAssessed"].to_numpy()
+    flipped = np.array([assessed != allele.split("/")[1]
+                        for assessed, allele in zip(allele_assessed, alleles)],
+                       dtype=bool)
+
+    results = {key: np.empty(n_rows) for key in ["slope", "intercept",
+                                                 "r_value", "p_value",
+                                                 "std_err"]}
+    for start in range(0, n_rows, batch_size):
+        end = min(start + batch_size, n_rows)
+        print("\t Processing {}/{} [{:.2f}%]".format(end, n_rows,
+                                                     (100 / n_rows) * end))
+        geno = geno_df.iloc[start:end, :].to_numpy(dtype=np.float64)
+        expr = expr_df.iloc[start:end, :].to_numpy(dtype=np.float64)
+        batch_mask = mask(geno, expr)
+
+        # Determine whether to flip or not.
+        geno = np.where(flipped[start:end, np.newaxis], 2.0 - geno, geno)
+
+        for key, values in linregress_rows(geno, expr, batch_mask).items():
+            results[key][start:end] = values
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z_score_estimate = results["slope"] / results["std_err"]
+
+    return pd.DataFrame({"snp": snp_names[:n_rows],
+                         "probe": eqtl_df["ProbeName"].to_numpy(),
+                         "alleles": alleles,
+                         "minor_allele": minor_alleles,
+                         "allele_assessed": allele_assessed,
+                         "flipped": flipped,
+                         "slope": results["slope"],
+                         "intercept": results["intercept"],
+                         "corr_coeff": results["r_value"],
+                         "p_value": results["p_value"],
+                         "std_err": results["std_err"],
+                         "overal_z_score": eqtl_df["OverallZScore"].to_numpy(),
+                         "z_score_estimate": z_score_estimate},
+                        columns=REGRESSION_COLUMNS)
@@ -0,0 +1,316 @@
+"""
+File:         row_index.py
+Created:      2026/10/18
+Last Changed:
+Author(s):    M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+import struct
+import json
+import gzip
+import zlib
+import os
+
+# Third party imports.
+import numpy as np
+import pandas as pd
+
+# Local application imports.
+
+
+class RowIndex:
+    """
+    RowIndex: class containing the (uncompressed) byte offset and the first
+        field of every line of a text table. The index is built once and
+        saved in a hidden file next to the table; it is rebuilt once the
+        size or modification time of the table changes. Lines are read by
+        seeking to their offset: directly for plain text, per block for
+        block gzip (BGZF) files and by decompressing without parsing for
+        other gzip files.
+    """
+    version = 1
+    suffix = ".rowidx.npz"
+
+    def __init__(self, inpath, sep="\t", load=True):
+        """
+        Initializer of the class.
+
+        :param inpath: str, the text table.
+        :param sep: str, the delimiter of the table.
+        :param load: boolean, whether to load (or build) the index.
+        """
+        self.inpath = inpath
+        self.sep = sep
+        self.index_path = os.path.join(
+            os.path.dirname(os.path.abspath(inpath)),
+            "." + os.path.basename(inpath) + self.suffix)
+
+        # Set the index variables.
+        self.offsets = None
+        self.labels = None
+        self.block_coffsets = None
+        self.block_uoffsets = None
+        self.label_index = None
+        if load:
+            self.load()
+
+    def get_key(self):
+        stat = os.stat(self.inpath)
+        return json.dumps({"version": self.version,
+                           "size": stat.st_size,
+                           "mtime_ns": stat.st_mtime_ns,
+                           "sep": self.sep}, sort_keys=True)
+
+    def load(self):
+        """
+        Method for loading the index from disk or building it if it is
+        missing or outdated.
+        """
+        key = self.get_key()
+        if os.path.isfile(self.index_path):
+            try:
+                with np.load(self.index_path) as data:
+                    if str(data["key"]) == key:
+                        self.offsets = data["offsets"]
+                        self.labels = data["labels"]
+                        self.block_coffsets = data["block_coffsets"]
+                        self.block_uoffsets = data["block_uoffsets"]
+                        return
+            except (OSError, ValueError, KeyError):
+                pass
+
+        print("\tBuilding row index: {}".format(os.path.basename(self.inpath)))
+        self.build()
+        self.save()
+
+    def set_index(self, offsets, labels, block_coffsets, block_uoffsets):
+        """
+        Method for setting an index that is known already, e.g. by the
+        writer of the table.
+
+        :param offsets: ndarray, the start offset of every line and the end
+                        offset of the last line.
+        :param labels: ndarray, the first field of every data line.
+        :param block_coffsets: ndarray, the compressed BGZF block offsets.
+        :param block_uoffsets: ndarray, the uncompressed BGZF block offsets.
+        """
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.labels = np.asarray(labels, dtype=bytes)
+        self.block_coffsets = np.asarray(block_coffsets, dtype=np.int64)
+        self.block_uoffsets = np.asarray(block_uoffsets, dtype=np.int64)
+
+    def save(self):
+        """
+        Method for saving the index next to the table.
+        """
+        try:
+            tmp_path = "{}.{}.tmp.npz".format(self.index_path[:-4], os.getpid())
+            np.savez(tmp_path,
+                     key=np.array(self.get_key()),
+                     offsets=self.offsets,
+                     labels=self.labels,
+                     block_coffsets=self.block_coffsets,
+                     block_uoffsets=self.block_uoffsets)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print("\tUnable to save row index: {}".format(e))
+
+    def build(self):
+        """
+        Method for scanning the table once to get the start offset and the
+        first field of every line.
+        """
+        sep = self.sep.encode()
+        offsets = [0]
+        labels = []
+        with self.open() as f:
+            position = 0
+            for line in f:
+                position += len(line)
+                offsets.append(position)
+                labels.append(line.split(sep, 1)[0].rstrip(b"\r\n"))
+        f.close()
+
+        self.offsets = np.array(offsets, dtype=np.int64)
+        # The first line is the header.
+        self.labels = np.array(labels[1:], dtype=bytes)
+        self.block_coffsets, self.block_uoffsets = self.get_bgzf_blocks()
+
+    def open(self):
+        if self.is_gzip():
+            return gzip.open(self.inpath, "rb")
+        return open(self.inpath, "rb")
+
+    def is_gzip(self):
+        with open(self.inpath, "rb") as f:
+            magic = f.read(2)
+        f.close()
+        return magic == b"\x1f\x8b"
+
+    def get_bgzf_blocks(self):
+        """
+        Method for getting the compressed and uncompressed start offset of
+        every block if the file is block gzip compressed. Only the block
+        headers and footers are read.
+
+        :return block_coffsets: ndarray, the compressed offsets.
+        :return block_uoffsets: ndarray, the uncompressed offsets.
+        """
+        coffsets = []
+        uoffsets = []
+        with open(self.inpath, "rb") as f:
+            coffset = 0
+            uoffset = 0
+            while True:
+                header = f.read(12)
+                if len(header) == 0:
+                    break
+                if len(header) < 12 or header[:4] != b"\x1f\x8b\x08\x04":
+                    coffsets = []
+                    uoffsets = []
+                    break
+                xlen = struct.unpack("<H", header[10:12])[0]
+                bsize = self.get_bsize(f.read(xlen))
+                if bsize is None:
+                    coffsets = []
+                    uoffsets = []
+                    break
+                f.seek(coffset + bsize + 1 - 4)
+                isize = struct.unpack("<I", f.read(4))[0]
+                coffsets.append(coffset)
+                uoffsets.append(uoffset)
+                coffset += bsize + 1
+                uoffset += isize
+        f.close()
+
+        if len(coffsets) > 0:
+            coffsets.append(coffset)
+            uoffsets.append(uoffset)
+        return np.array(coffsets, dtype=np.int64), \
+               np.array(uoffsets, dtype=np.int64)
+
+    @staticmethod
+    def get_bsize(extra):
+        """
+        Method for getting the total block size minus one from the 'BC'
+        subfield of the gzip extra field.
+
+        :param extra: bytes, the gzip extra field.
+        :return : int, the block size minus one, None if not BGZF.
+        """
+        i = 0
+        while i + 4 <= len(extra):
+            slen = struct.unpack("<H", extra[i + 2:i + 4])[0]
+            if extra[i:i + 2] == b"BC" and slen == 2:
+                return struct.unpack("<H", extra[i + 4:i + 6])[0]
+            i += 4 + slen
+        return None
+
+    def get_n_rows(self):
+        return len(self.labels)
+
+    def get_labels(self):
+        return pd.Index(np.char.decode(self.labels, "utf-8"))
+
+    def get_positions(self, labels):
+        """
+        Method for getting the row positions of row labels (the first field
+        of the line).
+
+        :param labels: list, the row labels.
+        :return : ndarray, the positions.
+        """
+        if self.label_index is None:
+            self.label_index = pd.Index(self.labels)
+            if not self.label_index.is_unique:
+                print("Row labels of {} are not unique.".format(
+                    os.path.basename(self.inpath)))
+                exit()
+        positions = self.label_index.get_indexer(
+            [str(label).encode() for label in labels])
+        if (positions < 0).any():
+            missing = [label for label, position in zip(labels, positions)
+                       if position < 0]
+            raise KeyError("{} not in index".format(missing))
+        return positions
+
+    def read_rows(self, positions):
+        """
+        Method for reading the header and the lines of the given data rows
+        in file order.
+
+        :param positions: ndarray, the sorted unique row positions.
+        :return : bytes, the header followed by the lines.
+        """
+        # Group consecutive rows in uncompressed byte ranges, data row i is
+        # line i + 1.
+        ranges = [(self.offsets[0], self.offsets[1])]
+        if len(positions) > 0:
+            breaks = np.flatnonzero(np.diff(positions) != 1) + 1
+            for run in np.split(positions, breaks):
+                ranges.append((self.offsets[run[0] + 1],
+                               self.offsets[run[-1] + 2]))
+
+        if len(self.block_coffsets) > 0:
+            chunks = self.read_bgzf_ranges(ranges)
+        else:
+            chunks = []
+            with self.open() as f:
+                for start, end in ranges:
+                    f.seek(start)
+                    chunks.append(f.read(end - start))
+            f.close()
+
+        for i, chunk in enumerate(chunks):
+            if not chunk.endswith(b"\n"):
+                chunks[i] = chunk + b"\n"
+        return b"".join(chunks)
+
+    def read_bgzf_ranges(self, ranges):
+        """
+        Method for reading sorted uncompressed byte ranges from a block gzip
+        file by decompressing only the blocks that contain them, every
+        block at most once.
+
+        :param ranges: list, the sorted (start, end) uncompressed offsets.
+        :return : list, the data of every range.
+        """
+        chunks = []
+        blocks = {}
+        with open(self.inpath, "rb") as f:
+            for start, end in ranges:
+                first = np.searchsorted(self.block_uoffsets, start,
+                                        side="right") - 1
+                last = np.searchsorted(self.block_uoffsets, end, side="left")
+                for i in list(blocks.keys()):
+                    if i < first:
+                        del blocks[i]
+                for i in range(first, last):
+                    if i not in blocks:
+                        f.seek(self.block_coffsets[i])
+                        block = f.read(self.block_coffsets[i + 1] -
+                                       self.block_coffsets[i])
+                        xlen = struct.unpack("<H", block[10:12])[0]
+                        blocks[i] = zlib.decompress(block[12 + xlen:-8], -15)
+                uncompressed = b"".join(blocks[i] for i in range(first, last))
+                ustart = self.block_uoffsets[first]
+                chunks.append(uncompressed[start - ustart:end - ustart])
+        f.close()
+
+        return chunks
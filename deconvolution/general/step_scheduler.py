@@ -0,0 +1,314 @@
+"""
+File:         step_scheduler.py
+Created:      2026/10/18
+Last Changed: 2026/10/18
+Author(s):    M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import threading
+import hashlib
+import json
+import os
+
+# Third party imports.
+
+# Local application imports.
+
+
+class StepScheduler:
+    """
+    StepScheduler: class for running the steps of a program as a dependency
+        graph. Every step has a key: the hash of its settings, arguments,
+        the content of its input files and the content of the output files
+        of the steps it depends on. Once a step finished and its output
+        files are written, its key and output files are saved in a manifest.
+        A step is redone if it is forced, if a step it depends on was redone,
+        if its key changed or if its output files changed; otherwise the
+        step is started with force=False and loads its results. Steps of
+        which all dependencies are finished run concurrently.
+    """
+    manifest_filename = "step_manifest.json"
+    file_hashes_filename = "file_hashes.json"
+
+    def __init__(self, outdir, wait_for_outputs=None):
+        """
+        Initializer of the class.
+
+        :param outdir: str, the output directory, every step writes to the
+                       subdirectory with its name.
+        :param wait_for_outputs: function, function(step_dir) that returns
+                                 once the (background) writes to the
+                                 output directory of a step are finished.
+        """
+        self.outdir = outdir
+        self.wait_for_outputs = wait_for_outputs
+        self.steps = {}
+
+        # The content hashes of files are saved by path, size and
+        # modification time to only hash changed files.
+        self.lock = threading.Lock()
+        self.file_hashes_path = os.path.join(outdir, self.file_hashes_filename)
+        self.file_hashes = self.load_file_hashes()
+
+    def add_step(self, name, function, dependencies=None, settings=None,
+                 arguments=None, inpaths=None, force=False):
+        """
+        Method for adding a step to the graph. The dependencies have to be
+        added first.
+
+        :param name: str, the name of the step (and its output directory).
+        :param function: function, function(force, steps) that starts the
+                         step and returns it, steps is a dictionary with
+                         the finished steps it depends on.
+        :param dependencies: list, the names of the steps it depends on.
+        :param settings: dict, the settings of the step.
+        :param arguments: dict, other arguments of the step.
+        :param inpaths: list, the input files of the step.
+        :param force: boolean, whether or not to force the step to redo.
+        """
+        if dependencies is None:
+            dependencies = []
+        for dependency in dependencies:
+            if dependency not in self.steps:
+                print("Step '{}' depends on unknown step '{}'.".format(
+                    name, dependency))
+                exit()
+
+        self.steps[name] = {"function": function,
+                            "dependencies": list(dependencies),
+                            "settings": settings,
+                            "arguments": arguments,
+                            "inpaths": [] if inpaths is None else inpaths,
+                            "force": force}
+
+    def run(self):
+        """
+        Method for running all steps, a step is submitted as soon as the
+        output files of the steps it depends on are written.
+
+        :return : dict, the finished steps by name.
+        """
+        results = {}
+        redone = {}
+        finished = {}
+        waiting = list(self.steps.keys())
+        running = {}
+        saving = {}
+        with ThreadPoolExecutor(max_workers=max(1, 2 * len(self.steps))) as executor:
+            while waiting or running or saving:
+                for name in list(waiting):
+                    dependencies = self.steps[name]["dependencies"]
+                    if all(dependency in finished
+                           for dependency in dependencies):
+                        waiting.remove(name)
+                        future = executor.submit(
+                            self.run_step, name,
+                            {x: results[x] for x in dependencies},
+                            {x: finished[x] for x in dependencies},
+                            [x for x in dependencies if redone[x]])
+                        running[future] = name
+
+                done, _ = wait(list(running) + list(saving),
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in running:
+                        name = running.pop(future)
+                        results[name], key, redone[name] = future.result()
+                        saving[executor.submit(self.save_manifest, name,
+                                               key)] = name
+                    else:
+                        name = saving.pop(future)
+                        finished[name] = future.result()
+
+        self.save_file_hashes()
+        return results
+
+    def run_step(self, name, steps, dependency_keys, redone_dependencies):
+        """
+        Method for running one step.
+
+        :param name: str, the name of the step.
+        :param steps: dict, the finished steps it depends on.
+        :param dependency_keys: dict, the output hashes of the steps it
+                                depends on.
+        :param redone_dependencies: list, the steps it depends on that were
+                                    redone.
+        :return step: object, the object returned by the step function.
+        :return key: str, the key of the step.
+        :return force: boolean, whether or not the step was redone.
+        """
+        step = self.steps[name]
+        key = self.get_key(name, step, dependency_keys)
+        step_dir = os.path.join(self.outdir, name)
+        manifest_path = os.path.join(step_dir, self.manifest_filename)
+
+        force = step["force"]
+        if not force and redone_dependencies:
+            print("Step '{}' is out of date, redone: {}.".format(
+                name, ", ".join(redone_dependencies)))
+            force = True
+        if not force and not self.is_up_to_date(manifest_path, step_dir, key):
+            print("Step '{}' is out of date.".format(name))
+            force = True
+
+        result = step["function"](force=force, steps=steps)
+
+        return result, key, force
+
+    def get_key(self, name, step, dependency_keys):
+        """
+        Method for creating the hash of everything a step depends on.
+
+        :param name: str, the name of the step.
+        :param step: dict, the step.
+        :param dependency_keys: dict, the output hashes of the steps it
+                                depends on.
+        :return : str, the key.
+        """
+        content = {"name": name,
+                   "settings": step["settings"],
+                   "arguments": step["arguments"],
+                   "inputs": {path: self.get_file_hash(path)
+                              for path in sorted(set(step["inpaths"]))},
+                   "dependencies": dependency_keys}
+        return hashlib.sha256(json.dumps(content, sort_keys=True,
+                                         default=str).encode()).hexdigest()
+
+    def get_file_hash(self, path):
+        """
+        Method for getting the SHA-256 hash of the content of a file.
+
+        :param path: str, the file.
+        :return : str, the hash, None if the file does not exist.
+        """
+        if not os.path.isfile(path):
+            return None
+
+        abspath = os.path.abspath(path)
+        stat = os.stat(abspath)
+        with self.lock:
+            saved = self.file_hashes.get(abspath)
+        if saved is not None and saved[0] == stat.st_size and \
+                saved[1] == stat.st_mtime_ns:
+            return saved[2]
+
+        print("\tHashing file: {}".format(os.path.basename(path)))
+        sha256 = hashlib.sha256()
+        with open(abspath, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 ** 2), b""):
+                sha256.update(chunk)
+        f.close()
+
+        with self.lock:
+            self.file_hashes[abspath] = [stat.st_size, stat.st_mtime_ns,
+                                         sha256.hexdigest()]
+        return sha256.hexdigest()
+
+    def get_output_files(self, step_dir):
+        """
+        Method for getting the size and modification time of the files in
+        the output directory of a step. Hidden files (e.g. caches) and the
+        manifest are excluded.
+
+        :param step_dir: str, the output directory of the step.
+        :return : dict, [size, modification time] by relative path.
+        """
+        outputs = {}
+        for root, dirs, files in os.walk(step_dir):
+            dirs[:] = [x for x in dirs if not x.startswith(".")]
+            for filename in files:
+                if filename.startswith(".") or \
+                        filename == self.manifest_filename:
+                    continue
+                path = os.path.join(root, filename)
+                stat = os.stat(path)
+                outputs[os.path.relpath(path, step_dir)] = [stat.st_size,
+                                                            stat.st_mtime_ns]
+        return outputs
+
+    def is_up_to_date(self, manifest_path, step_dir, key):
+        """
+        Method for checking if the saved manifest of a step has the same key
+        and output files.
+
+        :param manifest_path: str, the manifest file.
+        :param step_dir: str, the output directory of the step.
+        :param key: str, the current key of the step.
+        :return : boolean.
+        """
+        if not os.path.isfile(manifest_path):
+            return False
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            f.close()
+        except (OSError, ValueError):
+            return False
+
+        return manifest.get("key") == key and \
+               manifest.get("outputs") == self.get_output_files(step_dir)
+
+    def save_manifest(self, name, key):
+        """
+        Method for saving the key and the output files of a finished step
+        once they are written.
+
+        :param name: str, the name of the step.
+        :param key: str, the key of the step.
+        :return : str, the hash of the content of the output files.
+        """
+        step_dir = os.path.join(self.outdir, name)
+        if self.wait_for_outputs is not None:
+            self.wait_for_outputs(step_dir)
+
+        outputs = self.get_output_files(step_dir)
+        manifest = {"key": key, "outputs": outputs}
+        self.write_json(os.path.join(step_dir, self.manifest_filename),
+                        manifest)
+
+        content = {path: self.get_file_hash(os.path.join(step_dir, path))
+                   for path in outputs.keys()}
+        return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+    def load_file_hashes(self):
+        if not os.path.isfile(self.file_hashes_path):
+            return {}
+        try:
+            with open(self.file_hashes_path) as f:
+                file_hashes = json.load(f)
+            f.close()
+        except (OSError, ValueError):
+            return {}
+        return file_hashes
+
+    def save_file_hashes(self):
+        with self.lock:
+            self.write_json(self.file_hashes_path, self.file_hashes)
+
+    @staticmethod
+    def write_json(path, content):
+        try:
+            tmp_path = "{}.{}.tmp".format(path, os.getpid())
+            with open(tmp_path, "w") as f:
+                json.dump(content, f, indent=2, sort_keys=True)
+            f.close()
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print("\tUnable to save {}: {}".format(os.path.basename(path), e))
@@ -1,7 +1,7 @@
 """
 File:         eqtl.py
 Created:      2020/06/09
-Last Changed: 2020/06/11
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -120,8 +120,8 @@ class Eqtl:
         data["geno_group"] = data["genotype"].round(0)
         del genotype_df, expression_df
 
-        data.replace(-1, np.nan, inplace=True)
-        data.dropna(inplace=True)
+        # Missing values are -1, or NaN if loaded with the 'genotype' dtype.
+        data = data.loc[((data != -1) & data.notnull()).all(axis=1), :]
         return data
 
     @staticmethod
@@ -3,7 +3,7 @@
 """
 File:         create_CIA_jobs.py
 Created:      2020/04/22
-Last Changed: 2020/06/08
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -59,12 +59,12 @@ class main():
         self.stop_index = getattr(arguments, 'last')
         self.batch_size = getattr(arguments, 'batch')
         self.n_samples = getattr(arguments, 'n_samples')
+        self.cores = getattr(arguments, 'cores')
 
         # Set the variables.
         self.outdir = Path(__file__).parent.absolute()
         self.log_file_outdir = os.path.join(self.outdir, 'output')
         self.time = "05:59:00"
-        self.cores = 1
         self.mem = 2
 
         if not os.path.exists(self.log_file_outdir):
@@ -118,6 +118,11 @@ class main():
                             type=int,
                             required=True,
                             help="The number of samples.")
+        parser.add_argument("-c",
+                            "--cores",
+                            type=int,
+                            default=1,
+                            help="The number of cores per job. Default: 1.")
         parser.add_argument("-e",
                             "--exclude",
                             type=str,
@@ -164,7 +169,7 @@ class main():
                  "module load Python/3.6.3-foss-2015b\n",
                  "source $HOME/venv/bin/activate\n",
                  "\n",
-                 "python3 /groups/umcg-biogen/tmp03/output/2019-11-06-FreezeTwoDotOne/2020-03-12-deconvolution/custom_interaction_analyser.py -n {} -s {}{} -ne {} -ns {}\n".format(self.name, self.settings, skip_rows, batch_size, self.n_samples),
+                 "python3 /groups/umcg-biogen/tmp03/output/2019-11-06-FreezeTwoDotOne/2020-03-12-deconvolution/custom_interaction_analyser.py -n {} -s {}{} -ne {} -ns {} -c {}\n".format(self.name, self.settings, skip_rows, batch_size, self.n_samples, self.cores),
                  "\n",
                  "deactivate\n"]
 
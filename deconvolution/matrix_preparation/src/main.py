@@ -1,7 +1,7 @@
 """
 File:         main.py
 Created:      2020/03/12
-Last Changed: 2020/06/05
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -23,14 +23,16 @@ root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
 # Standard imports.
 from __future__ import print_function
 from pathlib import Path
+import glob
 import os
 
 # Third party imports.
 
 # Local application imports.
 from general.utilities import prepare_output_dir
-from general.df_utilities import load_dataframe
 from general.local_settings import LocalSettings
+from general.step_scheduler import StepScheduler
+from general.artifact_registry import ArtifactRegistry
 from .steps.combine_gte_files import CombineGTEFiles
 from .steps.combine_eqtlprobes import CombineEQTLProbes
 from .steps.create_matrices import CreateMatrices
@@ -71,6 +73,14 @@ class Main:
         self.outdir = os.path.join(current_dir, name)
         prepare_output_dir(self.outdir)
 
+        # Keep the saved dataframes in memory for the next steps.
+        artifact_settings = self.settings.get_setting('artifacts')
+        if artifact_settings is None:
+            artifact_settings = {"memory_budget_gb": 4, "write_threads": 2}
+        self.artifacts = ArtifactRegistry(
+            memory_budget=int(artifact_settings["memory_budget_gb"] * 1024 ** 3),
+            threads=artifact_settings["write_threads"])
+
     @staticmethod
     def create_force_dict(force_steps):
         force_dict = {'combine_gte_files': False,
@@ -98,163 +108,265 @@ class Main:
 
     def start(self):
         """
-        The method that serves as the pipeline of the whole program.
+        The method that serves as the pipeline of the whole program. The
+        steps are run as a dependency graph, a step is only redone if it is
+        forced or if its settings, input files or the steps it depends on
+        changed. Saved dataframes are handed to the next steps in memory
+        while they are written to disk in the background.
         """
         print("Starting program.")
-        print("\n### STEP1 ###\n")
+        scheduler = StepScheduler(outdir=self.outdir,
+                                  wait_for_outputs=self.artifacts.wait)
+
         # Step 1. Combine GTE files.
+        gte_settings = self.settings.get_setting('combine_gte_files')
+        scheduler.add_step(
+            name='combine_gte_files',
+            function=self.combine_gte_files,
+            settings=gte_settings,
+            inpaths=glob.glob(os.path.join(gte_settings["input_directory"],
+                                           gte_settings["filename_regex"])),
+            force=self.force_dict['combine_gte_files'])
+
+        # Step2. Combine eQTL probes files.
+        eqtl_settings = self.settings.get_setting('combine_eqtlprobes')
+        scheduler.add_step(
+            name='combine_eqtlprobes',
+            function=self.combine_eqtlprobes,
+            settings=eqtl_settings,
+            arguments={"disease": self.disease},
+            inpaths=[os.path.join(eqtl_settings["input_directory"],
+                                  eqtl_settings["iteration_dirname"] + str(i),
+                                  eqtl_settings["in_filename"])
+                     for i in range(1, eqtl_settings["iterations"] + 1)] +
+                    self.get_setting_files(eqtl_settings),
+            force=self.force_dict['combine_eqtlprobes'])
+
+        # Step3 - 7.
+        for name, dependencies in [
+            ('create_matrices', ['combine_gte_files', 'combine_eqtlprobes']),
+            ('create_deconvolution_matrices', ['combine_gte_files',
+                                               'create_matrices']),
+            ('perform_celltype_factorization', ['create_deconvolution_matrices']),
+            ('perform_deconvolution', ['create_deconvolution_matrices',
+                                       'perform_celltype_factorization']),
+            ('create_cov_matrix', ['combine_gte_files',
+                                   'create_deconvolution_matrices',
+                                   'perform_celltype_factorization',
+                                   'perform_deconvolution'])]:
+            settings = self.settings.get_setting(name)
+            scheduler.add_step(name=name,
+                               function=getattr(self, name),
+                               dependencies=dependencies,
+                               settings=settings,
+                               inpaths=self.get_setting_files(settings),
+                               force=self.force_dict[name])
+
+        steps = scheduler.run()
+        cepf = steps['combine_eqtlprobes']
+        cm = steps['create_matrices']
+        ccm = steps['create_cov_matrix']
+
+        exit()
+
+        # Load the complete dataframes.
+        print("\n### LOADING SORTED DATAFRAMES ###\n")
+        print("Extracting eQTL dataframe.")
+        eqtl_df = cepf.get_eqtlprobes()
+
+        print("Loading genotype dataframe.")
+        geno_df = self.artifacts.load(cm.get_geno_outpath(),
+                                      header=0,
+                                      index_col=0)
+
+        print("Loading alleles dataframe.")
+        alleles_df = self.artifacts.load(cm.get_alleles_outpath(),
+                                         header=0,
+                                         index_col=0)
+
+        print("Loading expression dataframe.")
+        expr_df = self.artifacts.load(cm.get_expr_outpath(),
+                                      header=0,
+                                      index_col=0)
+
+        print("Extracting covariates dataframe.")
+        cov_df = ccm.get_covariates()
+
+        # Validate the matrices.
+        print("Validating matrices.")
+        self.validate(eqtl_df.copy(), geno_df, alleles_df, expr_df, cov_df)
+
+        # Step 8. Create the masked matrices.
+        print("\n### STEP8 ###\n")
+        cmm = MaskMatrices(
+            settings=self.settings.get_setting('mask_matrices'),
+            eqtl_inpath=cepf.get_outpath(),
+            geno_inpath=cm.get_geno_outpath(),
+            alleles_inpath=cm.get_alleles_outpath(),
+            expr_inpath=cm.get_expr_outpath(),
+            cov_inpath=ccm.get_outpath(),
+            force=self.force_dict['mask_matrices'],
+            outdir=self.outdir)
+        cmm.start()
+        del cmm
+
+        # # Step 9. Create the group matrices.
+        # print("\n### STEP9 ###\n")
+        # cg = CreateGroups(
+        #     settings=self.settings.get_setting('create_groups'),
+        #     geno_df=geno_df.copy(),
+        #     expr_df=expr_df.copy(),
+        #     master_paths={"eqtl": cepf.get_outpath(),
+        #                   "genotype": cm.get_geno_outpath(),
+        #                   "alleles": cm.get_alleles_outpath(),
+        #                   "expression": cm.get_expr_outpath(),
+        #                   "covariates": ccm.get_outpath()},
+        #     groups_file=None,
+        #     force=self.force_dict['create_groups'],
+        #     outdir=self.outdir)
+        # cg.start()
+        # del cg
+
+        # Step 10. Create the regression matrices.
+        print("\n### STEP10 ###\n")
+        crm = CreateRegressionMatrix(
+            settings=self.settings.get_setting('create_regression_matrix'),
+            eqtl_df=eqtl_df.copy(),
+            geno_df=geno_df.copy(),
+            alleles_df=alleles_df.copy(),
+            expr_df=expr_df.copy(),
+            force=self.force_dict['create_regression_matrix'],
+            outdir=self.outdir)
+        crm.start()
+        del crm
+
+        self.artifacts.close()
+
+    @staticmethod
+    def get_setting_files(settings):
+        """
+        Method for getting the existing files in (nested) settings.
+
+        :param settings: dict / list / str, the settings.
+        :return : list, the file paths.
+        """
+        if isinstance(settings, dict):
+            settings = list(settings.values())
+        if isinstance(settings, list):
+            files = []
+            for value in settings:
+                files.extend(Main.get_setting_files(value))
+            return files
+        if isinstance(settings, str) and os.path.isfile(settings):
+            return [settings]
+        return []
+
+    def combine_gte_files(self, force, steps):
+        print("\n### STEP1 ###\n")
         cgtef = CombineGTEFiles(
             settings=self.settings.get_setting('combine_gte_files'),
-            force=self.force_dict['combine_gte_files'],
-            outdir=self.outdir)
+            force=force,
+            outdir=self.outdir,
+            artifacts=self.artifacts)
         cgtef.start()
         cgtef.clear_variables()
+        return cgtef
 
-        # Step2. Combine eQTL probes files.
+    def combine_eqtlprobes(self, force, steps):
         print("\n### STEP2 ###\n")
         cepf = CombineEQTLProbes(
             settings=self.settings.get_setting('combine_eqtlprobes'),
             disease=self.disease,
-            force=self.force_dict['combine_eqtlprobes'],
-            outdir=self.outdir)
+            force=force,
+            outdir=self.outdir,
+            artifacts=self.artifacts)
         cepf.start()
         cepf.clear_variables()
+        return cepf
 
-        # Step3. Create the ordered unmasked matrices.
+    def create_matrices(self, force, steps):
+        # Create the ordered unmasked matrices.
         print("\n### STEP3 ###\n")
+        cgtef = steps['combine_gte_files']
         cm = CreateMatrices(
             settings=self.settings.get_setting('create_matrices'),
             gte_df=cgtef.get_gte(),
             sample_dict=cgtef.get_sample_dict(),
             sample_order=cgtef.get_sample_order(),
-            eqtl_df=cepf.get_eqtlprobes(),
-            force=self.force_dict['create_matrices'],
-            outdir=self.outdir)
+            eqtl_df=steps['combine_eqtlprobes'].get_eqtlprobes(),
+            force=force,
+            outdir=self.outdir,
+            artifacts=self.artifacts)
         cm.start()
         cm.clear_variables()
+        return cm
 
-        # Step4. Create the deconvolution matrices.
+    def create_deconvolution_matrices(self, force, steps):
         print("\n### STEP4 ###\n")
+        cgtef = steps['combine_gte_files']
+        cm = steps['create_matrices']
         cdm = CreateDeconvolutionMatrices(
             settings=self.settings.get_setting('create_deconvolution_matrices'),
             expr_file=cm.get_expr_file(),
             expr_df=cm.get_complete_expr_matrix(),
             sample_dict=cgtef.get_sample_dict(),
             sample_order=cgtef.get_sample_order(),
-            force=self.force_dict['create_deconvolution_matrices'],
-            outdir=self.outdir)
+            force=force,
+            outdir=self.outdir,
+            artifacts=self.artifacts)
         cdm.start()
         cdm.clear_variables()
+        return cdm
 
-        # Step5. Create the celltype PCA file.
+    def perform_celltype_factorization(self, force, steps):
+        # Create the celltype PCA file.
         print("\n### STEP5 ###\n")
+        cdm = steps['create_deconvolution_matrices']
         pcf = PerformCelltypeFactorization(
             settings=self.settings.get_setting('perform_celltype_factorization'),
             profile_file=cdm.get_celltype_profile_file(),
             profile_df=cdm.get_celltype_profile(),
             ct_expr_file=cdm.get_ct_profile_expr_outpath(),
-            force=self.force_dict['perform_celltype_factorization'],
-            outdir=self.outdir)
+            force=force,
+            outdir=self.outdir,
+            artifacts=self.artifacts)
         pcf.start()
         pcf.clear_variables()
+        return pcf
 
-        # Step6. Create the covariance matrix.
+    def perform_deconvolution(self, force, steps):
         print("\n### STEP6 ###\n")
+        cdm = steps['create_deconvolution_matrices']
         pd = PerformDeconvolution(
             settings=self.settings.get_setting('perform_deconvolution'),
             profile_file=cdm.get_celltype_profile_file(),
             profile_df=cdm.get_celltype_profile(),
             ct_expr_file=cdm.get_ct_profile_expr_outpath(),
-            ct_expr_df=pcf.get_celltype_expression(),
-            force=self.force_dict['perform_deconvolution'],
-            outdir=self.outdir)
+            ct_expr_df=steps['perform_celltype_factorization'].get_celltype_expression(),
+            force=force,
+            outdir=self.outdir,
+            artifacts=self.artifacts)
         pd.start()
         pd.clear_variables()
+        return pd
 
-        # Step7. Create the covariance matrix.
+    def create_cov_matrix(self, force, steps):
+        # Create the covariance matrix.
         print("\n### STEP7 ###\n")
+        pcf = steps['perform_celltype_factorization']
         ccm = CreateCovMatrix(
             settings=self.settings.get_setting('create_cov_matrix'),
-            marker_file=cdm.get_markers_outpath(),
+            marker_file=steps['create_deconvolution_matrices'].get_markers_outpath(),
             celltype_pcs=pcf.get_celltype_pcs(),
             celltype_cs=pcf.get_celltype_cs(),
-            deconvolution=pd.get_deconvolution(),
-            sample_order=cgtef.get_sample_order(),
-            force=self.force_dict['create_cov_matrix'],
-            outdir=self.outdir)
+            deconvolution=steps['perform_deconvolution'].get_deconvolution(),
+            sample_order=steps['combine_gte_files'].get_sample_order(),
+            force=force,
+            outdir=self.outdir,
+            artifacts=self.artifacts)
         ccm.start()
         ccm.clear_variables()
-
-        exit()
-
-        # Load the complete dataframes.
-        print("\n### LOADING SORTED DATAFRAMES ###\n")
-        print("Extracting eQTL dataframe.")
-        eqtl_df = cepf.get_eqtlprobes()
-
-        print("Loading genotype dataframe.")
-        geno_df = load_dataframe(cm.get_geno_outpath(),
-                                 header=0,
-                                 index_col=0)
-
-        print("Loading alleles dataframe.")
-        alleles_df = load_dataframe(cm.get_alleles_outpath(),
-                                    header=0,
-                                    index_col=0)
-
-        print("Loading expression dataframe.")
-        expr_df = load_dataframe(cm.get_expr_outpath(),
-                                 header=0,
-                                 index_col=0)
-
-        print("Extracting covariates dataframe.")
-        cov_df = ccm.get_covariates()
-
-        # Validate the matrices.
-        print("Validating matrices.")
-        self.validate(eqtl_df.copy(), geno_df, alleles_df, expr_df, cov_df)
-
-        # Step 8. Create the masked matrices.
-        print("\n### STEP8 ###\n")
-        cmm = MaskMatrices(
-            settings=self.settings.get_setting('mask_matrices'),
-            eqtl_df=eqtl_df.copy(),
-            geno_df=geno_df.copy(),
-            alleles_df=alleles_df.copy(),
-            expr_df=expr_df.copy(),
-            cov_df=cov_df.copy(),
-            force=self.force_dict['mask_matrices'],
-            outdir=self.outdir)
-        cmm.start()
-        del cmm
-
-        # # Step 9. Create the group matrices.
-        # print("\n### STEP9 ###\n")
-        # cg = CreateGroups(
-        #     settings=self.settings.get_setting('create_groups'),
-        #     eqtl_df=eqtl_df.copy(),
-        #     geno_df=geno_df.copy(),
-        #     alleles_df=alleles_df.copy(),
-        #     expr_df=expr_df.copy(),
-        #     cov_df=cov_df.copy(),
-        #     groups_file=cm.get_group_outpath(),
-        #     force=self.force_dict['create_groups'],
-        #     outdir=self.outdir)
-        # cg.start()
-        # del cg
-
-        # Step 10. Create the regression matrices.
-        print("\n### STEP10 ###\n")
-        crm = CreateRegressionMatrix(
-            settings=self.settings.get_setting('create_regression_matrix'),
-            eqtl_df=eqtl_df.copy(),
-            geno_df=geno_df.copy(),
-            alleles_df=alleles_df.copy(),
-            expr_df=expr_df.copy(),
-            force=self.force_dict['create_regression_matrix'],
-            outdir=self.outdir)
-        crm.start()
-        del crm
+        return ccm
 
     @staticmethod
     def validate(eqtl_df, geno_df, alleles_df, expr_df, cov_df):
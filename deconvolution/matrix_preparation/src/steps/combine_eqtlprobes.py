@@ -1,7 +1,7 @@
 """
 File:         combine_eqtlprobes.py
 Created:      2020/03/12
-Last Changed: 2020/06/03
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -20,25 +20,30 @@ root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
 """
 
 # Standard imports.
+import pickle
 import os
 
 # Third party imports.
+import numpy as np
 import pandas as pd
 
 # Local application imports.
 from general.utilities import prepare_output_dir, check_file_exists
-from general.df_utilities import load_dataframe, save_dataframe
+from general.df_utilities import load_dataframe
 
 
 class CombineEQTLProbes:
-    def __init__(self, settings, disease, force, outdir):
+    def __init__(self, settings, disease, force, outdir, artifacts):
         """
         The initializer for the class.
 
         :param settings: string, the settings.
-        :param disease: string, the name of the disease to analyse.
+        :param disease: string, the name(s) of the disease(s) to analyse,
+                        separated by commas.
         :param force: boolean, whether or not to force the step to redo.
         :param outdir: string, the output directory.
+        :param artifacts: ArtifactRegistry, the registry of the saved
+                          dataframes.
         """
         self.indir = settings["input_directory"]
         self.iter_dirname = settings["iteration_dirname"]
@@ -46,8 +51,10 @@ class CombineEQTLProbes:
         self.in_filename = settings["in_filename"]
         self.snp_to_gwasid_filename = settings["snp_to_gwasid_filename"]
         self.gwasid_to_trait_filename = settings["gwasid_to_trait_filename"]
+        self.cache_trait_index = settings["cache_trait_index"]
         self.disease = disease
         self.force = force
+        self.artifacts = artifacts
 
         # Prepare an output directory.
         self.outdir = os.path.join(outdir, 'combine_eqtlprobes')
@@ -64,8 +71,8 @@ class CombineEQTLProbes:
         # Check if output file exist.
         if check_file_exists(self.outpath) and not self.force:
             print("Skipping step, loading result.")
-            self.eqtl_probes = load_dataframe(inpath=self.outpath, header=0,
-                                              index_col=False)
+            self.eqtl_probes = self.artifacts.load(inpath=self.outpath,
+                                                   header=0, index_col=False)
         else:
             # Load each GTE file.
             print("Loading eQTLprobes files.")
@@ -94,49 +101,122 @@ class CombineEQTLProbes:
         return combined
 
     def filter_on_trait(self, df):
-        tmp1 = load_dataframe(inpath=self.gwasid_to_trait_filename, header=0,
-                              index_col=False)
-        gwas_to_trait = pd.Series(tmp1["Trait"].values, index=tmp1["ID"]).to_dict()
-        del tmp1
-
-        gwas_map = {}
-        disease_map = {}
-        tmp2 = load_dataframe(inpath=self.snp_to_gwasid_filename, header=0,
-                              index_col=False, low_memory=False)
-
-        for index, row in tmp2.iterrows():
-            rs = row["RsID"]
-            id = row["ID"]
-
-            gwasses = gwas_map.get(rs)
-            if gwasses is None:
-                gwasses = id
-            else:
-                gwasses = "{}, {}".format(gwasses, id)
-            gwas_map[rs] = gwasses
-
-            diseases = disease_map.get(rs)
-            if id in gwas_to_trait.keys():
-                trait = gwas_to_trait.get(id)
-                if diseases is None:
-                    diseases = trait
-                else:
-                    diseases = "{}, {}".format(diseases, trait)
-            disease_map[rs] = diseases
+        """
+        Method for annotating the eQTLs with the GWAS IDs and traits of
+        their SNP and keeping the eQTLs with a trait that contains any of
+        the diseases (case-insensitive).
 
-        df["GWASIDS"] = df["SNPName"].map(gwas_map, na_action="")
-        df["Trait"] = df["SNPName"].map(disease_map, na_action="")
+        :param df: DataFrame, the combined eQTL probes.
+        :return df: DataFrame, the filtered eQTL probes.
+        """
+        trait_index = self.get_trait_index(df["SNPName"].unique())
+        df["GWASIDS"] = df["SNPName"].map(trait_index["GWASIDS"])
+        df["Trait"] = df["SNPName"].map(trait_index["Trait"])
 
         # Subset.
         df.dropna(subset=['Trait'], inplace=True)
-        df = df[df['Trait'].str.contains(self.disease, case=False)]
+        mask = np.zeros(df.shape[0], dtype=bool)
+        for disease in self.get_diseases():
+            disease_mask = df['Trait'].str.contains(disease, case=False,
+                                                    regex=False).to_numpy()
+            print("\t{}: {} eQTLs".format(disease, np.sum(disease_mask)))
+            mask |= disease_mask
+        df = df.loc[mask, :]
         df.reset_index(drop=True, inplace=True)
 
         return df
 
+    def get_diseases(self):
+        if self.disease is None:
+            return []
+        return [x.strip() for x in self.disease.split(",") if x.strip() != ""]
+
+    def get_trait_index(self, snps):
+        """
+        Method for getting the GWAS IDs and traits per SNP. If caching is
+        enabled the index of all SNPs in the catalog is built once and
+        saved next to the SNP to GWAS ID file, it is rebuilt once one of
+        the two input files changes.
+
+        :param snps: ndarray, the SNPs that are needed.
+        :return : DataFrame, the comma-separated GWAS IDs and traits by SNP.
+        """
+        if not self.cache_trait_index:
+            return self.create_trait_index(snps)
+
+        index_path = os.path.join(
+            os.path.dirname(os.path.abspath(self.snp_to_gwasid_filename)),
+            "." + os.path.basename(self.snp_to_gwasid_filename) +
+            ".traitidx.pkl")
+        key = {"version": 1}
+        for name, path in [("snp_to_gwasid", self.snp_to_gwasid_filename),
+                           ("gwasid_to_trait", self.gwasid_to_trait_filename)]:
+            stat = os.stat(path)
+            key[name] = [os.path.abspath(path), stat.st_size,
+                         stat.st_mtime_ns]
+
+        if os.path.isfile(index_path):
+            try:
+                with open(index_path, "rb") as f:
+                    saved_key, trait_index = pickle.load(f)
+                f.close()
+                if saved_key == key:
+                    print("\tLoaded trait index: {}".format(
+                        os.path.basename(index_path)))
+                    return trait_index
+            except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+                pass
+
+        trait_index = self.create_trait_index()
+        try:
+            tmp_path = "{}.{}.tmp".format(index_path, os.getpid())
+            with open(tmp_path, "wb") as f:
+                pickle.dump((key, trait_index), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            f.close()
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            print("\tUnable to save trait index: {}".format(e))
+
+        return trait_index
+
+    def create_trait_index(self, snps=None):
+        """
+        Method for joining the SNP to GWAS ID catalog with the GWAS ID to
+        trait file and combining the GWAS IDs and traits per SNP, in
+        catalog order.
+
+        :param snps: ndarray, the SNPs to restrict the catalog to, default
+                     is all SNPs.
+        :return : DataFrame, the comma-separated GWAS IDs and traits by SNP.
+        """
+        trait_df = load_dataframe(inpath=self.gwasid_to_trait_filename,
+                                  header=0, index_col=False)
+        gwas_to_trait = pd.Series(trait_df["Trait"].values,
+                                  index=trait_df["ID"])
+        gwas_to_trait = gwas_to_trait[~gwas_to_trait.index.duplicated(keep="last")]
+        del trait_df
+
+        catalog_df = load_dataframe(inpath=self.snp_to_gwasid_filename,
+                                    header=0, index_col=False,
+                                    low_memory=False)
+        catalog_df = catalog_df.loc[:, ["RsID", "ID"]]
+        if snps is not None:
+            catalog_df = catalog_df.loc[catalog_df["RsID"].isin(snps), :]
+        catalog_df["Trait"] = catalog_df["ID"].map(gwas_to_trait)
+        catalog_df["ID"] = catalog_df["ID"].astype(str)
+
+        gwas_ids = catalog_df.groupby("RsID", sort=False)["ID"].agg(", ".join)
+        trait_df = catalog_df.dropna(subset=["Trait"])
+        traits = trait_df["Trait"].astype(str).groupby(
+            trait_df["RsID"], sort=False).agg(", ".join)
+
+        return pd.DataFrame({"GWASIDS": gwas_ids,
+                             "Trait": traits.reindex(gwas_ids.index)})
+
     def save(self):
-        save_dataframe(df=self.eqtl_probes, outpath=self.outpath,
-                       index=False, header=True)
+        self.artifacts.save(df=self.eqtl_probes, outpath=self.outpath,
+                            index=False, header=True)
 
     def clear_variables(self):
         self.indir = None
@@ -157,6 +237,8 @@ class CombineEQTLProbes:
         print("  > Iteration directory: {}".format(self.iter_dirname))
         print("  > N. Iterations: {}".format(self.n_iterations))
         print("  > Input filename: {}".format(self.in_filename))
+        print("  > Disease(s): {}".format(self.get_diseases()))
+        print("  > Cache trait index: {}".format(self.cache_trait_index))
         print("  > Output path: {}".format(self.outpath))
         print("  > Force: {}".format(self.force))
         print("")
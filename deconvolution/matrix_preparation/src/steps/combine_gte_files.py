@@ -1,7 +1,7 @@
 """
 File:         combine_gte_files.py
 Created:      2020/03/12
-Last Changed: 2020/03/19
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -28,21 +28,24 @@ import pandas as pd
 
 # Local application imports.
 from general.utilities import prepare_output_dir, check_file_exists
-from general.df_utilities import load_dataframe, save_dataframe
+from general.df_utilities import load_dataframe
 
 
 class CombineGTEFiles:
-    def __init__(self, settings, force, outdir):
+    def __init__(self, settings, force, outdir, artifacts):
         """
         The initializer for the class.
 
         :param settings: string, the settings.
         :param force: boolean, whether or not to force the step to redo.
         :param outdir: string, the output directory.
+        :param artifacts: ArtifactRegistry, the registry of the saved
+                          dataframes.
         """
         self.inpath = os.path.join(settings["input_directory"],
                                    settings["filename_regex"])
         self.force = force
+        self.artifacts = artifacts
 
         # Prepare an output directory.
         self.outdir = os.path.join(outdir, 'combine_gte_files')
@@ -61,8 +64,8 @@ class CombineGTEFiles:
         # Check if output file exist.
         if check_file_exists(self.outpath) and not self.force:
             print("Skipping step, loading result.")
-            self.gte = load_dataframe(inpath=self.outpath, header=None,
-                                      index_col=None)
+            self.gte = self.artifacts.load(inpath=self.outpath, header=None,
+                                           index_col=None)
         else:
             # Load each GTE file.
             self.gte = self.combine_files()
@@ -87,8 +90,8 @@ class CombineGTEFiles:
         return combined
 
     def save(self):
-        save_dataframe(df=self.gte, outpath=self.outpath,
-                       index=False, header=False)
+        self.artifacts.save(df=self.gte, outpath=self.outpath,
+                            index=False, header=False)
 
     def clear_variables(self):
         self.inpath = None
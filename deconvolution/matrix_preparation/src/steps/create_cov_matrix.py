@@ -1,7 +1,7 @@
 """
 File:         create_cov_matrices.py
 Created:      2020/03/12
-Last Changed: 2020/06/03
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -29,12 +29,12 @@ import pandas as pd
 
 # Local application imports.
 from general.utilities import prepare_output_dir, check_file_exists
-from general.df_utilities import load_dataframe, save_dataframe
+from general.df_utilities import load_dataframe
 
 
 class CreateCovMatrix:
     def __init__(self, settings, marker_file, celltype_pcs, celltype_cs,
-                 deconvolution, sample_order, force, outdir):
+                 deconvolution, sample_order, force, outdir, artifacts):
         """
         The initializer for the class.
 
@@ -49,6 +49,8 @@ class CreateCovMatrix:
         :param sample_order: list, order of samples.
         :param force: boolean, whether or not to force the step to redo.
         :param outdir: string, the output directory.
+        :param artifacts: ArtifactRegistry, the registry of the saved
+                          dataframes.
         """
         self.cov_file = settings["covariate_datafile"]
         self.tech_covs = settings["technical_covariates"]
@@ -64,6 +66,7 @@ class CreateCovMatrix:
         self.celltype_cs = celltype_cs
         self.deconvolution = deconvolution
         self.force = force
+        self.artifacts = artifacts
 
         # Prepare an output directories.
         self.outdir = os.path.join(outdir, 'create_cov_matrix')
@@ -81,8 +84,8 @@ class CreateCovMatrix:
         # Check if output file exist.
         if check_file_exists(self.outpath) and not self.force:
             print("Skipping step, loading result.")
-            self.covariates = load_dataframe(inpath=self.outpath, header=0,
-                                             index_col=0)
+            self.covariates = self.artifacts.load(inpath=self.outpath,
+                                                  header=0, index_col=0)
         else:
             self.covariates = self.combine_files()
             self.save()
@@ -133,7 +136,8 @@ class CreateCovMatrix:
 
         # read the marker genes expression file.
         print("Loading marker genes matrix.")
-        marker_df = load_dataframe(self.marker_file, header=0, index_col=0)
+        marker_df = self.artifacts.load(self.marker_file, header=0,
+                                        index_col=0)
         marker_df.sort_index(inplace=True)
         marker_df.drop_duplicates(inplace=True)
         marker_df = marker_df.T
@@ -153,8 +157,8 @@ class CreateCovMatrix:
         return comb_cov
 
     def save(self):
-        save_dataframe(df=self.covariates, outpath=self.outpath,
-                       index=True, header=True)
+        self.artifacts.save(df=self.covariates, outpath=self.outpath,
+                            index=True, header=True)
 
     def clear_variables(self):
         self.cov_file = None
@@ -1,7 +1,7 @@
 """
 File:         create_deconvolution_matrices.py
 Created:      2020/04/07
-Last Changed: 2020/04/14
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -20,7 +20,6 @@ root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
 """
 
 # Standard imports.
-import gzip
 import os
 
 # Third party imports.
@@ -32,7 +31,7 @@ from general.df_utilities import load_dataframe
 
 class CreateDeconvolutionMatrices:
     def __init__(self, settings, expr_file, expr_df, sample_dict, sample_order,
-                 force, outdir):
+                 force, outdir, artifacts):
         """
         The initializer for the class.
 
@@ -44,6 +43,8 @@ class CreateDeconvolutionMatrices:
         :param sample_order: list, order of samples.
         :param force: boolean, whether or not to force the step to redo.
         :param outdir: string, the output directory.
+        :param artifacts: ArtifactRegistry, the registry of the saved
+                          dataframes.
         """
         self.celltype_profile_file = settings["celltype_profile_datafile"]
         self.translate_file = settings["translate_datafile"]
@@ -54,6 +55,7 @@ class CreateDeconvolutionMatrices:
         self.sample_dict = sample_dict
         self.sample_order = sample_order
         self.force = force
+        self.artifacts = artifacts
 
         # Prepare an output directories.
         self.outdir = os.path.join(outdir, 'create_deconvolution_matrices')
@@ -101,6 +103,11 @@ class CreateDeconvolutionMatrices:
         self.expr_df = None
         del trans_df
 
+        # Select the genes with exactly one expression profile.
+        n_profiles = complete_expr_df.index.value_counts()
+        unique_expr_df = complete_expr_df.loc[
+            complete_expr_df.index.isin(n_profiles.index[n_profiles == 1]), :]
+
         # Create the marker gene file.
         if not check_file_exists(self.markers_outpath) or self.force:
             if os.path.isfile(self.markers_outpath):
@@ -108,22 +115,24 @@ class CreateDeconvolutionMatrices:
                 os.remove(self.markers_outpath)
 
             print("Creating marker gene expression table.")
-            marker_str_buffer = ["-" + "\t" + "\t".join(self.sample_order) + "\n"]
-            for celltype, marker_genes in self.marker_dict.items():
-                for marker_gene in marker_genes:
-                    if marker_gene in complete_expr_df.index:
-                        expression = complete_expr_df.loc[[marker_gene], :]
-                        if (len(expression.index)) != 1:
+            marker_genes = []
+            marker_index = []
+            for celltype, celltype_marker_genes in self.marker_dict.items():
+                for marker_gene in celltype_marker_genes:
+                    if marker_gene in n_profiles.index:
+                        if n_profiles[marker_gene] != 1:
                             print("\tMarker gene: {} gives 0 or >1 expression "
                                   "profiles.".format(marker_gene))
                             continue
 
-                        marker_str = self.marker_genes_suffix + "_" + \
-                                     celltype + "_" + marker_gene + "\t" + \
-                                     "\t".join(expression.iloc[0, :].astype(str).values) \
-                                     + "\n"
-                        marker_str_buffer.append(marker_str)
-            self.write_buffer(self.markers_outpath, marker_str_buffer)
+                        marker_genes.append(marker_gene)
+                        marker_index.append(self.marker_genes_suffix + "_" +
+                                            celltype + "_" + marker_gene)
+            marker_df = unique_expr_df.loc[marker_genes, :]
+            marker_df.index = marker_index
+            marker_df.index.name = "-"
+            self.artifacts.save(df=marker_df, outpath=self.markers_outpath,
+                                header=True, index=True, na_rep="nan")
 
         # Create the marker gene file.
         if not check_file_exists(self.ct_profile_expr_outpath) or self.force:
@@ -138,37 +147,19 @@ class CreateDeconvolutionMatrices:
 
             # Create the celltype profile file.
             print("Creating cell type profile expression table.")
-            profile_str_buffer = ["-" + "\t" + "\t".join(self.sample_order) + "\n"]
+            profile_genes = []
             for marker_gene in self.celltype_profile.index:
-                if marker_gene in complete_expr_df.index:
-                    expression = complete_expr_df.loc[[marker_gene], :]
-                    if (len(expression.index)) != 1:
+                if marker_gene in n_profiles.index:
+                    if n_profiles[marker_gene] != 1:
                         print("\tMarker gene: {} gives 0 or >1 expression "
                               "profiles.".format(marker_gene))
                         continue
 
-                    profile_str = marker_gene + "\t" + "\t".join(expression.iloc[0, :].astype(str).values) + "\n"
-                    profile_str_buffer.append(profile_str)
-            self.write_buffer(self.ct_profile_expr_outpath, profile_str_buffer)
-
-    @staticmethod
-    def write_buffer(filename, buffer):
-        """
-        Method for writing a list of strings to a gzipped file,
-
-        :param filename: string, the output file path.
-        :param buffer: list, the lines of strings to write.
-        """
-        # Write output files.
-        if os.path.isfile(filename):
-            mode = 'ab'
-        else:
-            mode = 'wb'
-
-        with gzip.open(filename, mode) as f:
-            for line in buffer:
-                f.write(line.encode())
-        f.close()
+                    profile_genes.append(marker_gene)
+            profile_df = unique_expr_df.loc[profile_genes, :]
+            self.artifacts.save(df=profile_df,
+                                outpath=self.ct_profile_expr_outpath,
+                                header=True, index=True, na_rep="nan")
 
     def clear_variables(self):
         self.translate_file = None
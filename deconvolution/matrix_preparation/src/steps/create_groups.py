@@ -1,7 +1,7 @@
 """
 File:         create_groups.py
 Created:      2020/03/12
-Last Changed: 2020/03/20
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -27,35 +27,39 @@ import os
 
 # Local application imports.
 from general.utilities import prepare_output_dir, check_file_exists, get_basename
-from general.df_utilities import save_dataframe
+from general.grouping import create_groups
+from general.group_view import GroupView
 
 
 class CreateGroups:
-    def __init__(self, settings, eqtl_df, geno_df, alleles_df, expr_df, cov_df,
-                 groups_file, force, outdir):
+    def __init__(self, settings, geno_df, expr_df, master_paths, groups_file,
+                 force, outdir):
         """
         The initializer for the class.
 
         :param settings: string, the settings.
-        :param eqtl_df: DataFrame, the eQTL probes data.
         :param geno_df: DataFrame, the genotype data.
-        :param alleles_df: DataFrame, the alleles data.
         :param expr_df: DataFrame, the expression data.
-        :param cov_df: DataFrame, the covariate data.
-        :param groups_file: string, path to the groups file.
+        :param master_paths: dict, the files of the complete eqtl, genotype,
+                             alleles, expression and covariates tables.
+        :param groups_file: string, path to the groups file, if None the
+                            groups are created from the genotype and
+                            expression matrix.
         :param force: boolean, whether or not to force the step to redo.
         :param outdir: string, the output directory.
         """
-        self.eqtl_df = eqtl_df
         self.geno_df = geno_df
-        self.alleles_df = alleles_df
         self.expr_df = expr_df
-        self.cov_df = cov_df
+        self.master_paths = master_paths
         self.force = force
 
-        # Load the groups.
-        with open(groups_file, "rb") as f:
-            groups_data = pickle.load(f)
+        # Load or create the groups.
+        if groups_file is None:
+            print("Grouping eQTLs on missing samples.")
+            groups_data = create_groups(geno_df, expr_df)
+        else:
+            with open(groups_file, "rb") as f:
+                groups_data = pickle.load(f)
 
         # Remove uninteresting groups.
         self.groups = self.filter_groups(groups_data,
@@ -93,6 +97,19 @@ class CreateGroups:
 
     def start(self):
         print("Creating groups.")
+        # The tables of a group are the rows (SNPs) and / or columns
+        # (samples) of the complete tables.
+        tables = {"eqtl_table.txt.gz": (self.master_paths["eqtl"],
+                                        ["rows"]),
+                  "genotype_table.txt.gz": (self.master_paths["genotype"],
+                                            ["rows", "columns"]),
+                  "genotype_alleles.txt.gz": (self.master_paths["alleles"],
+                                              ["rows"]),
+                  "expression_table.txt.gz": (self.master_paths["expression"],
+                                              ["rows", "columns"]),
+                  "covariates_table.txt.gz": (self.master_paths["covariates"],
+                                              ["columns"])}
+
         for i, (group_id, group_obj) in enumerate(self.groups.items()):
             print("  Working on: {:10s} [{}/{} "
                   "{:.2f}%]".format(group_id, i + 1, len(self.groups),
@@ -105,16 +122,8 @@ class CreateGroups:
             # Define the output names.
             group_object = os.path.join(group_dir,
                                         "group.pkl")
-            eqtl_outpath = os.path.join(group_dir,
-                                        "eqtl_table.txt.gz")
-            geno_outpath = os.path.join(group_dir,
-                                        "genotype_table.txt.gz")
-            alleles_outpath = os.path.join(group_dir,
-                                           "genotype_alleles.txt.gz")
-            expr_outpath = os.path.join(group_dir,
-                                        "expression_table.txt.gz")
-            cov_outpath = os.path.join(group_dir,
-                                       "covariates_table.txt.gz")
+            manifest = os.path.join(group_dir,
+                                    GroupView.manifest_filename)
 
             # Check if output file exist, if not, create it.
             if not check_file_exists(group_object) or self.force:
@@ -123,47 +132,20 @@ class CreateGroups:
                 print("\tSaved group object: "
                       "{}".format(get_basename(group_object)))
 
-            # Get the group indices.
-            snp_mask = group_obj.get_snp_indices()
-            sample_mask = group_obj.get_sample_indices()
-
-            # Check if output file exist, if not, create it.
-            if not check_file_exists(eqtl_outpath) or self.force:
-                group_eqtl = self.eqtl_df.iloc[snp_mask, :].copy()
-                save_dataframe(outpath=eqtl_outpath, df=group_eqtl,
-                               index=False, header=True)
-                del group_eqtl
-
-            if not check_file_exists(geno_outpath) or self.force:
-                group_geno = self.geno_df.iloc[snp_mask, sample_mask].copy()
-                save_dataframe(outpath=geno_outpath, df=group_geno,
-                               index=True, header=True)
-                del group_geno
-
-            if not check_file_exists(alleles_outpath) or self.force:
-                group_alleles = self.alleles_df.iloc[snp_mask, :].copy()
-                save_dataframe(outpath=alleles_outpath, df=group_alleles,
-                               index=True, header=True)
-                del group_alleles
-
-            if not check_file_exists(expr_outpath) or self.force:
-                group_expr = self.expr_df.iloc[snp_mask, sample_mask].copy()
-                save_dataframe(outpath=expr_outpath, df=group_expr,
-                               index=True, header=True)
-                del group_expr
-
-            if not check_file_exists(cov_outpath) or self.force:
-                group_cov = self.cov_df.iloc[:, sample_mask].copy()
-                save_dataframe(outpath=cov_outpath, df=group_cov,
-                               index=True, header=True)
-                del group_cov
+            # Save the group indices instead of copies of the tables.
+            if not check_file_exists(manifest) or self.force:
+                GroupView.save(group_dir, tables,
+                               snp_indices=group_obj.get_snp_indices(),
+                               sample_indices=group_obj.get_sample_indices())
+                print("\tSaved group manifest: "
+                      "{}".format(get_basename(manifest)))
 
     def print_arguments(self):
         print("Arguments:")
         print("  > Genotype matrix shape: {}".format(self.geno_df.shape))
-        print("  > Alleles matrix shape: {}".format(self.alleles_df.shape))
         print("  > Expression matrix shape: {}".format(self.expr_df.shape))
-        print("  > Covariate matrix shape: {}".format(self.cov_df.shape))
+        for name, path in self.master_paths.items():
+            print("  > {} table: {}".format(name.capitalize(), path))
         print("  > Output directory: {}".format(self.outdir))
         print("  > Force: {}".format(self.force))
         print("")
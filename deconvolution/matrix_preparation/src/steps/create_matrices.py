@@ -1,7 +1,7 @@
 """
 File:         create_matrices.py
 Created:      2020/03/12
-Last Changed: 2020/06/02
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -20,22 +20,21 @@ root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
 """
 
 # Standard imports.
-import pickle
-import gzip
 import os
 
 # Third party imports.
+import numpy as np
+import pandas as pd
 
 # Local application imports.
 from general.utilities import prepare_output_dir, check_file_exists
 from general.df_utilities import load_dataframe
-from general.objects.eqtl import Eqtl
-from general.objects.group import Group
+from general.row_index import RowIndex
 
 
 class CreateMatrices:
     def __init__(self, settings, gte_df, sample_dict, sample_order, eqtl_df,
-                 force, outdir):
+                 force, outdir, artifacts):
         """
         The initializer for the class.
 
@@ -47,6 +46,8 @@ class CreateMatrices:
         :param eqtl_df: DataFrame, the combined eQTL probe files in a dataframe.
         :param force: boolean, whether or not to force the step to redo.
         :param outdir: string, the output directory.
+        :param artifacts: ArtifactRegistry, the registry of the saved
+                          dataframes.
         """
         self.geno_file = settings["genotype_datafile"]
         self.expr_file = settings["expression_datafile"]
@@ -55,6 +56,7 @@ class CreateMatrices:
         self.sample_order = sample_order
         self.eqtl_df = eqtl_df
         self.force = force
+        self.artifacts = artifacts
 
         # Prepare an output directories.
         self.outdir = os.path.join(outdir, 'create_matrices')
@@ -88,9 +90,17 @@ class CreateMatrices:
                 print("Removing file: {}.".format(outfile))
                 os.remove(outfile)
 
-        # Load the genotype matrix file.
+        # Select the genotype rows of the eQTL SNPs using the row index of
+        # the genotype file, only these rows are loaded.
         print("Loading genotype matrix.")
-        geno_df = load_dataframe(self.geno_file, header=0, index_col=0)
+        snp_names = self.eqtl_df["SNPName"]
+        geno_labels = RowIndex(self.geno_file).get_labels()
+        snp_counts = geno_labels.value_counts()
+        unique_snps = snp_counts.index[snp_counts == 1]
+        geno_rows = np.flatnonzero(geno_labels.isin(
+            unique_snps.intersection(snp_names.unique())))
+        geno_df = load_dataframe(self.geno_file, header=0, index_col=0,
+                                 rows=geno_rows)
         allele_df = geno_df.loc[:, ["Alleles", "MinorAllele"]].copy()
         geno_df = geno_df.rename(columns=self.sample_dict)
         geno_df = geno_df[self.sample_order]
@@ -101,134 +111,55 @@ class CreateMatrices:
         expr_df = expr_df.rename(columns=self.sample_dict)
         self.complete_expr_matrix = expr_df[self.sample_order]
 
-        # Construct the genotype / expression matrices.
+        # Check which eQTLs have exactly one genotype and one expression
+        # profile.
         print("Constructing matrices.")
-        geno_str_buffer = ["-" + "\t" + "\t".join(self.sample_order) + "\n"]
-        expr_str_buffer = ["-" + "\t" + "\t".join(self.sample_order) + "\n"]
-        allele_str_buffer = ["-" + "\t" + "\t".join(list(allele_df.columns)) + "\n"]
-
-        # saved_profile_genes = []
-        # groups = []
-        # new_group_id = 0
-        n_snps = self.eqtl_df.shape[0]
-        for i, row in self.eqtl_df.iterrows():
-            if (i % 250 == 0) or (i == (n_snps - 1)):
-                print("\tProcessing {}/{} "
-                      "[{:.2f}%]".format(i,
-                                         (n_snps - 1),
-                                         (100 / (n_snps - 1)) * i))
-
-                # Write output files.
-                self.write_buffer(self.geno_outpath, geno_str_buffer)
-                geno_str_buffer = []
-
-                self.write_buffer(self.expr_outpath, expr_str_buffer)
-                expr_str_buffer = []
-
-                self.write_buffer(self.alleles_outpath, allele_str_buffer)
-                allele_str_buffer = []
-
-            # Get the row info.
-            snp_name = row["SNPName"]
-            probe_name = row["ProbeName"]
-
-            # Used for development.
-            # snp_name = "10:100145864:rs4919426:T_C"
-            # probe_name = "ENSG00000000003.15"
-            # End used for development.
-
-            # Get the genotype.
-            genotype = geno_df.loc[[snp_name], :]
-            if (len(genotype.index)) != 1:
+        probe_names = self.eqtl_df["ProbeName"]
+        probe_counts = self.complete_expr_matrix.index.value_counts()
+        geno_mask = snp_names.map(snp_counts).fillna(0).to_numpy() == 1
+        expr_mask = geno_mask & \
+                    (probe_names.map(probe_counts).fillna(0).to_numpy() == 1)
+        for snp_name, probe_name, has_geno, has_expr in zip(snp_names,
+                                                            probe_names,
+                                                            geno_mask,
+                                                            expr_mask):
+            if not has_geno:
                 print("SNP: {} gives 0 or >1 "
                       "genotypes.".format(snp_name))
-                continue
-            geno_str = snp_name + "\t" + "\t".join(
-                genotype.iloc[0, :].astype(str).values) + "\n"
-            geno_str_buffer.append(geno_str)
-
-            # Get the alleles.
-            alleles = allele_df.loc[[snp_name], :]
-            if (len(alleles.index)) != 1:
-                print("SNP: {} gives 0 or >1 "
-                      "alleles.".format(snp_name))
-                continue
-            allele_str = "{}\t{}\t{}\n".format(snp_name,
-                                               alleles.iloc[0]["Alleles"],
-                                               alleles.iloc[0][
-                                                   "MinorAllele"])
-            allele_str_buffer.append(allele_str)
-
-            # Get the expression.
-            expression = self.complete_expr_matrix.loc[[probe_name], :]
-            if (len(expression.index)) != 1:
+            elif not has_expr:
                 print("Probe: {} gives 0 or >1 expression "
                       "profiles.".format(probe_name))
-                continue
-            expr_str = probe_name + "\t" + "\t".join(
-                expression.iloc[0, :].astype(str).values) + "\n"
-            expr_str_buffer.append(expr_str)
 
-            # # Create an eQTL object.
-            # new_eqtl = Eqtl(snp_name, i, genotype, expression)
-            #
-            # # Get the samples indices of the eQTl.
-            # samples = new_eqtl.get_samples()
-            # samples_indices = new_eqtl.get_sample_indices()
-            #
-            # # Assign the group.
-            # matches = False
-            # if groups:
-            #     # Check if there is a group with these samples.
-            #     for group in groups:
-            #         if group.matches(samples_indices):
-            #             group.add_eqtl(new_eqtl)
-            #             matches = True
-            #             break
-            #
-            # # Add a new group.
-            # if not matches:
-            #     new_group = Group(new_group_id, samples)
-            #     new_group.add_eqtl(new_eqtl)
-            #     groups.append(new_group)
-            #     new_group_id = new_group_id + 1
+        # Construct the genotype / expression matrices.
+        unique_expr_df = self.complete_expr_matrix.loc[
+            self.complete_expr_matrix.index.isin(
+                probe_counts.index[probe_counts == 1]), :]
+        geno_out_df = self.as_rows(geno_df.loc[snp_names[geno_mask], :])
+        allele_out_df = allele_df.loc[snp_names[geno_mask], :]
+        expr_out_df = self.as_rows(unique_expr_df.loc[probe_names[expr_mask], :])
 
         # Write output files.
-        if geno_str_buffer:
-            self.write_buffer(self.geno_outpath, geno_str_buffer)
-
-        if expr_str_buffer:
-            self.write_buffer(self.expr_outpath, expr_str_buffer)
-
-        if allele_str_buffer:
-            self.write_buffer(self.alleles_outpath, allele_str_buffer)
-
-        # # Pickle the groups.
-        # print("Writing group pickle file.")
-        # with open(self.group_outpath, "wb") as f:
-        #     pickle.dump(groups, f)
+        for df, outpath in [(geno_out_df, self.geno_outpath),
+                            (allele_out_df, self.alleles_outpath),
+                            (expr_out_df, self.expr_outpath)]:
+            self.artifacts.save(df=df, outpath=outpath, header=True,
+                                index=True, index_label="-", na_rep="nan")
 
         # Remove old dataframes.
-        del geno_df, expr_df
+        del geno_df, expr_df, geno_out_df, allele_out_df, expr_out_df
 
     @staticmethod
-    def write_buffer(filename, buffer):
+    def as_rows(df):
         """
-        Method for writing a list of strings to a gzipped file,
+        Method for giving all values of a dataframe the common type of its
+        columns, as they are when the rows are selected one by one.
 
-        :param filename: string, the output file path.
-        :param buffer: list, the lines of strings to write.
+        :param df: DataFrame, the pandas dataframe.
+        :return : DataFrame, the dataframe with one type.
         """
-        # Write output files.
-        if os.path.isfile(filename):
-            mode = 'ab'
-        else:
-            mode = 'wb'
-
-        with gzip.open(filename, mode) as f:
-            for line in buffer:
-                f.write(line.encode())
-        f.close()
+        if len(set(df.dtypes)) <= 1:
+            return df
+        return pd.DataFrame(df.to_numpy(), index=df.index, columns=df.columns)
 
     def clear_variables(self):
         self.geno_file = None
@@ -1,7 +1,7 @@
 """
 File:         create_reg_matrix.py
 Created:      2020/03/16
-Last Changed: 2020/03/19
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -20,15 +20,15 @@ root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
 """
 
 # Standard imports.
-import gzip
 import os
 
 # Third party imports.
 import numpy as np
-from scipy import stats
 
 # Local application imports.
 from general.utilities import prepare_output_dir, check_file_exists
+from general.df_utilities import save_dataframe
+from general.regression import create_regression_table
 
 
 class CreateRegressionMatrix:
@@ -70,113 +70,29 @@ class CreateRegressionMatrix:
             print("Removing file: {}.".format(self.outpath))
             os.remove(self.outpath)
 
-        # Prepare string buffer.
-        regr_str_buffer = [
-            "snp\tprobe\talleles\tminor_allele\tallele_assessed\tflipped\tslope"
-            "\tintercept\tcorr_coeff\tp_value\tstd_err\toveral_z_score"
-            "\tz_score_estimate\n"]
-
         # Correlating.
         print("Correlating:")
-        nrows = self.eqtl_df.shape[0]
-        for i, row in self.eqtl_df.iterrows():
-            if (i % 250 == 0) or (i == (nrows - 1)):
-                print("\t Processing {}/{} [{:.2f}%]".format(i, nrows,
-                                                             (100 / nrows) * i
-                                                             )
-                      )
-
-                # Write output files.
-                self.write_buffer(self.outpath, regr_str_buffer)
-                regr_str_buffer = []
-
-            # Extract the usefull information.
-            snp_name = row["SNPName"]
-            probe_name = row["ProbeName"]
-            overal_z_score = row["OverallZScore"]
-            allele_assessed = row["AlleleAssessed"]
-
-            # Get the data.
-            genotype = self.geno_df.iloc[i, :].T.to_frame()
-            if snp_name != genotype.columns[0]:
-                print("SNPName does not match in genotype subset.")
-                break
-            expression = self.expr_df.iloc[i, :].T.to_frame()
-            if snp_name != expression.columns[0]:
-                print("SNPName does not match in expression subset.")
-                break
-            data = genotype.merge(expression, left_index=True, right_index=True)
-            data.columns = ["genotype", "expression"]
-
-            # Remove missing values.
-            data.replace(-1, np.nan, inplace=True)
-            data.dropna(inplace=True)
-
-            # Determine the alleles.
-            (alleles, minor_allele) = self.alleles_df.iloc[i, :]
-
-            # Determine whether to flip or not.
-            flipped = False
-            if allele_assessed != alleles.split("/")[1]:
-                data['genotype'] = 2.0 - data['genotype']
-                flipped = True
-
-            # # Naive flip method.
-            # if allele_assessed != minor_allele:
-            #     data['genotype'] = 2.0 - data['genotype']
-
-            # Calculate the correlation.
-            slope, intercept, r_value, p_value, std_err = stats.linregress(
-                data["genotype"],
-                data["expression"])
-
-            # Calculate the z-score estimate.
-            z_score_estimate = slope / std_err
-
-            # # Naive flip method 2.0.
-            # if allele_assessed != alleles.split("/")[1]:
-            #     z_score_estimate = z_score_estimate * -1
-
-            # Add to the buffer.
-            regr_str = "{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\t{}\n" \
-                .format(snp_name,
-                        probe_name,
-                        alleles,
-                        minor_allele,
-                        allele_assessed,
-                        flipped,
-                        slope,
-                        intercept,
-                        r_value,
-                        p_value,
-                        std_err,
-                        overal_z_score,
-                        z_score_estimate
-                        )
-            regr_str_buffer.append(regr_str)
-
-        # Write output files.
-        if regr_str_buffer:
-            self.write_buffer(self.outpath, regr_str_buffer)
+        regr_df = create_regression_table(eqtl_df=self.eqtl_df,
+                                          geno_df=self.geno_df,
+                                          alleles_df=self.alleles_df,
+                                          expr_df=self.expr_df,
+                                          mask=self.get_mask)
+
+        # Write output file.
+        save_dataframe(df=regr_df, outpath=self.outpath, header=True,
+                       index=False, na_rep="nan")
 
     @staticmethod
-    def write_buffer(filename, buffer):
+    def get_mask(geno, expr):
         """
-        Method for writing a list of strings to a gzipped file,
+        Method for selecting the samples without missing values (-1, or NaN
+        if loaded with the 'genotype' dtype).
 
-        :param filename: string, the output file path.
-        :param buffer: list, the lines of strings to write.
+        :param geno: ndarray, the genotypes.
+        :param expr: ndarray, the expression.
+        :return : ndarray, boolean, the samples to use.
         """
-        # Write output files.
-        if os.path.isfile(filename):
-            mode = 'ab'
-        else:
-            mode = 'wb'
-
-        with gzip.open(filename, mode) as f:
-            for line in buffer:
-                f.write(line.encode())
-        f.close()
+        return (geno != -1) & ~np.isnan(geno) & (expr != -1) & ~np.isnan(expr)
 
     def print_arguments(self):
         print("Arguments:")
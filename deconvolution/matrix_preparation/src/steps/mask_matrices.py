@@ -1,7 +1,7 @@
 """
 File:         mask_matrices.py
 Created:      2020/03/12
-Last Changed: 2020/03/23
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -26,31 +26,42 @@ import os
 import pandas as pd
 
 # Local application imports.
-from general.utilities import prepare_output_dir, check_file_exists
+from general.utilities import prepare_output_dir, check_file_exists, \
+    get_basename
 from general.df_utilities import save_dataframe
+from general.row_index import RowIndex
+from general.bgzf_writer import BgzfWriter
 
 
 class MaskMatrices:
-    def __init__(self, settings, eqtl_df, geno_df, alleles_df, expr_df, cov_df,
-                 force, outdir):
+    """
+    MaskMatrices: class for replacing the eQTL, sample and covariate names
+        of the tables with masked labels (eqtl_N, sample_N and cov_N). The
+        tables are streamed: only the header line and the first field of
+        every line are rewritten, the values are copied through in blocks
+        without parsing them. Memory use is independent of the table size.
+    """
+    chunk_size = 4 * 1024 ** 2
+
+    def __init__(self, settings, eqtl_inpath, geno_inpath, alleles_inpath,
+                 expr_inpath, cov_inpath, force, outdir):
         """
         The initializer for the class.
 
         :param settings: string, the settings.
-        :param eqtl_df: DataFrame, the eQTL data.
-        :param geno_df: DataFrame, the genotype data.
-        :param alleles_df: DataFrame, the alleles data.
-        :param expr_df: DataFrame, the expression data.
-        :param cov_df: DataFrame, the covariate data.
-        :param marker_file: string, path to the marker file.
+        :param eqtl_inpath: string, the eQTL table (without index).
+        :param geno_inpath: string, the genotype table.
+        :param alleles_inpath: string, the alleles table.
+        :param expr_inpath: string, the expression table.
+        :param cov_inpath: string, the covariate table.
         :param force: boolean, whether or not to force the step to redo.
         :param outdir: string, the output directory.
         """
-        self.eqtl_df = eqtl_df
-        self.geno_df = geno_df
-        self.alleles_df = alleles_df
-        self.expr_df = expr_df
-        self.cov_df = cov_df
+        self.eqtl_inpath = eqtl_inpath
+        self.geno_inpath = geno_inpath
+        self.alleles_inpath = alleles_inpath
+        self.expr_inpath = expr_inpath
+        self.cov_inpath = cov_inpath
         self.force = force
 
         # Prepare an output directories.
@@ -61,9 +72,15 @@ class MaskMatrices:
         print("Starting creating masked files.")
         self.print_arguments()
 
+        # Get the labels from the row index and header of the tables.
+        eqtls = list(RowIndex(self.geno_inpath).get_labels())
+        samples = self.read_header(self.geno_inpath)[1:]
+        covs = list(RowIndex(self.cov_inpath).get_labels())
+
         # Get the sizes.
-        (n_eqtls, n_samples) = self.geno_df.shape
-        n_covs = self.cov_df.shape[0]
+        n_eqtls = len(eqtls)
+        n_samples = len(samples)
+        n_covs = len(covs)
 
         # Create masks.
         eqtl_mask = ["eqtl_" + str(x) for x in range(n_eqtls)]
@@ -75,7 +92,7 @@ class MaskMatrices:
         eqtl_translate_outpath = os.path.join(self.outdir,
                                               "eqtl_translate_table.txt.gz")
         if not check_file_exists(eqtl_translate_outpath) or self.force:
-            eqtl_translate = pd.DataFrame({'unmasked': list(self.geno_df.index),
+            eqtl_translate = pd.DataFrame({'unmasked': eqtls,
                                            'masked': eqtl_mask})
             save_dataframe(outpath=eqtl_translate_outpath,
                            df=eqtl_translate,
@@ -87,9 +104,8 @@ class MaskMatrices:
         sample_translate_outpath = os.path.join(self.outdir,
                                                 "sample_translate_table.txt.gz")
         if not check_file_exists(sample_translate_outpath) or self.force:
-            sample_translate = pd.DataFrame(
-                {'unmasked': list(self.geno_df.columns),
-                 'masked': sample_mask})
+            sample_translate = pd.DataFrame({'unmasked': samples,
+                                             'masked': sample_mask})
             save_dataframe(outpath=sample_translate_outpath,
                            df=sample_translate,
                            index=False, header=True)
@@ -100,7 +116,7 @@ class MaskMatrices:
         cov_translate_outpath = os.path.join(self.outdir,
                                              "cov_translate_table.txt.gz")
         if not check_file_exists(cov_translate_outpath) or self.force:
-            cov_translate = pd.DataFrame({'unmasked': list(self.cov_df.index),
+            cov_translate = pd.DataFrame({'unmasked': covs,
                                           'masked': cov_mask})
             save_dataframe(outpath=cov_translate_outpath, df=cov_translate,
                            index=False, header=True)
@@ -108,59 +124,120 @@ class MaskMatrices:
         else:
             print("\tSkipping covariates translate table.")
 
-        # Start masking the dataframes.
+        # Start masking the files.
         print("Start masking files.")
-        eqtl_outpath = os.path.join(self.outdir, "eqtl_table.txt.gz")
-        if not check_file_exists(eqtl_outpath) or self.force:
-            self.eqtl_df.index = eqtl_mask
-            save_dataframe(outpath=eqtl_outpath, df=self.eqtl_df,
-                           index=True, header=True)
-        else:
-            print("\tSkipping eQTL table.")
-
-        geno_outpath = os.path.join(self.outdir, "genotype_table.txt.gz")
-        if not check_file_exists(geno_outpath) or self.force:
-            self.geno_df.index = eqtl_mask
-            self.geno_df.columns = sample_mask
-            save_dataframe(outpath=geno_outpath, df=self.geno_df,
-                           index=True, header=True)
-        else:
-            print("\tSkipping genotype table.")
-
-        alleles_outpath = os.path.join(self.outdir,
-                                       "genotype_alleles.txt.gz")
-        if not check_file_exists(alleles_outpath) or self.force:
-            self.alleles_df.index = eqtl_mask
-            save_dataframe(outpath=alleles_outpath, df=self.alleles_df,
-                           index=True, header=True)
-        else:
-            print("\tSkipping genotype alleles tables.")
-
-        expr_outpath = os.path.join(self.outdir, "expression_table.txt.gz")
-        if not check_file_exists(expr_outpath) or self.force:
-            self.expr_df.index = eqtl_mask
-            self.expr_df.columns = sample_mask
-            save_dataframe(outpath=expr_outpath, df=self.expr_df,
-                           index=True, header=True)
-        else:
-            print("\tSkipping expression table.")
-
-        cov_outpath = os.path.join(self.outdir, "covariates_table.txt.gz")
-        if not check_file_exists(cov_outpath) or self.force:
-            self.cov_df.index = cov_mask
-            self.cov_df.columns = sample_mask
-            save_dataframe(outpath=cov_outpath, df=self.cov_df,
-                           index=True, header=True)
-        else:
-            print("\tSkipping covariates table.")
+        for inpath, filename, row_prefix, n_rows, column_prefix, has_index, \
+                name in [
+                    (self.eqtl_inpath, "eqtl_table.txt.gz", "eqtl_",
+                     n_eqtls, None, False, "eQTL table"),
+                    (self.geno_inpath, "genotype_table.txt.gz", "eqtl_",
+                     n_eqtls, "sample_", True, "genotype table"),
+                    (self.alleles_inpath, "genotype_alleles.txt.gz", "eqtl_",
+                     n_eqtls, None, True, "genotype alleles tables"),
+                    (self.expr_inpath, "expression_table.txt.gz", "eqtl_",
+                     n_eqtls, "sample_", True, "expression table"),
+                    (self.cov_inpath, "covariates_table.txt.gz", "cov_",
+                     n_covs, "sample_", True, "covariates table")]:
+            outpath = os.path.join(self.outdir, filename)
+            if not check_file_exists(outpath) or self.force:
+                self.mask_table(inpath, outpath, row_prefix, n_rows,
+                                column_prefix, has_index)
+            else:
+                print("\tSkipping {}.".format(name))
+
+    @staticmethod
+    def read_header(inpath, sep="\t"):
+        with RowIndex(inpath, load=False).open() as f:
+            header = f.readline()
+        f.close()
+        return header.decode().rstrip("\r\n").split(sep)
+
+    def mask_table(self, inpath, outpath, row_prefix, n_rows,
+                   column_prefix=None, has_index=True, sep="\t"):
+        """
+        Method for writing a table with masked row (and column) labels.
+        The masked table has an unnamed index column, like a dataframe
+        with replaced index saved by save_dataframe.
+
+        :param inpath: string, the input table.
+        :param outpath: string, the output table.
+        :param row_prefix: string, the prefix of the masked row labels.
+        :param n_rows: int, the expected number of rows.
+        :param column_prefix: string, the prefix of the masked column
+                              labels, None to keep the column labels.
+        :param has_index: boolean, whether the first field of a line is the
+                          row label (replaced) or a value (kept).
+        :param sep: string, the delimiter of the table.
+        """
+        sep = sep.encode()
+        row_prefix = row_prefix.encode()
+        n_written = 0
+        with RowIndex(inpath, load=False).open() as f, \
+                BgzfWriter(outpath, sep=sep.decode()) as writer:
+            # Rewrite the header.
+            columns = f.readline().rstrip(b"\r\n").split(sep)
+            if has_index:
+                columns = columns[1:]
+            if column_prefix is not None:
+                columns = ["{}{}".format(column_prefix, x).encode()
+                           for x in range(len(columns))]
+            writer.write(sep.join([b""] + columns) + b"\n")
+
+            # Copy the lines in blocks, replacing the first field.
+            part = b""
+            for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                lines = (part + chunk).split(b"\n")
+                part = lines.pop()
+                writer.write(self.mask_lines(lines, row_prefix, n_written,
+                                             has_index, sep))
+                n_written += len(lines)
+            if len(part) > 0:
+                writer.write(self.mask_lines([part], row_prefix, n_written,
+                                             has_index, sep))
+                n_written += 1
+
+            # Check before the output is finalized, exiting discards it. An
+            # output of a previous run is removed as well.
+            if n_written != n_rows:
+                print("{} has {} rows, expected {}.".format(
+                    get_basename(inpath), n_written, n_rows))
+                if os.path.isfile(outpath):
+                    os.remove(outpath)
+                exit()
+        f.close()
+
+        print("\tSaved dataframe: {} with shape: ({}, {})".format(
+            get_basename(outpath), n_written, len(columns)))
+
+    @staticmethod
+    def mask_lines(lines, row_prefix, start, has_index, sep):
+        """
+        Method for replacing (or prepending) the row label of lines.
+
+        :param lines: list, the lines without line ending.
+        :param row_prefix: bytes, the prefix of the masked row labels.
+        :param start: int, the row number of the first line.
+        :param has_index: boolean, whether to replace the first field.
+        :param sep: bytes, the delimiter of the table.
+        :return : bytes, the masked lines.
+        """
+        masked = []
+        for i, line in enumerate(lines, start):
+            if has_index:
+                _, found, values = line.partition(sep)
+            else:
+                found, values = sep, line
+            masked.append(row_prefix + str(i).encode() + found + values)
+        masked.append(b"")
+        return b"\n".join(masked)
 
     def print_arguments(self):
         print("Arguments:")
-        print("  > EQTL matrix shape: {}".format(self.eqtl_df.shape))
-        print("  > Genotype matrix shape: {}".format(self.geno_df.shape))
-        print("  > Alleles matrix shape: {}".format(self.alleles_df.shape))
-        print("  > Expression matrix shape: {}".format(self.expr_df.shape))
-        print("  > Covariate matrix shape: {}".format(self.cov_df.shape))
+        print("  > EQTL input path: {}".format(self.eqtl_inpath))
+        print("  > Genotype input path: {}".format(self.geno_inpath))
+        print("  > Alleles input path: {}".format(self.alleles_inpath))
+        print("  > Expression input path: {}".format(self.expr_inpath))
+        print("  > Covariate input path: {}".format(self.cov_inpath))
         print("  > Output directory: {}".format(self.outdir))
         print("  > Force: {}".format(self.force))
         print("")
@@ -1,7 +1,7 @@
 """
 File:         perform_celltype_factorization.py
 Created:      2020/04/07
-Last Changed: 2020/04/28
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -20,6 +20,7 @@ root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
 """
 
 # Standard imports.
+from concurrent.futures import ThreadPoolExecutor
 import os
 
 # Third party imports.
@@ -29,12 +30,12 @@ from sklearn.decomposition import PCA, NMF
 
 # Local application imports.
 from general.utilities import prepare_output_dir, check_file_exists
-from general.df_utilities import load_dataframe, save_dataframe
+from general.df_utilities import load_dataframe
 
 
 class PerformCelltypeFactorization:
     def __init__(self, settings, profile_file, profile_df, ct_expr_file,
-                 force, outdir):
+                 force, outdir, artifacts):
         """
         The initializer for the class.
 
@@ -47,11 +48,23 @@ class PerformCelltypeFactorization:
                              of the celltype profiles.
         :param force: boolean, whether or not to force the step to redo.
         :param outdir: string, the output directory.
+        :param artifacts: ArtifactRegistry, the registry of the saved
+                          dataframes.
         """
+        if settings is None:
+            settings = {"solver": "auto", "cores": 1, "seed": 0}
+        if settings["solver"] not in ["auto", "randomized", "arpack"]:
+            print("Unknown solver '{}', choose from: auto, randomized, "
+                  "arpack.".format(settings["solver"]))
+            exit()
+        self.solver = settings["solver"]
+        self.cores = max(1, settings["cores"])
+        self.seed = settings["seed"]
         self.profile_file = profile_file
         self.profile_df = profile_df
         self.ct_expr_file = ct_expr_file
         self.force = force
+        self.artifacts = artifacts
 
         # Prepare an output directory.
         self.outdir = os.path.join(outdir, 'perform_celltype_factorization')
@@ -71,10 +84,10 @@ class PerformCelltypeFactorization:
         # Check if output file exist.
         if check_file_exists(self.pca_outpath) and check_file_exists(self.nmf_outpath) and not self.force:
             print("Skipping step, loading result.")
-            self.celltype_pcs = load_dataframe(inpath=self.pca_outpath,
-                                               header=0, index_col=0)
-            self.celltype_cs = load_dataframe(inpath=self.nmf_outpath,
-                                              header=0, index_col=0)
+            self.celltype_pcs = self.artifacts.load(inpath=self.pca_outpath,
+                                                    header=0, index_col=0)
+            self.celltype_cs = self.artifacts.load(inpath=self.nmf_outpath,
+                                                   header=0, index_col=0)
         else:
             self.celltype_expression, self.celltype_pcs, self.celltype_cs = self.perform_matrix_factorization()
             self.save()
@@ -82,8 +95,8 @@ class PerformCelltypeFactorization:
     def perform_matrix_factorization(self):
         # Load the expression data.
         print("Loading celltype expression data.")
-        ct_expr_df = load_dataframe(inpath=self.ct_expr_file,
-                                    header=0, index_col=0)
+        ct_expr_df = self.artifacts.load(inpath=self.ct_expr_file,
+                                         header=0, index_col=0)
 
         if self.profile_df is None:
             # Load the celltype profile file.
@@ -94,59 +107,77 @@ class PerformCelltypeFactorization:
         # Find the genes specific to each celltype.
         gene_celltypes = self.normalize(self.profile_df).idxmax(axis=1)
 
-        # Construct a dataframe of the first component of each celltype
-        # subset expression profile.
-        pca_data = []
-        print("Performing PCA")
-        for celltype in self.profile_df.columns:
-            print("\tWorking on: {}".format(celltype))
-            ct_genes = gene_celltypes[gene_celltypes == celltype].index
-            ct_expr = ct_expr_df.loc[ct_expr_df.index.isin(ct_genes), :]
-            print("\t  N = {}".format(len(ct_expr.index)))
-
-            # perform PCA over the expression of these genes.
-            print("\t  PCA")
-            pca_component = self.get_first_pca_component(ct_expr)
-            pca_component_values = [x[0] for x in list(pca_component)]
-            pca_data.append(pca_component_values)
-
-        # Create the data frame.
+        # Shift the expression to be all positive for the NMF.
+        shift = abs(ct_expr_df.values.min())
+
+        # Factorize the celltype subset expression profiles concurrently,
+        # the solvers spend their time in BLAS which releases the GIL.
+        print("Performing PCA and NMF")
+        celltypes = list(self.profile_df.columns)
+        with ThreadPoolExecutor(max_workers=self.cores) as executor:
+            futures = []
+            for celltype in celltypes:
+                ct_genes = gene_celltypes[gene_celltypes == celltype].index
+                ct_expr = ct_expr_df.loc[ct_expr_df.index.isin(ct_genes), :]
+                futures.append(executor.submit(self.factorize, ct_expr,
+                                               shift, self.solver,
+                                               self.seed))
+
+            pca_data = []
+            nmf_data = []
+            for celltype, future in zip(celltypes, futures):
+                pca_component, nmf_component, log = future.result()
+                print("\tWorking on: {}".format(celltype))
+                for line in log:
+                    print(line)
+                pca_data.append(pca_component)
+                nmf_data.append(nmf_component)
+
+        # Create the data frames of the first component of each celltype.
         celltype_pcs = pd.DataFrame(pca_data,
-                                    index=["{}PCA_{}_PC1".format(*x.split("_")) for x in self.profile_df.columns],
+                                    index=["{}PCA_{}_PC1".format(*x.split("_")) for x in celltypes],
                                     columns=ct_expr_df.columns)
-
-        # Shift the expression to be all positive.
-        shifted_ct_expr = ct_expr_df.copy()
-        shifted_ct_expr = shifted_ct_expr + abs(shifted_ct_expr.values.min())
-
-        # Construct a dataframe of the first component of each celltype
-        # subset expression profile.
-        nmf_data = []
-        print("Performing NMF")
-        for celltype in self.profile_df.columns:
-            print("\tWorking on: {}".format(celltype))
-            ct_genes = gene_celltypes[gene_celltypes == celltype].index
-            ct_expr = shifted_ct_expr.loc[shifted_ct_expr.index.isin(ct_genes), :]
-            print("\t  N = {}".format(len(ct_expr.index)))
-
-            # perform NMF over the expression of these genes.
-            print("\t  NMF")
-            nmf_component = self.get_first_nmf_component(ct_expr)
-            nmf_component_values = [x[0] for x in list(nmf_component)]
-            nmf_data.append(nmf_component_values)
-
-        # Create the data frame.
         celltype_cs = pd.DataFrame(nmf_data,
-                                   index=["{}NMF_{}_C1".format(*x.split("_")) for x in self.profile_df.columns],
-                                   columns=shifted_ct_expr.columns)
+                                   index=["{}NMF_{}_C1".format(*x.split("_")) for x in celltypes],
+                                   columns=ct_expr_df.columns)
 
         return ct_expr_df, celltype_pcs, celltype_cs
 
+    @classmethod
+    def factorize(cls, ct_expr, shift, solver, seed):
+        """
+        Method for getting the first PCA and NMF component of the expression
+        of the genes of a celltype.
+
+        :param ct_expr: DataFrame, the expression of the celltype genes.
+        :param shift: float, the value added to make the expression
+                      positive for the NMF.
+        :param solver: str, the PCA solver: 'auto', or 'randomized' /
+                       'arpack' to only compute the first component.
+        :param seed: int, the random state of the solvers.
+        :return pca_component: ndarray, the first PCA component.
+        :return nmf_component: ndarray, the first NMF component.
+        :return log: list, the messages to print.
+        """
+        log = ["\t  N = {}".format(len(ct_expr.index))]
+
+        # perform PCA over the expression of these genes.
+        log.append("\t  PCA")
+        pca_component = cls.get_first_pca_component(ct_expr, solver, seed,
+                                                    log)[:, 0]
+
+        # perform NMF over the shifted expression of these genes.
+        log.append("\t  NMF")
+        nmf_component = cls.get_first_nmf_component(ct_expr + shift, seed,
+                                                    log)[:, 0]
+
+        return pca_component, nmf_component, log
+
     def save(self):
-        save_dataframe(df=self.celltype_pcs, outpath=self.pca_outpath,
-                       index=True, header=True)
-        save_dataframe(df=self.celltype_cs, outpath=self.nmf_outpath,
-                       index=True, header=True)
+        self.artifacts.save(df=self.celltype_pcs, outpath=self.pca_outpath,
+                            index=True, header=True)
+        self.artifacts.save(df=self.celltype_cs, outpath=self.nmf_outpath,
+                            index=True, header=True)
 
     @staticmethod
     def normalize(df):
@@ -156,23 +187,27 @@ class PerformCelltypeFactorization:
         return out_df
 
     @staticmethod
-    def get_first_pca_component(X):
+    def get_first_pca_component(X, solver="auto", seed=0, log=None):
         corr_matrix = np.dot(X.T, X) / (X.shape[0] - 1)
 
-        pca = PCA(n_components=1)
+        pca = PCA(n_components=1, svd_solver=solver, random_state=seed)
         pca.fit(corr_matrix)
-        print("\t\tExplained variance ratio: {:.2f}".format(pca.explained_variance_ratio_[0]))
-        print("\t\tSingular values: {:.2f}".format(pca.singular_values_[0]))
+        if log is not None:
+            log.append("\t\tExplained variance ratio: {:.2f}".format(pca.explained_variance_ratio_[0]))
+            log.append("\t\tSingular values: {:.2f}".format(pca.singular_values_[0]))
         return pca.transform(corr_matrix)
 
     @staticmethod
-    def get_first_nmf_component(X):
+    def get_first_nmf_component(X, seed=0, log=None):
         corr_matrix = np.dot(X.T, X) / (X.shape[0] - 1)
 
-        nmf = NMF(n_components=1)
+        # The initialization is a (truncated) randomized SVD for every
+        # solver, the random state makes it reproducible.
+        nmf = NMF(n_components=1, init="nndsvda", random_state=seed)
         nmf.fit(corr_matrix)
-        print("\t\tReconstruction error: {:.2f}".format(nmf.reconstruction_err_))
-        print("\t\tNumber of iterations: {}".format(nmf.n_iter_))
+        if log is not None:
+            log.append("\t\tReconstruction error: {:.2f}".format(nmf.reconstruction_err_))
+            log.append("\t\tNumber of iterations: {}".format(nmf.n_iter_))
         return nmf.transform(corr_matrix)
 
     def get_celltype_expression(self):
@@ -199,5 +234,8 @@ class PerformCelltypeFactorization:
         print("  > Celltype expression input path: {}".format(self.ct_expr_file))
         print("  > Celltype PCA output file: {}".format(self.pca_outpath))
         print("  > Celltype NMF output file: {}".format(self.nmf_outpath))
+        print("  > Solver: {}".format(self.solver))
+        print("  > Cores: {}".format(self.cores))
+        print("  > Seed: {}".format(self.seed))
         print("  > Force: {}".format(self.force))
         print("")
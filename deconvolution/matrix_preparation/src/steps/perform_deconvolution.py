@@ -1,7 +1,7 @@
 """
 File:         perform_deconvolution.py
 Created:      2020/04/08
-Last Changed: 2020/06/18
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -25,16 +25,16 @@ import os
 # Third party imports.
 import numpy as np
 import pandas as pd
-from scipy.optimize import nnls
 
 # Local application imports.
 from general.utilities import prepare_output_dir, check_file_exists
-from general.df_utilities import load_dataframe, save_dataframe
+from general.df_utilities import load_dataframe
+from general.nnls import BatchNNLS
 
 
 class PerformDeconvolution:
     def __init__(self, settings, profile_file, profile_df, ct_expr_file,
-                 ct_expr_df, force, outdir):
+                 ct_expr_df, force, outdir, artifacts):
         """
         The initializer for the class.
 
@@ -48,12 +48,19 @@ class PerformDeconvolution:
         :param ct_expr_df: string, the celltype expression.
         :param force: boolean, whether or not to force the step to redo.
         :param outdir: string, the output directory.
+        :param artifacts: ArtifactRegistry, the registry of the saved
+                          dataframes.
         """
+        if settings is None:
+            settings = {"batch_size": 1000, "cores": 1}
+        self.batch_size = max(1, settings["batch_size"])
+        self.cores = max(1, settings["cores"])
         self.profile_file = profile_file
         self.profile_df = profile_df
         self.ct_expr_file = ct_expr_file
         self.ct_expr_df = ct_expr_df
         self.force = force
+        self.artifacts = artifacts
 
         # Prepare an output directories.
         self.outdir = os.path.join(outdir, 'perform_deconvolution')
@@ -72,8 +79,8 @@ class PerformDeconvolution:
         # Check if output file exist.
         if check_file_exists(self.outpath) and not self.force:
             print("Skipping step, loading result.")
-            self.deconvolution = load_dataframe(inpath=self.outpath,
-                                                header=0, index_col=0)
+            self.deconvolution = self.artifacts.load(inpath=self.outpath,
+                                                     header=0, index_col=0)
         else:
             self.deconvolution = self.perform_deconvolution()
             self.save()
@@ -88,8 +95,8 @@ class PerformDeconvolution:
         if self.ct_expr_df is None:
             # Load the celltype expression file.
             print("Loading cell type expression matrix.")
-            self.ct_expr_df = load_dataframe(self.ct_expr_file,
-                                             header=0, index_col=0)
+            self.ct_expr_df = self.artifacts.load(self.ct_expr_file,
+                                                  header=0, index_col=0)
 
         # Z-score transform the signature profile.
         profile_df = self.normalize(self.profile_df)
@@ -122,16 +129,12 @@ class PerformDeconvolution:
         print("Profile shape: {}".format(profile_df.shape))
         print("Expression shape: {}".format(expr_df.shape))
 
-        # Perform deconvolution per sample.
+        # Perform deconvolution of all samples at once.
         print("Performing partial deconvolution.")
-        decon_data = []
-        residuals_data = []
-        for _, sample in expr_df.T.iterrows():
-            proportions, rnorm = self.nnls(profile_df, sample)
-            decon_data.append(proportions)
-            residuals_data.append(rnorm)
-
-        decon_df = pd.DataFrame(decon_data,
+        decon_data, residuals_data = self.nnls(profile_df, expr_df,
+                                               self.batch_size, self.cores)
+
+        decon_df = pd.DataFrame(decon_data.T,
                                 index=expr_df.columns,
                                 columns=["{}NNLS_{}".format(*x.split("_")) for x in profile_df.columns])
 
@@ -159,16 +162,17 @@ class PerformDeconvolution:
         return out_df
 
     @staticmethod
-    def nnls(A, b):
-        return nnls(A, b)
+    def nnls(A, B, batch_size=1000, cores=1):
+        return BatchNNLS(A.to_numpy(), batch_size=batch_size,
+                         cores=cores).solve(B.to_numpy())
 
     @staticmethod
     def sum_to_one(X):
         return X.divide(X.sum(axis=1), axis=0)
 
     def save(self):
-        save_dataframe(df=self.deconvolution, outpath=self.outpath,
-                       index=True, header=True)
+        self.artifacts.save(df=self.deconvolution, outpath=self.outpath,
+                            index=True, header=True)
 
     def clear_variables(self):
         self.profile_file = None
@@ -191,5 +195,7 @@ class PerformDeconvolution:
         else:
             print("  > Celltype expression input path: {}".format(self.ct_expr_file))
         print("  > Deconvolution output file: {}".format(self.outpath))
+        print("  > Batch size: {}".format(self.batch_size))
+        print("  > Cores: {}".format(self.cores))
         print("  > Force: {}".format(self.force))
         print("")
@@ -1,7 +1,7 @@
 """
 File:         main.py
 Created:      2020/03/19
-Last Changed: 2020/03/20
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -38,6 +38,7 @@ from general.utilities import prepare_output_dir, check_file_exists, get_dirname
 from general.local_settings import LocalSettings
 from general.utilities import get_leaf_dir, get_basename
 from general.df_utilities import load_dataframe, save_dataframe
+from general.group_view import GroupView
 
 
 class Main:
@@ -141,8 +142,8 @@ class Main:
             print("Loading eQTL file.")
             eqtl_df = load_dataframe(inpath=self.eqtl_inpath,
                                      header=0,
-                                     index_col=None)
-            eqtl_df = eqtl_df.iloc[snp_mask, :]
+                                     index_col=None,
+                                     rows=snp_mask)
 
             print("Preparing marker matrix.")
             if not check_file_exists(markers_outpath) or self.force:
@@ -166,8 +167,9 @@ class Main:
             geno_df = load_dataframe(inpath=os.path.join(self.data_indir,
                                                          self.geno_filename),
                                      header=0,
-                                     index_col=0)
-            geno_df = geno_df.iloc[snp_mask, sample_mask]
+                                     index_col=0,
+                                     rows=snp_mask)
+            geno_df = geno_df.iloc[:, sample_mask]
             save_dataframe(outpath=geno_outpath, df=geno_df,
                            index=True, header=True)
             del geno_df
@@ -180,8 +182,8 @@ class Main:
             alleles_df = load_dataframe(inpath=os.path.join(self.data_indir,
                                                             self.alleles_filename),
                                         header=0,
-                                        index_col=0)
-            alleles_df = alleles_df.iloc[snp_mask, :]
+                                        index_col=0,
+                                        rows=snp_mask)
             save_dataframe(outpath=alleles_outpath, df=alleles_df,
                            index=True, header=True)
             del alleles_df
@@ -194,8 +196,9 @@ class Main:
             expr_df = load_dataframe(inpath=os.path.join(self.data_indir,
                                                          self.expr_filename),
                                      header=0,
-                                     index_col=0)
-            expr_df = expr_df.iloc[snp_mask, sample_mask]
+                                     index_col=0,
+                                     rows=snp_mask)
+            expr_df = expr_df.iloc[:, sample_mask]
             save_dataframe(outpath=expr_outpath, df=expr_df,
                            index=True, header=True)
             del expr_df
@@ -217,8 +220,8 @@ class Main:
 
     def combine_groups(self, inter_outpath):
         print("Combining groups.")
-        snp_mask = np.array([], dtype=np.int16)
-        sample_mask = np.array([], dtype=np.int16)
+        snp_masks = []
+        sample_masks = []
         inter_df = None
         for i, group_id in enumerate(self.group_ids):
             print("  Working on: {:10s} [{}/{} "
@@ -229,13 +232,18 @@ class Main:
             data_indir = os.path.join(self.g_data_indir, group_id)
             inter_indir = os.path.join(self.g_inter_indir, group_id, 'output')
 
-            # Load the group object.
-            with open(os.path.join(data_indir, self.obj_filename), "rb") as f:
-                group_object = pickle.load(f)
+            # Load the group indices.
+            if GroupView.exists(data_indir):
+                group_object = GroupView(data_indir)
+            else:
+                with open(os.path.join(data_indir, self.obj_filename), "rb") as f:
+                    group_object = pickle.load(f)
 
             # Safe the indices.
-            snp_mask = np.append(snp_mask, group_object.get_snp_indices())
-            sample_mask = np.append(sample_mask, group_object.get_sample_indices())
+            snp_masks.append(np.asarray(group_object.get_snp_indices(),
+                                        dtype=np.int64))
+            sample_masks.append(np.asarray(group_object.get_sample_indices(),
+                                           dtype=np.int64))
 
             if not check_file_exists(inter_outpath) or self.force:
                 # Search for the interaction filename.
@@ -261,6 +269,11 @@ class Main:
                                               left_index=True,
                                               right_index=True)
 
+        snp_mask = np.concatenate(snp_masks) if snp_masks else \
+            np.array([], dtype=np.int64)
+        sample_mask = np.concatenate(sample_masks) if sample_masks else \
+            np.array([], dtype=np.int64)
+
         print("Preparing interaction matrix.")
         if not check_file_exists(inter_outpath) or self.force:
             # Sort the matrix according to the indices.
@@ -278,8 +291,8 @@ class Main:
                                       index_col=0)
 
         # Prepare the masks.
-        snp_mask = sorted(list(set(snp_mask)))
-        sample_mask = sorted(list(set(sample_mask)))
+        snp_mask = np.unique(snp_mask)
+        sample_mask = np.unique(sample_mask)
 
         return snp_mask, sample_mask, inter_df
 
@@ -3,7 +3,7 @@
 """
 File:         partial_deconvolution.py
 Created:      2020/06/29
-Last Changed: 2020/06/30
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -61,7 +61,8 @@ if __name__ == '__main__':
                         log2=CLA.get_argument("log2"),
                         decon_method=CLA.get_argument("decon_method"),
                         sum_to_one=CLA.get_argument("sum_to_one"),
-                        extension=CLA.get_argument("extension")
+                        extension=CLA.get_argument("extension"),
+                        cores=CLA.get_argument("cores")
                         )
 
     # Start the program.
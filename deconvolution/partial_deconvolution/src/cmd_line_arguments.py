@@ -1,7 +1,7 @@
 """
 File:         cmd_line_arguments.py
 Created:      2020/06/29
-Last Changed:
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -121,6 +121,11 @@ class CommandLineArguments:
                             default="NNLS",
                             help="The deconvolution method to use. "
                                  "Default: 'NNLS'.")
+        parser.add_argument("-cores",
+                            type=int,
+                            default=1,
+                            help="The number of cores to divide the samples "
+                                 "over. Default: 1.")
         parser.add_argument("-visualise",
                             action='store_true',
                             help="Whether or not to visualise the data."
@@ -1,7 +1,7 @@
 """
 File:         perform_deconvolution.py
 Created:      2020/06/29
-Last Changed: 2020/06/30
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -25,16 +25,17 @@ from __future__ import print_function
 import os
 
 # Third party imports.
-from scipy.optimize import nnls
 import pandas as pd
 
 # Local application imports.
+from general.nnls import BatchNNLS
 
 
 class PerformDeconvolution:
     def __init__(self, settings, signature, expression):
         self.decon_method = settings.get_decon_method()
         self.sum_to_one = settings.get_sum_to_one()
+        self.cores = settings.get_cores()
         self.outdir = settings.get_output_path()
         self.signature = signature
         self.expression = expression
@@ -51,14 +52,11 @@ class PerformDeconvolution:
             print("Unexpected deconvolution method.")
             exit()
 
-        decon_data = []
-        residuals_data = []
-        for index, sample in self.expression.T.iterrows():
-            proportions, rnorm = decon_function(self.signature, sample)
-            decon_data.append(proportions)
-            residuals_data.append(rnorm)
+        decon_data, residuals_data = decon_function(self.signature,
+                                                    self.expression,
+                                                    self.cores)
 
-        deconvolution = pd.DataFrame(decon_data,
+        deconvolution = pd.DataFrame(decon_data.T,
                                      index=self.expression.columns,
                                      columns=self.signature.columns)
         residuals = pd.Series(residuals_data,
@@ -73,8 +71,8 @@ class PerformDeconvolution:
         self.residuals = residuals
 
     @staticmethod
-    def nnls(A, b):
-        return nnls(A, b)
+    def nnls(A, B, cores=1):
+        return BatchNNLS(A.to_numpy(), cores=cores).solve(B.to_numpy())
 
     @staticmethod
     def perform_sum_to_one(X):
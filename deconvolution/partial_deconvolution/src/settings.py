@@ -1,7 +1,7 @@
 """
 File:         settings.py
 Created:      2020/06/29
-Last Changed: 2020/06/30
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -34,7 +34,7 @@ import os
 class Settings:
     def __init__(self, data_path, signature_path, translate_path, sample_path,
                  cohort, ground_truth_path, min_expr, normalize, zscore, log2,
-                 decon_method, sum_to_one, extension):
+                 decon_method, sum_to_one, extension, cores=1):
         self.data_path = data_path
         self.signature_path = signature_path
         self.translate_path = translate_path
@@ -48,6 +48,7 @@ class Settings:
         self.decon_method = decon_method
         self.sum_to_one = sum_to_one
         self.extension = extension
+        self.cores = cores
 
         self.outpath = None
         self.real_info_per_celltype = None
@@ -101,6 +102,9 @@ class Settings:
     def get_extension(self):
         return self.extension
 
+    def get_cores(self):
+        return self.cores
+
     def set_output_path(self, outpath):
         self.outpath = outpath
 
@@ -167,6 +171,7 @@ class Settings:
                 "decon_method": self.decon_method,
                 "sum_to_one": self.sum_to_one,
                 "extension": self.extension,
+                "cores": self.cores,
                 "real_info_per_celltype": self.real_info_per_celltype,
                 "filter_shape_diff": self.filter_shape_diff,
                 "sign_shift": self.sign_shift,
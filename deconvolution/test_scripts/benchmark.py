@@ -0,0 +1,668 @@
+#!/usr/bin/env python3
+
+"""
+File:         benchmark.py
+Created:      2026/10/18
+Last Changed:
+Author:       M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+from __future__ import print_function
+from datetime import datetime
+from pathlib import Path
+import subprocess
+import threading
+import argparse
+import shutil
+import json
+import time
+import sys
+import os
+
+# Third party imports.
+import numpy as np
+import pandas as pd
+
+# Local application imports.
+
+# Metadata
+__program__ = "Benchmark"
+__author__ = "Martijn Vochteloo"
+__maintainer__ = "Martijn Vochteloo"
+__email__ = "m.vochteloo@st.hanze.nl"
+__license__ = "GPLv3"
+__version__ = 1.0
+__description__ = "{} is a program developed and maintained by {}. " \
+                  "This program is licensed under the {} license and is " \
+                  "provided 'as-is' without any warranty or indemnification " \
+                  "of any kind.".format(__program__,
+                                        __author__,
+                                        __license__)
+
+"""
+Syntax:
+./benchmark.py -s benchmark_settings
+"""
+
+
+class main():
+    def __init__(self, settings_file, stage=None):
+        self.script_dir = str(Path(__file__).parent)
+        self.root_dir = str(Path(__file__).parent.parent)
+        self.settings_file = settings_file
+        self.stage = stage
+
+        settings_path = os.path.join(self.script_dir, "settings",
+                                     settings_file + ".json")
+        with open(settings_path) as f:
+            self.settings = json.load(f)
+        f.close()
+
+        self.name = self.settings["name"]
+        self.outdir = os.path.join(self.root_dir,
+                                   self.settings["output_directory"])
+        self.data_dir = os.path.join(self.outdir, "data")
+        self.log_dir = os.path.join(self.outdir, "logs")
+        self.results_path = os.path.join(self.outdir,
+                                         self.settings["results_filename"])
+        for outdir in [self.outdir, self.data_dir, self.log_dir]:
+            if not os.path.exists(outdir):
+                os.makedirs(outdir)
+
+        # The synthetic input files.
+        self.files = {
+            "genotype": os.path.join(self.data_dir, "genotype_table.txt.gz"),
+            "expression": os.path.join(self.data_dir, "expression_table.txt.gz"),
+            "eqtl": os.path.join(self.data_dir, "Iteration1", "eQTLProbesFDR0.05-ProbeLevel.txt.gz"),
+            "snp_to_gwasid": os.path.join(self.data_dir, "snp_to_gwasid.txt.gz"),
+            "gwasid_to_trait": os.path.join(self.data_dir, "gwasid_to_trait.txt.gz"),
+            "profile": os.path.join(self.data_dir, "celltype_profile.txt.gz"),
+            "translate": os.path.join(self.data_dir, "translate_table.txt.gz"),
+            "samples": os.path.join(self.data_dir, "sample_table.txt.gz"),
+            "covariates": os.path.join(self.data_dir, "covariate_table.txt.gz"),
+            "phenotype": os.path.join(self.data_dir, "phenotype_table.txt.gz"),
+            "eigenvectors": os.path.join(self.data_dir, "eigenvectors.txt.gz"),
+            "eigenvectors_before": os.path.join(self.data_dir, "eigenvectors_before_cov_corr.txt.gz"),
+            "cia_genotype": os.path.join(self.data_dir, self.name, "geno_table.txt.gz"),
+            "cia_expression": os.path.join(self.data_dir, self.name, "expr_table.txt.gz"),
+            "cia_covariates": os.path.join(self.data_dir, self.name, "cov_table.txt.gz")
+        }
+
+        # The seconds between the memory samples of a running stage.
+        self.memory_interval = 0.1
+
+        # The number of items each stage processes, used for the
+        # throughput.
+        self.stage_units = {
+            "matrix_preparation": ("eQTLs", self.settings["n_eqtls"]),
+            "mask_matrices": ("eQTLs", self.settings["n_eqtls"]),
+            "create_regression_matrix": ("eQTLs", self.settings["n_eqtls"]),
+            "custom_interaction_analyser": ("eQTLs", self.settings["n_eqtls"]),
+            "custom_interaction_analyser_combine": ("eQTLs", self.settings["n_eqtls"]),
+            "partial_deconvolution": ("samples", None)
+        }
+
+    def start(self):
+        if self.stage is not None:
+            self.run_in_process_stage(self.stage)
+            return
+
+        print("Generating synthetic data.")
+        n_cohort_samples = self.generate_data()
+        self.stage_units["partial_deconvolution"] = ("samples", n_cohort_samples)
+
+        commit = self.get_commit()
+        failed_stages = []
+        for stage in self.settings["stages"]:
+            print("Running stage: {}".format(stage), flush=True)
+            cmd, tool_dir, settings_path = self.prepare_stage(stage)
+            wall_time, peak_memory, status = self.run_subprocess(cmd, stage)
+            if settings_path is not None and os.path.isfile(settings_path):
+                os.remove(settings_path)
+
+            # A failed run has no throughput.
+            unit, n_units = self.stage_units[stage]
+            throughput = np.nan
+            if status == 0 and wall_time > 0:
+                throughput = n_units / wall_time
+            print("\tstatus: {}, wall time: {:.2f} second(s), peak memory: "
+                  "{:.1f} MB, throughput: {:.2f} {} per "
+                  "second".format(status, wall_time, peak_memory, throughput,
+                                  unit), flush=True)
+            self.save_result(commit, stage, status, wall_time, peak_memory,
+                             unit, n_units, throughput)
+            if status != 0:
+                print("\tstage failed, see log: {}".format(
+                    os.path.join(self.log_dir, stage + ".log")), flush=True)
+                failed_stages.append(stage)
+
+            if not self.settings["keep_output"] and tool_dir is not None:
+                outpath = os.path.join(tool_dir, self.name)
+                if stage != "custom_interaction_analyser" and os.path.isdir(outpath):
+                    shutil.rmtree(outpath)
+
+        print("Results saved in: {}".format(self.results_path))
+        if len(failed_stages) > 0:
+            print("Failed stage(s): {}".format(", ".join(failed_stages)))
+            sys.exit(1)
+
+    def generate_data(self):
+        """
+        Method for creating synthetic genotype (0/1/2 with -1 for missing),
+        expression, covariate and cell type profile tables. The expression
+        is a mixture of the cell type profiles plus an eQTL effect and
+        cell type specific interaction effects.
+
+        :return : int, the number of samples in the first cohort.
+        """
+        random_state = np.random.RandomState(self.settings["seed"])
+        n_eqtls = self.settings["n_eqtls"]
+        n_snps = max(self.settings["n_snps"], n_eqtls)
+        n_genes = max(self.settings["n_genes"], n_eqtls,
+                      self.settings["n_profile_genes"])
+        n_samples = self.settings["n_samples"]
+        celltypes = self.settings["celltypes"]
+        n_celltypes = len(celltypes)
+
+        geno_ids = ["genotype{}".format(i) for i in range(n_samples)]
+        rna_ids = ["rna{}".format(i) for i in range(n_samples)]
+        cohorts = ["cohort{}".format(i) for i in range(self.settings["n_cohorts"])]
+        sample_cohort = np.array(cohorts)[random_state.randint(0, len(cohorts), n_samples)]
+
+        # GTE files: one per cohort, genotype ID to expression ID.
+        for cohort in cohorts:
+            mask = sample_cohort == cohort
+            gte_df = pd.DataFrame({"genotype": np.array(geno_ids)[mask],
+                                   "rna": np.array(rna_ids)[mask]})
+            gte_df.to_csv(os.path.join(self.data_dir, "GTE-{}.txt.gz".format(cohort)),
+                          sep="\t", header=False, index=False,
+                          compression="gzip")
+
+        # Genes and translation table.
+        ensembl_ids = ["ENSG{:011d}.1".format(i) for i in range(n_genes)]
+        symbols = ["GENE{}".format(i) for i in range(n_genes)]
+        pd.DataFrame({"ArrayAddress": ensembl_ids, "Symbol": symbols}).to_csv(
+            self.files["translate"], sep="\t", header=True, index=False,
+            compression="gzip")
+
+        # Cell type proportions and profile.
+        proportions = random_state.dirichlet(np.ones(n_celltypes) * 2, n_samples)
+        profile = random_state.gamma(shape=1.0, scale=10.0,
+                                     size=(n_genes, n_celltypes))
+        profile_genes = random_state.choice(n_genes,
+                                            self.settings["n_profile_genes"],
+                                            replace=False)
+        profile_df = pd.DataFrame(profile[profile_genes, :],
+                                  index=np.array(symbols)[profile_genes],
+                                  columns=["CellMap_{}".format(x) for x in celltypes])
+        profile_df.index.name = "-"
+        profile_df.to_csv(self.files["profile"], sep="\t", header=True,
+                          index=True, compression="gzip")
+        marker_dict = {}
+        for i, celltype in enumerate(celltypes):
+            specificity = profile_df.iloc[:, i] / profile_df.sum(axis=1)
+            marker_dict[celltype] = list(specificity.sort_values(ascending=False).index[:self.settings["n_marker_genes"]])
+
+        # Genotypes.
+        snp_names = ["{}:{}:rs{}:A_G".format((i % 22) + 1, 10000 + i * 100, i)
+                     for i in range(n_snps)]
+        maf = random_state.uniform(0.05, 0.5, n_snps)
+        genotype = random_state.binomial(2, maf[:, np.newaxis],
+                                         size=(n_snps, n_samples)).astype(np.float64)
+        missing = random_state.random_sample((n_snps, n_samples)) < self.settings["missing_genotype_rate"]
+        genotype[missing] = -1
+
+        # Expression: cell type mixture with noise.
+        expression = np.log2(np.dot(profile, proportions.T) + 1)
+        expression += random_state.normal(0, 0.5, size=expression.shape)
+
+        # eQTLs: one SNP and gene per eQTL, with a main effect and an
+        # interaction with one of the cell type proportions.
+        eqtl_snps = np.sort(random_state.choice(n_snps, n_eqtls, replace=False))
+        eqtl_genes = random_state.choice(n_genes, n_eqtls, replace=False)
+        for snp_index, gene_index in zip(eqtl_snps, eqtl_genes):
+            dosage = np.where(genotype[snp_index, :] < 0, 0, genotype[snp_index, :])
+            celltype_index = random_state.randint(0, n_celltypes)
+            expression[gene_index, :] += dosage * (random_state.normal(0, 0.5) +
+                                                   random_state.normal(0, 1) * proportions[:, celltype_index])
+
+        geno_df = pd.DataFrame(genotype, index=snp_names, columns=geno_ids)
+        geno_df.insert(0, "Alleles", "A/G")
+        geno_df.insert(1, "MinorAllele", np.where(maf < 0.5, "G", "A"))
+        geno_df.index.name = "-"
+        geno_df.to_csv(self.files["genotype"], sep="\t", header=True,
+                       index=True, compression="gzip")
+        del geno_df
+
+        expr_df = pd.DataFrame(expression, index=ensembl_ids, columns=rna_ids)
+        expr_df.index.name = "-"
+        expr_df.to_csv(self.files["expression"], sep="\t", header=True,
+                       index=True, compression="gzip")
+        del expr_df
+
+        # eQTL probes file.
+        eqtl_df = pd.DataFrame({"PValue": random_state.uniform(0, 1e-5, n_eqtls),
+                                "SNPName": np.array(snp_names)[eqtl_snps],
+                                "SNPChr": [int(snp_names[i].split(":")[0]) for i in eqtl_snps],
+                                "SNPChrPos": [int(snp_names[i].split(":")[1]) for i in eqtl_snps],
+                                "ProbeName": np.array(ensembl_ids)[eqtl_genes],
+                                "ProbeChr": [int(snp_names[i].split(":")[0]) for i in eqtl_snps],
+                                "ProbeCenterChrPos": [int(snp_names[i].split(":")[1]) + 5000 for i in eqtl_snps],
+                                "CisTrans": "Cis",
+                                "SNPType": "A/G",
+                                "AlleleAssessed": "G",
+                                "OverallZScore": random_state.normal(0, 10, n_eqtls),
+                                "HGNCName": np.array(symbols)[eqtl_genes],
+                                "FDR": 0.0})
+        if not os.path.exists(os.path.dirname(self.files["eqtl"])):
+            os.makedirs(os.path.dirname(self.files["eqtl"]))
+        eqtl_df.to_csv(self.files["eqtl"], sep="\t", header=True, index=False,
+                       compression="gzip")
+
+        # GWAS files: every SNP is associated with one of a few traits.
+        gwas_ids = ["GWAS{}".format(i % 10) for i in range(n_eqtls)]
+        pd.DataFrame({"RsID": np.array(snp_names)[eqtl_snps], "ID": gwas_ids}).to_csv(
+            self.files["snp_to_gwasid"], sep="\t", header=True, index=False,
+            compression="gzip")
+        pd.DataFrame({"ID": ["GWAS{}".format(i) for i in range(10)],
+                      "Trait": ["Trait{}".format(i % 3) for i in range(10)]}).to_csv(
+            self.files["gwasid_to_trait"], sep="\t", header=True, index=False,
+            compression="gzip")
+
+        # Sample, covariate, phenotype and eigenvector files.
+        pd.DataFrame({"RnaID": rna_ids, "GenotypeID": geno_ids,
+                      "MetaCohort": sample_cohort}).to_csv(
+            self.files["samples"], sep="\t", header=True, index=False,
+            compression="gzip")
+
+        tech_covs = ["TechCov{}".format(i) for i in range(self.settings["n_technical_covariates"])]
+        cov_df = pd.DataFrame(random_state.normal(0, 1, size=(n_samples, len(tech_covs))),
+                              index=rna_ids, columns=tech_covs)
+        for cohort in cohorts[1:]:
+            cov_df[cohort] = (sample_cohort == cohort).astype(int)
+        cov_df.index.name = "-"
+        cov_df.to_csv(self.files["covariates"], sep="\t", header=True,
+                      index=True, compression="gzip")
+
+        sex = np.array(["M", "F"])[random_state.randint(0, 2, n_samples)]
+        pd.DataFrame({"Cohort": sample_cohort, "Age": random_state.randint(20, 90, n_samples),
+                      "Diagnosis": "None", "GenotypeID": geno_ids, "RnaID": rna_ids,
+                      "Gender": sex, "sex.by.expression": sex}).to_csv(
+            self.files["phenotype"], sep="\t", header=True, index=False,
+            compression="gzip")
+
+        n_eigen = self.settings["n_eigenvectors"]
+        eigen_df = pd.DataFrame(random_state.normal(0, 1, size=(n_samples, n_eigen)),
+                                index=rna_ids,
+                                columns=["Comp{}".format(i) for i in range(1, n_eigen + 1)])
+        eigen_df.index.name = "-"
+        eigen_df.to_csv(self.files["eigenvectors"], sep="\t", header=True,
+                        index=True, compression="gzip")
+        eigen_df.iloc[:, :2].to_csv(self.files["eigenvectors_before"],
+                                    sep="\t", header=True, index=True,
+                                    compression="gzip")
+
+        # The interaction analyser input: the eQTL rows of the genotype
+        # and expression and the covariates with the cell type proportions.
+        if not os.path.exists(os.path.dirname(self.files["cia_genotype"])):
+            os.makedirs(os.path.dirname(self.files["cia_genotype"]))
+        cia_geno_df = pd.DataFrame(genotype[eqtl_snps, :],
+                                   index=np.array(snp_names)[eqtl_snps],
+                                   columns=rna_ids)
+        cia_geno_df.index.name = "-"
+        cia_geno_df.to_csv(self.files["cia_genotype"], sep="\t", header=True,
+                           index=True, compression="gzip")
+        cia_expr_df = pd.DataFrame(expression[eqtl_genes, :],
+                                   index=np.array(snp_names)[eqtl_snps],
+                                   columns=rna_ids)
+        cia_expr_df.index.name = "-"
+        cia_expr_df.to_csv(self.files["cia_expression"], sep="\t",
+                           header=True, index=True, compression="gzip")
+        cia_cov_df = pd.concat([cov_df.T,
+                                pd.DataFrame(proportions.T, index=celltypes,
+                                             columns=rna_ids)], axis=0)
+        cia_cov_df.index.name = "-"
+        cia_cov_df.to_csv(self.files["cia_covariates"], sep="\t",
+                          header=True, index=True, compression="gzip")
+
+        self.tech_covs = tech_covs
+        self.cohorts = cohorts
+        self.marker_dict = marker_dict
+
+        print("\tgenotype: {} SNPs x {} samples, expression: {} genes x {} "
+              "samples, {} eQTLs".format(n_snps, n_samples, n_genes,
+                                         n_samples, n_eqtls))
+
+        return int(np.sum(sample_cohort == cohorts[0]))
+
+    def write_tool_settings(self, tool, overrides):
+        """
+        Method for writing a settings file for a tool: the default settings
+        of the tool updated with the benchmark values.
+
+        :param tool: string, the name of the tool directory.
+        :param overrides: dict, the settings to replace.
+        :return : string, the path of the settings file.
+        """
+        settings_dir = os.path.join(self.root_dir, tool, "settings")
+        with open(os.path.join(settings_dir, "default_settings.json")) as f:
+            settings = json.load(f)
+        f.close()
+
+        for key, value in overrides.items():
+            if isinstance(value, dict) and isinstance(settings.get(key), dict):
+                settings[key].update(value)
+            else:
+                settings[key] = value
+
+        settings_path = os.path.join(settings_dir, self.name + ".json")
+        with open(settings_path, "w") as f:
+            json.dump(settings, f, indent=2)
+        f.close()
+
+        return settings_path
+
+    def prepare_stage(self, stage):
+        """
+        Method for creating the command of a stage.
+
+        :param stage: string, the name of the stage.
+        :return cmd: list, the command.
+        :return tool_dir: string, the directory of the tool, None if the
+                          stage does not write in it.
+        :return settings_path: string, the settings file to remove, None if
+                               no settings file is created.
+        """
+        if stage == "matrix_preparation":
+            settings_path = self.write_tool_settings(
+                "matrix_preparation",
+                {"combine_gte_files": {"input_directory": self.data_dir,
+                                       "filename_regex": "GTE-*.txt.gz"},
+                 "combine_eqtlprobes": {"input_directory": self.data_dir,
+                                        "iteration_dirname": "Iteration",
+                                        "iterations": 1,
+                                        "in_filename": os.path.basename(self.files["eqtl"]),
+                                        "snp_to_gwasid_filename": self.files["snp_to_gwasid"],
+                                        "gwasid_to_trait_filename": self.files["gwasid_to_trait"]},
+                 "create_matrices": {"genotype_datafile": self.files["genotype"],
+                                     "expression_datafile": self.files["expression"]},
+                 "create_deconvolution_matrices": {"celltype_profile_datafile": self.files["profile"],
+                                                   "translate_datafile": self.files["translate"],
+                                                   "marker_genes_suffix": "CellMap",
+                                                   "marker_dict": self.marker_dict},
+                 "create_cov_matrix": {"covariate_datafile": self.files["covariates"],
+                                       "technical_covariates": self.tech_covs,
+                                       "cohorts": self.cohorts[1:],
+                                       "reference_cohort": self.cohorts[0],
+                                       "phenotype_datafile": self.files["phenotype"],
+                                       "eigenvectors_datafile": self.files["eigenvectors"],
+                                       "num_eigenvectors": self.settings["n_eigenvectors"],
+                                       "eigenvectors_before_cov_corr_datafile": self.files["eigenvectors_before"]}})
+            cmd = [sys.executable, "matrix_preparation.py", "-n", self.name,
+                   "-s", self.name, "-f", "all"]
+            return cmd, os.path.join(self.root_dir, "matrix_preparation"), settings_path
+
+        if stage in ["custom_interaction_analyser",
+                     "custom_interaction_analyser_combine"]:
+            tool_dir = os.path.join(self.root_dir, "custom_interaction_analyser")
+            cia_settings = self.settings["custom_interaction_analyser"]
+            settings_path = self.write_tool_settings(
+                "custom_interaction_analyser",
+                {"input_dir": self.data_dir,
+                 "filenames": {"genotype": os.path.basename(self.files["cia_genotype"]),
+                               "expression": os.path.basename(self.files["cia_expression"]),
+                               "covariates": os.path.basename(self.files["cia_covariates"])},
+                 "technical_covariates": self.tech_covs + self.cohorts[1:],
+                 "n_permutations": cia_settings["n_permutations"],
+                 "permutation_seed": self.settings["seed"]})
+            cmd = [sys.executable, "custom_interaction_analyser.py", "-n",
+                   self.name, "-s", self.name, "-ne",
+                   str(self.settings["n_eqtls"]), "-ns",
+                   str(self.settings["n_samples"])]
+            if stage == "custom_interaction_analyser":
+                # Start without results of a previous benchmark.
+                outpath = os.path.join(tool_dir, self.name)
+                if os.path.isdir(outpath):
+                    shutil.rmtree(outpath)
+                cmd += ["-c", str(cia_settings["cores"])]
+            else:
+                cmd += ["-combine"]
+            return cmd, tool_dir, settings_path
+
+        if stage == "partial_deconvolution":
+            cmd = [sys.executable, "partial_deconvolution.py",
+                   "-d", self.files["expression"],
+                   "-si", self.files["profile"],
+                   "-t", self.files["translate"],
+                   "-sa", self.files["samples"],
+                   "-c", self.cohorts[0],
+                   "-o", self.name]
+            return cmd, os.path.join(self.root_dir, "partial_deconvolution"), None
+
+        if stage in ["mask_matrices", "create_regression_matrix"]:
+            cmd = [sys.executable, os.path.abspath(__file__),
+                   "-s", self.settings_file, "-stage", stage]
+            return cmd, None, None
+
+        print("Unknown stage: {}".format(stage))
+        exit()
+
+    def run_subprocess(self, cmd, stage):
+        """
+        Method for running a stage in a new process. The peak memory is the
+        maximum of the summed memory of the process and all its descendants
+        (e.g. the workers of a pool), sampled while the stage runs. Without
+        /proc, or if a process peaks in between samples, the maximum
+        resident set size of a single process in the tree is used instead.
+
+        :param cmd: list, the command.
+        :param stage: string, the name of the stage.
+        :return wall_time: float, the run time in seconds.
+        :return peak_memory: float, the peak memory in MB.
+        :return status: int, the exit status of the process.
+        """
+        log_path = os.path.join(self.log_dir, stage + ".log")
+        peak_tree_memory = [0]
+        stopped = threading.Event()
+
+        def sample_memory(pid):
+            while not stopped.wait(self.memory_interval):
+                peak_tree_memory[0] = max(peak_tree_memory[0],
+                                          self.get_tree_memory(pid))
+
+        with open(log_path, "w") as log:
+            start_time = time.time()
+            process = subprocess.Popen(cmd, cwd=self.root_dir, stdout=log,
+                                       stderr=subprocess.STDOUT)
+            sampler = threading.Thread(target=sample_memory,
+                                       args=(process.pid,), daemon=True)
+            sampler.start()
+            _, exit_status, rusage = os.wait4(process.pid, 0)
+            wall_time = time.time() - start_time
+            stopped.set()
+            sampler.join()
+        log.close()
+
+        status = -1
+        if os.WIFEXITED(exit_status):
+            status = os.WEXITSTATUS(exit_status)
+        process.returncode = status
+
+        peak_memory = max(peak_tree_memory[0] / 1024 ** 2, rusage.ru_maxrss / 1024)
+        return wall_time, peak_memory, status
+
+    @classmethod
+    def get_tree_memory(cls, root_pid):
+        """
+        Method for summing the memory of a process and all its descendants
+        using /proc. The proportional set size is used, which divides
+        shared pages (e.g. shared arrays and pages inherited from the
+        parent) over the processes that use them, so they are counted once.
+        Without it the resident set size is used.
+
+        :param root_pid: int, the process id of the root.
+        :return : int, the memory in bytes, 0 without /proc.
+        """
+        # Map every process to its parent.
+        children = {}
+        try:
+            pids = [int(x) for x in os.listdir("/proc") if x.isdigit()]
+        except OSError:
+            return 0
+        for pid in pids:
+            try:
+                with open("/proc/{}/stat".format(pid)) as f:
+                    stat = f.read()
+                f.close()
+            except OSError:
+                continue
+            # The process name can contain spaces, the fields after it not.
+            ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+            children.setdefault(ppid, []).append(pid)
+
+        total = 0
+        todo = [root_pid]
+        while len(todo) > 0:
+            pid = todo.pop()
+            todo.extend(children.get(pid, []))
+            try:
+                total += cls.get_process_memory(pid)
+            except (OSError, ValueError, IndexError):
+                continue
+        return total
+
+    @staticmethod
+    def get_process_memory(pid):
+        """
+        Method for getting the proportional set size of a process, or the
+        resident set size if the kernel does not report it.
+
+        :param pid: int, the process id.
+        :return : int, the memory in bytes.
+        """
+        try:
+            with open("/proc/{}/smaps_rollup".format(pid)) as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        return int(line.split()[1]) * 1024
+            f.close()
+        except OSError:
+            pass
+
+        with open("/proc/{}/statm".format(pid)) as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        f.close()
+        return rss
+
+    def run_in_process_stage(self, stage):
+        """
+        Method for running the matrix preparation steps that are not part
+        of the pipeline on the synthetic data.
+
+        :param stage: string, the name of the stage.
+        """
+        sys.path.insert(0, self.root_dir)
+        from general.df_utilities import load_dataframe, save_dataframe
+
+        eqtl_df = load_dataframe(self.files["eqtl"], header=0, index_col=False)
+        geno_df = load_dataframe(self.files["genotype"], header=0, index_col=0)
+        alleles_df = geno_df.loc[eqtl_df["SNPName"], ["Alleles", "MinorAllele"]]
+        geno_df = geno_df.loc[eqtl_df["SNPName"], :].drop(["Alleles", "MinorAllele"], axis=1)
+        expr_df = load_dataframe(self.files["cia_expression"], header=0, index_col=0)
+        geno_df.columns = expr_df.columns
+        outdir = os.path.join(self.outdir, stage)
+
+        if stage == "mask_matrices":
+            from matrix_preparation.src.steps.mask_matrices import MaskMatrices
+            # The masker streams the tables from disk, the alleles are
+            # not a separate synthetic file.
+            alleles_inpath = os.path.join(self.outdir, "genotype_alleles.txt.gz")
+            save_dataframe(df=alleles_df, outpath=alleles_inpath,
+                           header=True, index=True)
+            step = MaskMatrices(settings={},
+                                eqtl_inpath=self.files["eqtl"],
+                                geno_inpath=self.files["cia_genotype"],
+                                alleles_inpath=alleles_inpath,
+                                expr_inpath=self.files["cia_expression"],
+                                cov_inpath=self.files["cia_covariates"],
+                                force=True, outdir=outdir)
+        elif stage == "create_regression_matrix":
+            from matrix_preparation.src.steps.create_regression_matrix import CreateRegressionMatrix
+            step = CreateRegressionMatrix(settings={}, eqtl_df=eqtl_df,
+                                          geno_df=geno_df,
+                                          alleles_df=alleles_df,
+                                          expr_df=expr_df, force=True,
+                                          outdir=outdir)
+        else:
+            print("Unknown stage: {}".format(stage))
+            exit()
+        step.start()
+
+        if not self.settings["keep_output"]:
+            shutil.rmtree(outdir)
+
+    def save_result(self, commit, stage, status, wall_time, peak_memory,
+                    unit, n_units, throughput):
+        """
+        Method for appending the result of a stage to the results file.
+        """
+        columns = ["date", "commit", "stage", "status", "n_eqtls",
+                   "n_samples", "n_genes", "wall_time_sec", "peak_memory_mb",
+                   "unit", "n_units", "throughput_per_sec"]
+        values = [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), commit, stage,
+                  status, self.settings["n_eqtls"], self.settings["n_samples"],
+                  self.settings["n_genes"], "{:.3f}".format(wall_time),
+                  "{:.1f}".format(peak_memory), unit, n_units,
+                  "{:.3f}".format(throughput)]
+
+        write_header = not os.path.isfile(self.results_path)
+        with open(self.results_path, "a") as f:
+            if write_header:
+                f.write("\t".join(columns) + "\n")
+            f.write("\t".join([str(x) for x in values]) + "\n")
+        f.close()
+
+    def get_commit(self):
+        try:
+            return subprocess.check_output(["git", "rev-parse", "--short",
+                                            "HEAD"],
+                                           cwd=self.root_dir,
+                                           stderr=subprocess.DEVNULL).decode().strip()
+        except (subprocess.CalledProcessError, OSError):
+            return "NA"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog=__program__,
+                                     description=__description__)
+    parser.add_argument("-s",
+                        "--settings",
+                        type=str,
+                        default="benchmark_settings",
+                        help="The settings input file (without '.json'), "
+                             "default: 'benchmark_settings'.")
+    parser.add_argument("-stage",
+                        type=str,
+                        default=None,
+                        help="Run only this stage in the current process, "
+                             "used internally. Default: None.")
+    args = parser.parse_args()
+
+    m = main(settings_file=args.settings, stage=args.stage)
+    m.start()
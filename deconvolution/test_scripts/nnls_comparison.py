@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""
+File:         nnls_comparison.py
+Created:      2026/10/18
+Last Changed:
+Author:       M.Vochteloo
+
+Copyright (C) 2020 M.Vochteloo
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+A copy of the GNU General Public License can be found in the LICENSE file in the
+root directory of this source tree. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Standard imports.
+from __future__ import print_function
+from pathlib import Path
+import time
+import sys
+
+# Third party imports.
+import numpy as np
+from scipy.optimize import nnls
+
+# Local application imports.
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from general.nnls import BatchNNLS
+
+# Metadata
+__program__ = "NNLS Comparison"
+__author__ = "Martijn Vochteloo"
+__maintainer__ = "Martijn Vochteloo"
+__email__ = "m.vochteloo@st.hanze.nl"
+__license__ = "GPLv3"
+__version__ = 1.0
+__description__ = "{} is a program developed and maintained by {}. " \
+                  "This program is licensed under the {} license and is " \
+                  "provided 'as-is' without any warranty or indemnification " \
+                  "of any kind.".format(__program__,
+                                        __author__,
+                                        __license__)
+
+"""
+Syntax:
+./nnls_comparison.py
+"""
+
+
+class main():
+    def __init__(self):
+        self.seed = 0
+        self.n_features = 200
+        self.n_celltypes = 6
+        self.n_samples = 2000
+        self.batch_size = 500
+        self.tolerance = 1e-10
+
+        # Signature matrices: independent columns and columns that are
+        # exactly collinear with others.
+        self.cases = {"independent": None,
+                      "duplicate": (5, {0: 1.0}),
+                      "convex combination": (4, {0: 0.5, 1: 0.5}),
+                      "signed combination": (5, {1: 1.0, 2: 1.0, 3: -1.0})}
+
+    def start(self):
+        random_state = np.random.RandomState(self.seed)
+        failed = False
+        for name, collinear in self.cases.items():
+            A = np.abs(random_state.normal(size=(self.n_features,
+                                                 self.n_celltypes)))
+            if collinear is not None:
+                column, weights = collinear
+                A[:, column] = sum(weight * A[:, x]
+                                   for x, weight in weights.items())
+            W = np.abs(random_state.normal(size=(self.n_celltypes,
+                                                 self.n_samples))) * \
+                (random_state.uniform(size=(self.n_celltypes,
+                                            self.n_samples)) > 0.4)
+            B = np.dot(A, W) + random_state.normal(scale=0.5,
+                                                   size=(self.n_features,
+                                                         self.n_samples))
+
+            start_time = time.time()
+            ref_rnorm = np.array([nnls(A, B[:, i])[1]
+                                  for i in range(self.n_samples)])
+            ref_time = time.time() - start_time
+
+            start_time = time.time()
+            X, rnorm = BatchNNLS(A, batch_size=self.batch_size).solve(B)
+            batch_time = time.time() - start_time
+
+            # The weights are not unique if the columns are collinear, the
+            # residual norms are.
+            excess = rnorm - ref_rnorm
+            n_worse = int(np.sum(excess > self.tolerance))
+            print("{:20s}: scipy {:.2f}s, batched {:.2f}s, min. weight "
+                  "{:.1e}, max. residual excess {:.1e}, samples worse: "
+                  "{}".format(name, ref_time, batch_time, X.min(),
+                              excess.max(), n_worse))
+            if n_worse > 0 or X.min() < 0:
+                failed = True
+
+        if failed:
+            print("Batched NNLS is worse than scipy.optimize.nnls.")
+            exit(1)
+
+
+if __name__ == '__main__':
+    m = main()
+    m.start()
@@ -1,7 +1,7 @@
 """
 File:         inter_eqtl_effect_deconvolution.py
 Created:      2020/03/17
-Last Changed: 2020/06/03
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -134,7 +134,7 @@ class IntereQTLEffectDeconvolution:
             data["alleles"] = data["group"].map(allele_map)
 
             # Add the color.
-            data["round_geno"] = data["genotype"].round(2)
+            data["round_geno"] = data["genotype"].astype(float).round(2)
             data["value_hue"] = data["round_geno"].map(self.value_color_map)
             data["group_hue"] = data["group"].map(self.group_color_map)
             data.drop(["round_geno"], axis=1, inplace=True)
@@ -1,7 +1,7 @@
 """
 File:         simple_eqtl_effect.py
 Created:      2020/03/16
-Last Changed: 2020/06/19
+Last Changed: 2026/10/18
 Author:       M.Vochteloo
 
 Copyright (C) 2020 M.Vochteloo
@@ -123,7 +123,7 @@ class SimpleeQTLEffect:
                         zero_geno_count + two_geno_count)
 
             # Add the color.
-            data["round_geno"] = data["genotype"].round(2)
+            data["round_geno"] = data["genotype"].astype(float).round(2)
             data["value_hue"] = data["round_geno"].map(self.value_color_map)
             data["group_hue"] = data["group"].map(self.group_color_map)
             data.drop(["round_geno"], axis=1, inplace=True)